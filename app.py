@@ -5,14 +5,27 @@ Flask приложение для генерации и публикации п
 
 import os
 import json
+import queue
+import atexit
 import base64
+import threading
 from io import BytesIO
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_file, abort
 from werkzeug.exceptions import BadRequest
 
 # Импортируем наши модули
+from config import Config
 from telegram_manager import TelegramManager
+from utils.ai_generator import AIGenerator
+from utils.image_processor import ImageProcessor
+from utils.image_store import ImageStore
+from utils.job_queue import JobQueue, RetryLater
+from utils.llm_cache import LLMCache
+from utils.post_scheduler import PostScheduler
+from utils.providers import close_openai_clients, rotate_openai_key, warm_up_openai_async
+from utils.retry import retry_stats
+from utils.stability_client import close_stability_clients, get_configured_client
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
@@ -26,6 +39,34 @@ os.makedirs('sessions', exist_ok=True)
 # Глобальная переменная для Telegram менеджера
 telegram_manager = None
 
+# Очередь фоновых задач публикации (переживает перезапуск процесса)
+job_queue = JobQueue(
+    Config.JOBS_DB_PATH,
+    workers=Config.JOB_WORKERS,
+    max_attempts=Config.JOB_MAX_ATTEMPTS,
+    max_deferrals=Config.JOB_MAX_DEFERRALS,
+    retry_delay=Config.JOB_RETRY_DELAY
+)
+
+# Отложенные публикации: в срок передаются в очередь задач
+post_scheduler = PostScheduler(Config.JOBS_DB_PATH, fire=job_queue.submit)
+
+# Кэш ответов ChatGPT, общий для всех запросов
+llm_cache = LLMCache(
+    Config.LLM_CACHE_PATH,
+    ttl=Config.LLM_CACHE_TTL,
+    max_disk_bytes=Config.LLM_CACHE_MAX_BYTES,
+    max_memory_items=Config.LLM_CACHE_MEMORY_ITEMS
+)
+
+# Сгенерированные изображения по хэшу содержимого
+image_store = ImageStore(Config.IMAGE_STORE_DIR, max_bytes=Config.IMAGE_STORE_MAX_BYTES)
+
+# Генераторы переиспользуются между запросами: 'default' и 'batch'
+# (у пакетного свои ограничения параллельности, общие для всех пакетов)
+generators = {}
+generators_lock = threading.Lock()
+
 def load_config():
     """Загрузка конфигурации"""
     if os.path.exists('config.json'):
@@ -38,20 +79,112 @@ def save_config(config):
     with open('config.json', 'w') as f:
         json.dump(config, f, indent=2)
 
+def get_api_key(config, name):
+    """
+    API ключ из конфигурации
+
+    Настройки веб-интерфейса пишут '<name>_api_key', config.py читает '<name>_key'.
+    """
+    return config.get(f'{name}_api_key') or config.get(f'{name}_key')
+
+def get_generator(kind='default'):
+    """
+    Общий генератор для текущих API ключей
+
+    Если ключи в настройках изменились, генератор заменяется новым
+    под блокировкой; запросы, уже получившие старый, завершаются на нем.
+    """
+    config = load_config()
+    keys = (get_api_key(config, 'openai'), get_api_key(config, 'stability'))
+
+    with generators_lock:
+        generator = generators.get(kind)
+        if generator is None or (generator.openai_key, generator.stability_key) != keys:
+            options = {}
+            if kind == 'batch':
+                options = {
+                    'openai_concurrency': Config.BATCH_OPENAI_CONCURRENCY,
+                    'stability_concurrency': Config.BATCH_STABILITY_CONCURRENCY
+                }
+            generator = AIGenerator(*keys, llm_cache=llm_cache, image_store=image_store, **options)
+            generators[kind] = generator
+        return generator
+
+def load_image(data):
+    """
+    Изображение из запроса: по 'image_id' из хранилища или из data URL / base64 в 'image'
+
+    Returns:
+        Байты изображения или None, если изображение не передано
+    """
+    if data.get('image_id'):
+        image_bytes = image_store.get(data['image_id'])
+        if image_bytes is None:
+            raise ValueError('Изображение не найдено в хранилище')
+        return image_bytes
+
+    if data.get('image'):
+        image_data = data['image'].split(',')[1] if ',' in data['image'] else data['image']
+        return base64.b64decode(image_data)
+
+    return None
+
+def parse_group_ids(value):
+    """Список групп без повторов из строки (через запятую или с новой строки) или списка"""
+    if isinstance(value, str):
+        value = value.replace('\n', ',').split(',')
+    items = [str(item).strip() for item in value or [] if str(item).strip()]
+    return list(dict.fromkeys(items))
+
+def parse_publish_at(value):
+    """
+    Время публикации из запроса: Unix timestamp или ISO 8601
+
+    Время без часового пояса считается локальным.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
 def init_telegram_manager():
-    """Инициализация Telegram менеджера"""
+    """
+    Инициализация Telegram менеджера
+
+    Менеджер держит постоянное соединение, поэтому пересоздается
+    только при изменении учетных данных.
+    """
     global telegram_manager
     config = load_config()
 
     if config.get('telegram_api_id') and config.get('telegram_api_hash'):
+        api_id = int(config['telegram_api_id'])
+        api_hash = config['telegram_api_hash']
+        phone = config.get('telegram_phone', '')
+
+        if (telegram_manager is not None
+                and telegram_manager.api_id == api_id
+                and telegram_manager.api_hash == api_hash
+                and telegram_manager.phone == phone):
+            return True
+
+        if telegram_manager is not None:
+            telegram_manager.close()
+
         telegram_manager = TelegramManager(
-            api_id=int(config['telegram_api_id']),
-            api_hash=config['telegram_api_hash'],
-            phone=config.get('telegram_phone', '')
+            api_id=api_id,
+            api_hash=api_hash,
+            phone=phone
         )
         return True
     return False
 
+
+@atexit.register
+def shutdown_telegram_manager():
+    """Отключение от Telegram при завершении процесса"""
+    if telegram_manager is not None:
+        telegram_manager.close()
+
 @app.route('/')
 def index():
     """Главная страница"""
@@ -83,6 +216,7 @@ def settings():
     # Сохранение настроек
     try:
         config = load_config()
+        old_openai_key = get_api_key(config, 'openai')
 
         # Обновляем конфигурацию
         config.update({
@@ -91,11 +225,18 @@ def settings():
             'telegram_api_id': request.form.get('telegram_api_id', ''),
             'telegram_api_hash': request.form.get('telegram_api_hash', ''),
             'telegram_phone': request.form.get('telegram_phone', ''),
-            'telegram_group_id': request.form.get('telegram_group_id', '')
+            'telegram_group_id': request.form.get('telegram_group_id', ''),
+            'telegram_group_ids': parse_group_ids(request.form.get('telegram_group_ids', ''))
         })
 
         save_config(config)
 
+        # Новый ключ OpenAI: клиент создается и прогревается сразу,
+        # генераторы переключатся на него при следующем запросе
+        new_openai_key = get_api_key(config, 'openai')
+        if new_openai_key and new_openai_key != old_openai_key:
+            rotate_openai_key(old_openai_key, new_openai_key)
+
         # Переинициализируем Telegram менеджер
         init_telegram_manager()
 
@@ -223,6 +364,67 @@ def telegram_logout():
             'error': str(e)
         }), 500
 
+@app.route('/api/telegram/rate_status', methods=['GET'])
+def telegram_rate_status():
+    """Очередь и оценки ожидания планировщика запросов Telegram"""
+    if not telegram_manager:
+        return jsonify({
+            'success': False,
+            'error': 'Telegram не настроен'
+        }), 400
+
+    return jsonify({
+        'success': True,
+        'methods': telegram_manager.get_rate_status()
+    })
+
+@app.route('/api/llm_cache/stats', methods=['GET'])
+def llm_cache_stats():
+    """Счетчики кэша ответов ChatGPT"""
+    return jsonify({
+        'success': True,
+        'stats': llm_cache.stats()
+    })
+
+@app.route('/api/health/image_backends', methods=['GET'])
+def image_backends_health():
+    """Состояние моделей Stability AI: circuit breaker, доля ошибок, задержки"""
+    config = load_config()
+    stability_key = get_api_key(config, 'stability')
+    if not stability_key:
+        return jsonify({
+            'success': False,
+            'error': 'Не настроен Stability AI API'
+        }), 400
+
+    health = get_configured_client(stability_key).health()
+    return jsonify({
+        'success': True,
+        'healthy': any(b['state'] != 'open' for b in health['backends'].values()),
+        **health
+    })
+
+@app.route('/api/health/providers', methods=['GET'])
+def providers_health():
+    """Повторы по этапам, очередь и общие паузы запросов к OpenAI и Stability AI"""
+    return jsonify({
+        'success': True,
+        'providers': retry_stats()
+    })
+
+@app.route('/api/images/<image_id>', methods=['GET'])
+def get_image(image_id):
+    """Изображение из хранилища по хэшу"""
+    if not image_store.is_valid_hash(image_id):
+        abort(404)
+    image_bytes = image_store.get(image_id)
+    if image_bytes is None:
+        abort(404)
+    response = send_file(BytesIO(image_bytes), mimetype='image/png')
+    # Содержимое по хэшу не меняется
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 @app.route('/api/generate_post', methods=['POST'])
 def generate_post():
     """Генерация поста"""
@@ -239,30 +441,124 @@ def generate_post():
         config = load_config()
 
         # Генерируем текст через ChatGPT
-        if not config.get('openai_api_key'):
+        if not get_api_key(config, 'openai'):
             return jsonify({
                 'success': False,
                 'error': 'Не настроен OpenAI API'
             }), 400
 
-        gpt = ChatGPTGenerator(config['openai_api_key'])
-        post_data = gpt.generate_post(topic)
+        if not get_api_key(config, 'stability'):
+            return jsonify({
+                'success': False,
+                'error': 'Не настроен Stability AI API'
+            }), 400
 
-        if not post_data['success']:
-            return jsonify(post_data), 400
+        generator = get_generator()
 
-        # Генерируем изображение через Stability AI
-        if config.get('stability_api_key'):
-            img_gen = ImageGenerator(config['stability_api_key'])
-            image_result = img_gen.generate_story_image(
-                prompt=post_data['image_prompt'],
-                title=post_data['title']
-            )
+        # Текст, заголовок и промпт одним запросом (combined) или
+        # отдельными параллельными этапами; затем изображение и наложение заголовка
+        content = generator.generate_content(
+            topic,
+            image_processor=ImageProcessor(),
+            combined=data.get('combined', True),
+            use_cache=data.get('use_cache', True)
+        )
 
-            if image_result['success']:
-                post_data['image'] = image_result['image']
+        return jsonify({
+            'success': True,
+            'content': content['text'],
+            'title': content['headline'],
+            'image_prompt': content['image_prompt'],
+            'image': 'data:image/png;base64,' + base64.b64encode(content['story_image']).decode(),
+            'image_id': content.get('story_image_id'),
+            'timings': content['timings']
+        })
 
-        return jsonify(post_data)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/generate_batch', methods=['POST'])
+def generate_batch():
+    """
+    Генерация постов для списка тем
+
+    Тело: {'topics': [...], 'combined', 'use_cache', 'inline_images'}.
+    Ответ - поток NDJSON: по строке на каждую тему по мере готовности
+    (порядок завершения, 'index' - позиция темы в запросе), последней
+    строкой - итог. Изображение передается ссылкой на /api/images/<id>,
+    с inline_images - также как data URL.
+    """
+    try:
+        data = request.get_json()
+        topics = [str(topic).strip() for topic in data.get('topics') or [] if str(topic).strip()]
+
+        if not topics:
+            return jsonify({
+                'success': False,
+                'error': 'Не указаны темы'
+            }), 400
+
+        if len(topics) > Config.BATCH_MAX_TOPICS:
+            return jsonify({
+                'success': False,
+                'error': f'Слишком много тем (максимум {Config.BATCH_MAX_TOPICS})'
+            }), 400
+
+        config = load_config()
+
+        if not get_api_key(config, 'openai'):
+            return jsonify({
+                'success': False,
+                'error': 'Не настроен OpenAI API'
+            }), 400
+
+        if not get_api_key(config, 'stability'):
+            return jsonify({
+                'success': False,
+                'error': 'Не настроен Stability AI API'
+            }), 400
+
+        generator = get_generator('batch')
+        inline_images = data.get('inline_images', False)
+
+        def generate():
+            succeeded = 0
+            for result in generator.iter_generate_batch(
+                    topics,
+                    image_processor=ImageProcessor(),
+                    max_parallel=Config.BATCH_PARALLEL_TOPICS,
+                    combined=data.get('combined', True),
+                    use_cache=data.get('use_cache', True)):
+                line = {'index': result['index'], 'topic': result['topic'], 'success': result['success']}
+                if result['success']:
+                    succeeded += 1
+                    content = result['content']
+                    image_id = content.get('story_image_id')
+                    line.update({
+                        'content': content['text'],
+                        'title': content['headline'],
+                        'image_prompt': content['image_prompt'],
+                        'image_id': image_id,
+                        'image_url': f'/api/images/{image_id}' if image_id else None,
+                        'timings': content['timings']
+                    })
+                    if inline_images or not image_id:
+                        line['image'] = 'data:image/png;base64,' + base64.b64encode(content['story_image']).decode()
+                else:
+                    line['error'] = result['error']
+                yield json.dumps(line, ensure_ascii=False) + '\n'
+
+            yield json.dumps({
+                'done': True,
+                'success': succeeded == len(topics),
+                'total': len(topics),
+                'succeeded': succeeded
+            }, ensure_ascii=False) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
     except Exception as e:
         return jsonify({
@@ -270,6 +566,100 @@ def generate_post():
             'error': str(e)
         }), 500
 
+def sse_event(event, data):
+    """Кадр Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/api/generate_post/stream', methods=['GET', 'POST'])
+def generate_post_stream():
+    """
+    Потоковая генерация поста (Server-Sent Events)
+
+    Текст передается событиями 'token' по мере генерации, затем по
+    готовности этапов - 'text', 'headline', 'image_prompt', 'image';
+    в конце - 'done' (с таймингами) или 'error'.
+    Тема передается в JSON (POST) или параметром ?topic= (GET, для EventSource).
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.args
+    topic = data.get('topic', '')
+    use_cache = data.get('use_cache', True) not in (False, '0', 'false')
+
+    if not topic:
+        return jsonify({
+            'success': False,
+            'error': 'Не указана тема'
+        }), 400
+
+    config = load_config()
+
+    if not get_api_key(config, 'openai'):
+        return jsonify({
+            'success': False,
+            'error': 'Не настроен OpenAI API'
+        }), 400
+
+    if not get_api_key(config, 'stability'):
+        return jsonify({
+            'success': False,
+            'error': 'Не настроен Stability AI API'
+        }), 400
+
+    try:
+        generator = get_generator()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+    events = queue.Queue()
+
+    def on_stage(name, value):
+        if name == 'image':
+            # Исходное изображение не отправляем - ждем версию с заголовком
+            return
+        if name == 'story_image':
+            events.put(('image', {
+                'image': 'data:image/png;base64,' + base64.b64encode(value).decode(),
+                # Генератор уже сохранил изображение до вызова on_stage
+                'image_id': image_store.content_id(value)
+            }))
+        else:
+            events.put((name, {name: value}))
+
+    def produce():
+        try:
+            # Потоковый ответ возможен только для отдельного этапа текста
+            content = generator.generate_content(
+                topic,
+                image_processor=ImageProcessor(),
+                combined=False,
+                use_cache=use_cache,
+                on_token=lambda delta: events.put(('token', {'delta': delta})),
+                on_stage=on_stage
+            )
+            events.put(('done', {'success': True, 'timings': content['timings'], 'total': content['total']}))
+        except Exception as e:
+            events.put(('error', {'success': False, 'error': str(e)}))
+
+    threading.Thread(target=produce, name='generate-post-stream', daemon=True).start()
+
+    def generate():
+        while True:
+            event, payload = events.get()
+            yield sse_event(event, payload)
+            if event in ('done', 'error'):
+                return
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/publish_post', methods=['POST'])
 def publish_post():
     """Публикация поста в Telegram"""
@@ -298,31 +688,91 @@ def publish_post():
             }), 400
 
         # Декодируем изображение если есть
-        image_bytes = None
-        if data.get('image'):
-            image_data = data['image'].split(',')[1] if ',' in data['image'] else data['image']
-            image_bytes = base64.b64decode(image_data)
-
-        # Публикуем в группу
-        result = telegram_manager.publish_to_group(
-            group_id=group_id,
-            text=data['content'],
-            image_bytes=image_bytes
-        )
+        image_bytes = load_image(data)
 
-        if not result['success']:
-            return jsonify(result), 400
+        # Публикация идет в фоне: отвечаем сразу, статус - по /api/jobs/<id>
+        job_id = job_queue.submit('publish_post', {
+            'group_id': group_id,
+            'content': data['content'],
+            'title': data.get('title', ''),
+            'publish_story': data.get('publish_story', True)
+        }, image_bytes)
 
-        # Если есть изображение, публикуем и в Stories
-        if image_bytes and data.get('publish_story', True):
-            story_result = telegram_manager.publish_personal_story(
-                image_bytes=image_bytes,
-                caption=data.get('title', '')
-            )
+        return job_accepted(job_id)
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
-            result['story'] = story_result
+@app.route('/api/publish_multi', methods=['POST'])
+def publish_multi():
+    """
+    Публикация поста в несколько групп/каналов
 
-        return jsonify(result)
+    Ответ - поток NDJSON: по строке на каждую цель по мере готовности,
+    последней строкой - итог.
+    """
+    try:
+        data = request.get_json()
+
+        if not telegram_manager:
+            return jsonify({
+                'success': False,
+                'error': 'Telegram не настроен'
+            }), 400
+
+        if not telegram_manager.is_authorized():
+            return jsonify({
+                'success': False,
+                'error': 'Не авторизован в Telegram'
+            }), 401
+
+        config = load_config()
+        group_ids = parse_group_ids(data.get('group_ids') or config.get('telegram_group_ids'))
+        if not group_ids and config.get('telegram_group_id'):
+            group_ids = [config['telegram_group_id']]
+
+        if not group_ids:
+            return jsonify({
+                'success': False,
+                'error': 'Не указаны группы для публикации'
+            }), 400
+
+        # Проверяем до ответа: внутри потока ошибка пришла бы уже после статуса 200
+        content = data.get('content')
+        if not content:
+            return jsonify({
+                'success': False,
+                'error': 'Не указан текст поста'
+            }), 400
+
+        # Декодируем изображение если есть
+        image_bytes = load_image(data)
+
+        concurrency = data.get('concurrency')
+        if concurrency:
+            concurrency = max(1, int(concurrency))
+
+        def generate():
+            succeeded = 0
+            for result in telegram_manager.iter_publish_to_groups(
+                    group_ids=group_ids,
+                    text=content,
+                    image_bytes=image_bytes,
+                    concurrency=concurrency):
+                succeeded += 1 if result['success'] else 0
+                yield json.dumps(result, ensure_ascii=False) + '\n'
+
+            yield json.dumps({
+                'done': True,
+                'success': succeeded == len(group_ids),
+                'total': len(group_ids),
+                'succeeded': succeeded
+            }, ensure_ascii=False) + '\n'
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
     except Exception as e:
         return jsonify({
@@ -349,29 +799,365 @@ def publish_story():
             }), 401
 
         # Декодируем изображение
-        if not data.get('image'):
+        image_bytes = load_image(data)
+        if not image_bytes:
             return jsonify({
                 'success': False,
                 'error': 'Изображение обязательно для Stories'
             }), 400
 
-        image_data = data['image'].split(',')[1] if ',' in data['image'] else data['image']
-        image_bytes = base64.b64decode(image_data)
+        # Публикация идет в фоне: отвечаем сразу, статус - по /api/jobs/<id>
+        job_id = job_queue.submit('publish_story', {
+            'caption': data.get('caption', '')
+        }, image_bytes)
 
-        # Публикуем Story
-        result = telegram_manager.publish_personal_story(
-            image_bytes=image_bytes,
-            caption=data.get('caption', '')
-        )
+        return job_accepted(job_id)
 
-        return jsonify(result)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/schedule', methods=['POST'])
+def schedule_post():
+    """Отложенная публикация поста (или только Story) в Telegram"""
+    try:
+        data = request.get_json()
+
+        if not telegram_manager:
+            return jsonify({
+                'success': False,
+                'error': 'Telegram не настроен'
+            }), 400
+
+        if not data.get('publish_at'):
+            return jsonify({
+                'success': False,
+                'error': 'Не указано время публикации'
+            }), 400
+
+        try:
+            publish_at = parse_publish_at(data['publish_at'])
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'Неверный формат времени публикации'
+            }), 400
+
+        # Декодируем изображение если есть
+        image_bytes = load_image(data)
+
+        if data.get('story_only'):
+            if not image_bytes:
+                return jsonify({
+                    'success': False,
+                    'error': 'Изображение обязательно для Stories'
+                }), 400
+
+            kind = 'publish_story'
+            payload = {'caption': data.get('caption', '')}
+        else:
+            group_id = load_config().get('telegram_group_id')
+            if not group_id:
+                return jsonify({
+                    'success': False,
+                    'error': 'Не указан ID группы'
+                }), 400
+
+            kind = 'publish_post'
+            payload = {
+                'group_id': group_id,
+                'content': data['content'],
+                'title': data.get('title', ''),
+                'publish_story': data.get('publish_story', True)
+            }
+
+        item_id = post_scheduler.schedule(kind, payload, publish_at, image_bytes)
+
+        return jsonify({
+            'success': True,
+            'id': item_id,
+            'publish_at': publish_at
+        }), 201
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/schedule', methods=['GET'])
+def list_scheduled_posts():
+    """Список отложенных публикаций"""
+    status = request.args.get('status', PostScheduler.PENDING)
+    limit = min(int(request.args.get('limit', 100)), 1000)
+
+    return jsonify({
+        'success': True,
+        'items': post_scheduler.list(status=None if status == 'all' else status, limit=limit)
+    })
+
+@app.route('/api/schedule/<item_id>', methods=['PATCH'])
+def reschedule_post(item_id):
+    """Перенос отложенной публикации"""
+    data = request.get_json() or {}
+
+    try:
+        publish_at = parse_publish_at(data['publish_at'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'Неверное время публикации'
+        }), 400
+
+    if not post_scheduler.reschedule(item_id, publish_at):
+        return jsonify({
+            'success': False,
+            'error': 'Публикация не найдена или уже выполнена'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'id': item_id,
+        'publish_at': publish_at
+    })
+
+@app.route('/api/schedule/<item_id>', methods=['DELETE'])
+def cancel_scheduled_post(item_id):
+    """Отмена отложенной публикации"""
+    if not post_scheduler.cancel(item_id):
+        return jsonify({
+            'success': False,
+            'error': 'Публикация не найдена или уже выполнена'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'id': item_id
+    })
+
+@app.route('/api/telegram/scheduled', methods=['POST'])
+def telegram_schedule_bulk():
+    """
+    Массовая отправка отложенных сообщений на стороне Telegram
+
+    Тело: {'group_id' (опционально), 'posts': [{'content', 'image', 'publish_at'}]}
+    """
+    try:
+        data = request.get_json()
+
+        if not telegram_manager:
+            return jsonify({
+                'success': False,
+                'error': 'Telegram не настроен'
+            }), 400
+
+        if not telegram_manager.is_authorized():
+            return jsonify({
+                'success': False,
+                'error': 'Не авторизован в Telegram'
+            }), 401
+
+        group_id = data.get('group_id') or load_config().get('telegram_group_id')
+        if not group_id:
+            return jsonify({
+                'success': False,
+                'error': 'Не указан ID группы'
+            }), 400
+
+        posts = []
+        for item in data.get('posts') or []:
+            image_bytes = load_image(item)
 
+            posts.append({
+                'text': item['content'],
+                'image_bytes': image_bytes,
+                'publish_at': parse_publish_at(item['publish_at'])
+            })
+
+        if not posts:
+            return jsonify({
+                'success': False,
+                'error': 'Нет постов для планирования'
+            }), 400
+
+        result = telegram_manager.schedule_posts(group_id, posts)
+        return jsonify(result), 200 if result['success'] else 207
+
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Неверные данные поста: {str(e)}'
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/api/telegram/scheduled', methods=['GET'])
+def telegram_list_scheduled():
+    """Список отложенных сообщений группы на стороне Telegram"""
+    if not telegram_manager:
+        return jsonify({
+            'success': False,
+            'error': 'Telegram не настроен'
+        }), 400
+
+    group_id = request.args.get('group_id') or load_config().get('telegram_group_id')
+    if not group_id:
+        return jsonify({
+            'success': False,
+            'error': 'Не указан ID группы'
+        }), 400
+
+    result = telegram_manager.list_scheduled_messages(group_id)
+    return jsonify(result), 200 if result['success'] else 400
+
+@app.route('/api/telegram/scheduled/<int:message_id>', methods=['PATCH'])
+def telegram_reschedule(message_id):
+    """Перенос отложенного сообщения"""
+    if not telegram_manager:
+        return jsonify({
+            'success': False,
+            'error': 'Telegram не настроен'
+        }), 400
+
+    data = request.get_json() or {}
+    group_id = data.get('group_id') or load_config().get('telegram_group_id')
+    if not group_id:
+        return jsonify({
+            'success': False,
+            'error': 'Не указан ID группы'
+        }), 400
+
+    try:
+        publish_at = parse_publish_at(data['publish_at'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': 'Неверное время публикации'
+        }), 400
+
+    result = telegram_manager.reschedule_message(group_id, message_id, publish_at)
+    return jsonify(result), 200 if result['success'] else 400
+
+@app.route('/api/telegram/scheduled/<int:message_id>', methods=['DELETE'])
+def telegram_cancel_scheduled(message_id):
+    """Отмена отложенного сообщения"""
+    if not telegram_manager:
+        return jsonify({
+            'success': False,
+            'error': 'Telegram не настроен'
+        }), 400
+
+    group_id = request.args.get('group_id') or load_config().get('telegram_group_id')
+    if not group_id:
+        return jsonify({
+            'success': False,
+            'error': 'Не указан ID группы'
+        }), 400
+
+    result = telegram_manager.cancel_scheduled_messages(group_id, [message_id])
+    return jsonify(result), 200 if result['success'] else 400
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Статус фоновой задачи"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Задача не найдена'
+        }), 404
+
+    return jsonify({
+        'success': True,
+        'job': job
+    })
+
+def job_accepted(job_id):
+    """Ответ 202 на принятую в очередь задачу"""
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': JobQueue.QUEUED,
+        'status_url': f'/api/jobs/{job_id}'
+    }), 202
+
+def run_publish_post_job(payload, image_bytes):
+    """
+    Фоновая задача: публикация поста в группу и Stories
+
+    Если цель получила долгий FloodWait, задача откладывается на нужное
+    время; уже опубликованные цели при повторе не отправляются снова.
+    """
+    if not init_telegram_manager():
+        return {'success': False, 'error': 'Telegram не настроен'}
+
+    # Результаты целей, выполненных в прошлых попытках
+    published = payload.get('published', {})
+
+    # Публикуем в группу и (если есть изображение) в Stories одновременно
+    fanout = telegram_manager.publish_fanout(
+        group_id=payload['group_id'],
+        text=payload['content'],
+        image_bytes=image_bytes,
+        story_caption=payload.get('title', ''),
+        publish_story=payload.get('publish_story', True) and 'story' not in published,
+        publish_group='group' not in published
+    )
+    targets = {**published, **fanout['targets']}
+
+    waits = [target['retry_after'] for target in fanout['targets'].values()
+             if not target['success'] and target.get('retry_after')]
+    if waits:
+        raise RetryLater(
+            max(waits),
+            reason='; '.join(target['error'] for target in fanout['targets'].values() if not target['success']),
+            payload={**payload, 'published': {name: target for name, target in targets.items() if target['success']}}
+        )
+
+    result = targets['group']
+    if 'story' in targets:
+        result['story'] = targets['story']
+    return result
+
+def run_publish_story_job(payload, image_bytes):
+    """Фоновая задача: публикация личной Story (при FloodWait откладывается)"""
+    if not init_telegram_manager():
+        return {'success': False, 'error': 'Telegram не настроен'}
+
+    result = telegram_manager.publish_personal_story(
+        image_bytes=image_bytes,
+        caption=payload.get('caption', '')
+    )
+    if not result['success'] and result.get('retry_after'):
+        raise RetryLater(result['retry_after'], reason=result['error'])
+    return result
+
+job_queue.register('publish_post', run_publish_post_job)
+job_queue.register('publish_story', run_publish_story_job)
+
+@app.before_request
+def start_background_workers():
+    """Запуск очереди и планировщика (повторные вызовы ничего не делают)"""
+    job_queue.start()
+    post_scheduler.start()
+
+@atexit.register
+def shutdown_job_queue():
+    """Остановка планировщика и рабочих потоков очереди"""
+    post_scheduler.stop()
+    job_queue.stop()
+
+@atexit.register
+def shutdown_http_clients():
+    """Закрытие пулов соединений OpenAI и Stability AI"""
+    close_stability_clients()
+    close_openai_clients()
+
 @app.errorhandler(404)
 def not_found(e):
     return render_template('error.html', error='Страница не найдена'), 404
@@ -384,5 +1170,17 @@ if __name__ == '__main__':
     # Инициализируем при запуске
     init_telegram_manager()
 
+    # Открываем соединение с OpenAI заранее, чтобы первый пост не ждал его
+    openai_key = get_api_key(load_config(), 'openai')
+    if openai_key:
+        warm_up_openai_async(openai_key)
+
+    # Возобновляем прерванные задачи и отложенные публикации
+    # (в процессе-наблюдателе reloader не запускаем)
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_queue.recover()
+        job_queue.start()
+        post_scheduler.start()
+
     # Запускаем сервер
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
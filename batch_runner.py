@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Пакетная генерация контент-плана без веб-интерфейса
+
+Темы читаются из CSV или JSONL построчно, посты генерируются
+параллельно, результаты пишутся в каталог вывода. Прогресс
+сохраняется в checkpoint.jsonl, поэтому прерванный запуск
+продолжается с того места, где остановился:
+
+    python batch_runner.py topics.csv -o output --parallel 8
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import re
+import sys
+import time
+
+from config import Config
+from utils.ai_generator import AIGenerator
+from utils.image_processor import ImageProcessor
+from utils.image_store import ImageStore
+from utils.llm_cache import LLMCache
+from utils.stability_client import close_stability_clients
+
+CHECKPOINT_FILE = 'checkpoint.jsonl'
+
+
+def load_api_keys():
+    """API ключи из config.json веб-интерфейса или переменных окружения"""
+    config = {}
+    if os.path.exists(Config.CONFIG_FILE):
+        with open(Config.CONFIG_FILE, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+    openai_key = config.get('openai_api_key') or config.get('openai_key') or Config.OPENAI_KEY
+    stability_key = config.get('stability_api_key') or config.get('stability_key') or Config.STABILITY_KEY
+    return openai_key, stability_key
+
+
+def read_topics(path, topic_field='topic'):
+    """
+    Построчное чтение тем из CSV или JSONL
+
+    CSV: колонка topic_field, если есть заголовок с ней, иначе первая колонка.
+    JSONL: поле topic_field объекта или строка целиком.
+
+    Yields:
+        (номер записи, тема)
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith(('.jsonl', '.ndjson')):
+            for number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                topic = item.get(topic_field) if isinstance(item, dict) else item
+                if topic and str(topic).strip():
+                    yield number, str(topic).strip()
+            return
+
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return
+
+        column = 0
+        normalized = [name.strip().lower() for name in header]
+        if topic_field.lower() in normalized:
+            column = normalized.index(topic_field.lower())
+        elif header and header[0].strip():
+            # Файл без заголовка: первая строка - уже тема
+            yield 1, header[0].strip()
+
+        for number, row in enumerate(reader, 2):
+            if len(row) > column and row[column].strip():
+                yield number, row[column].strip()
+
+
+def topic_key(number, topic):
+    """Ключ записи для checkpoint: номер строки и хэш темы"""
+    return f"{number}:{hashlib.sha1(topic.encode('utf-8')).hexdigest()[:12]}"
+
+
+def slugify(text, max_length=40):
+    """Имя каталога из темы"""
+    slug = re.sub(r'[^\w]+', '-', text.lower(), flags=re.UNICODE).strip('-')
+    return slug[:max_length].strip('-') or 'post'
+
+
+def load_checkpoint(path, retry_failed=True):
+    """
+    Ключи уже обработанных записей
+
+    Args:
+        path: Путь к checkpoint.jsonl
+        retry_failed: Не считать обработанными записи с ошибкой
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Оборванная последняя строка после аварийного завершения
+                continue
+            if entry.get('success') or not retry_failed:
+                done.add(entry['key'])
+    return done
+
+
+def save_post(output_dir, number, topic, content):
+    """
+    Запись поста и изображений в каталог вывода
+
+    Returns:
+        Путь к каталогу поста
+    """
+    post_dir = os.path.join(output_dir, 'posts', f"{number:05d}-{slugify(topic)}")
+    os.makedirs(post_dir, exist_ok=True)
+
+    with open(os.path.join(post_dir, 'image.png'), 'wb') as f:
+        f.write(content['image'])
+    if content.get('story_image'):
+        with open(os.path.join(post_dir, 'story.png'), 'wb') as f:
+            f.write(content['story_image'])
+
+    post = {
+        'topic': topic,
+        'text': content['text'],
+        'headline': content['headline'],
+        'image_prompt': content['image_prompt'],
+        'timings': content['timings'],
+        'total': content['total']
+    }
+    with open(os.path.join(post_dir, 'post.json'), 'w', encoding='utf-8') as f:
+        json.dump(post, f, ensure_ascii=False, indent=2)
+
+    return post_dir
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Пакетная генерация постов из CSV/JSONL')
+    parser.add_argument('input', help='Файл с темами (.csv или .jsonl)')
+    parser.add_argument('-o', '--output', default='output', help='Каталог вывода (по умолчанию: output)')
+    parser.add_argument('--topic-field', default='topic', help='Колонка/поле с темой (по умолчанию: topic)')
+    parser.add_argument('--parallel', type=int, default=Config.BATCH_PARALLEL_TOPICS,
+                        help='Тем в работе одновременно')
+    parser.add_argument('--openai-concurrency', type=int, default=Config.BATCH_OPENAI_CONCURRENCY,
+                        help='Одновременных запросов к OpenAI')
+    parser.add_argument('--stability-concurrency', type=int, default=Config.BATCH_STABILITY_CONCURRENCY,
+                        help='Одновременных генераций изображений')
+    parser.add_argument('--separate', action='store_true',
+                        help='Текст, заголовок и промпт отдельными запросами')
+    parser.add_argument('--no-cache', action='store_true', help='Не использовать кэши ответов и изображений')
+    parser.add_argument('--no-overlay', action='store_true', help='Не накладывать заголовок на изображение')
+    parser.add_argument('--skip-failed', action='store_true',
+                        help='Не повторять темы, завершившиеся ошибкой в прошлых запусках')
+    return parser.parse_args(argv)
+
+
+def run(args):
+    """
+    Запуск пакетной генерации
+
+    Returns:
+        Код завершения
+    """
+    openai_key, stability_key = load_api_keys()
+    if not openai_key or not stability_key:
+        print("❌ Не настроены API ключи OpenAI и/или Stability AI")
+        print("Заполните настройки в веб-интерфейсе или переменные OPENAI_KEY и STABILITY_KEY")
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint_path = os.path.join(args.output, CHECKPOINT_FILE)
+    done = load_checkpoint(checkpoint_path, retry_failed=not args.skip_failed)
+    if done:
+        print(f"🔁 Продолжение: {len(done)} тем уже обработано")
+
+    generator = AIGenerator(
+        openai_key,
+        stability_key,
+        llm_cache=LLMCache(
+            Config.LLM_CACHE_PATH,
+            ttl=Config.LLM_CACHE_TTL,
+            max_disk_bytes=Config.LLM_CACHE_MAX_BYTES,
+            max_memory_items=Config.LLM_CACHE_MEMORY_ITEMS
+        ),
+        image_store=ImageStore(Config.IMAGE_STORE_DIR, max_bytes=Config.IMAGE_STORE_MAX_BYTES),
+        openai_concurrency=args.openai_concurrency,
+        stability_concurrency=args.stability_concurrency
+    )
+
+    # Порядковый номер в пакете -> (номер записи, ключ); заполняется по мере чтения файла.
+    # Номера выдаются так же, как enumerate в iter_generate_batch: только растут,
+    # поэтому завершенные и удаленные записи не освобождают их для новых тем
+    pending = {}
+    batch_index = itertools.count()
+
+    def topics():
+        for number, topic in read_topics(args.input, args.topic_field):
+            key = topic_key(number, topic)
+            if key in done:
+                continue
+            pending[next(batch_index)] = (number, key)
+            yield topic
+
+    succeeded = failed = 0
+    started_at = time.monotonic()
+
+    with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+        try:
+            for result in generator.iter_generate_batch(
+                    topics(),
+                    image_processor=None if args.no_overlay else ImageProcessor(),
+                    max_parallel=args.parallel,
+                    combined=not args.separate,
+                    use_cache=not args.no_cache):
+                number, key = pending.pop(result['index'])
+                entry = {'key': key, 'line': number, 'topic': result['topic'], 'finished_at': time.time()}
+
+                if result['success']:
+                    try:
+                        entry['dir'] = save_post(args.output, number, result['topic'], result['content'])
+                        entry['success'] = True
+                    except OSError as e:
+                        entry.update({'success': False, 'error': f"Ошибка записи: {e}"})
+                else:
+                    entry.update({'success': False, 'error': result['error']})
+
+                # Запись в checkpoint - только после сохранения файлов поста
+                checkpoint.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+
+                if entry['success']:
+                    succeeded += 1
+                    print(f"✅ [{number}] {result['topic']} -> {entry['dir']}")
+                else:
+                    failed += 1
+                    print(f"❌ [{number}] {result['topic']}: {entry['error']}")
+
+        except KeyboardInterrupt:
+            print("\n⏸️  Прервано. Повторный запуск продолжит с необработанных тем")
+            return 130
+        finally:
+            elapsed = time.monotonic() - started_at
+            print(f"\nГотово: {succeeded}, ошибок: {failed}, время: {elapsed:.1f} сек")
+            close_stability_clients()
+
+    return 0 if failed == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(run(parse_args()))
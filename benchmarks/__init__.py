@@ -0,0 +1,19 @@
+"""
+Сквозные бенчмарки на локальных заглушках сервисов
+
+Прогоняют /api/generate_post, /api/publish_post, AIGenerator,
+ImageProcessor.process_image и TelegramManager против пакета fakes
+и сохраняют p50/p95/p99, RPS, число соединений на запрос и пиковый
+RSS в JSON для сравнения прогонов:
+
+    python -m benchmarks --profile fast --requests 50 --concurrency 8
+    python -m benchmarks --compare benchmarks/results/<прошлый>.json
+"""
+
+from .stats import LatencyRecorder, peak_rss_mb, percentile
+
+__all__ = [
+    'LatencyRecorder',
+    'peak_rss_mb',
+    'percentile'
+]
@@ -0,0 +1,139 @@
+"""
+Запуск бенчмарков
+
+    python -m benchmarks --profile realistic --requests 100 --concurrency 16
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, 'benchmarks', 'results')
+
+# Метрики, по которым сравниваются прогоны (меньше - лучше, кроме rps)
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'connections_per_request', 'peak_rss_mb')
+
+
+def git_commit():
+    """Текущий коммит репозитория (None вне git)"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def prepare_workdir(base_url, profile):
+    """
+    Временный рабочий каталог с config.json и окружением для заглушек
+
+    Переменные окружения задаются до импорта config, поэтому приложение
+    сразу ходит в заглушки.
+    """
+    workdir = tempfile.mkdtemp(prefix='tg-bench-')
+    os.chdir(workdir)
+    with open('config.json', 'w', encoding='utf-8') as f:
+        json.dump({
+            'openai_api_key': 'bench-openai-key',
+            'stability_api_key': 'bench-stability-key',
+            'telegram_api_id': '1',
+            'telegram_api_hash': 'bench',
+            'telegram_phone': 'bench',
+            'telegram_group_id': '@benchmark_group'
+        }, f, indent=2)
+
+    os.environ['OPENAI_BASE_URL'] = f"{base_url}/v1"
+    os.environ['STABILITY_API_HOST'] = base_url
+    os.environ['TELEGRAM_BACKEND'] = 'fake'
+    os.environ['FAKE_PROFILE'] = profile
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    return workdir
+
+
+def compare(current, previous):
+    """Печать изменений метрик относительно прошлого прогона"""
+    print(f"\nСравнение с {previous.get('commit')} ({previous.get('started_at')}, профиль {previous.get('profile')}):")
+    for name, summary in current['scenarios'].items():
+        before = previous.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        print(f"  {name}")
+        for metric in COMPARED:
+            old, new = before.get(metric), summary.get(metric)
+            if old is None or new is None:
+                continue
+            change = f"{(new - old) / old * 100:+.1f}%" if old else 'n/a'
+            print(f"    {metric:<24} {old:>10} -> {new:<10} {change}")
+
+
+def main():
+    from fakes import PROFILES, FakeServerThread
+    from .scenarios import Scenarios
+
+    parser = argparse.ArgumentParser(description='Сквозные бенчмарки на локальных заглушках')
+    parser.add_argument('--profile', default='fast', choices=sorted(PROFILES), help='Профиль задержек и ошибок заглушек')
+    parser.add_argument('--requests', type=int, default=50, help='Операций на сценарий')
+    parser.add_argument('--concurrency', type=int, default=8, help='Одновременных операций')
+    parser.add_argument('--scenarios', nargs='+', default=list(Scenarios.NAMES), choices=Scenarios.NAMES)
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генераторов профиля')
+    parser.add_argument('--output', help='Файл результата (по умолчанию benchmarks/results/<время>.json)')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--verbose', action='store_true', help='Не скрывать INFO-логи приложения')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    output = os.path.abspath(args.output) if args.output else os.path.join(
+        RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    previous = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    server = FakeServerThread(args.profile, seed=args.seed).start()
+    workdir = prepare_workdir(server.base_url, args.profile)
+    print(f"🧪 Заглушки ({args.profile}) на {server.base_url}, рабочий каталог {workdir}")
+
+    result = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'profile': args.profile,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'python': sys.version.split()[0],
+        'scenarios': {}
+    }
+
+    scenarios = Scenarios(server.base_url, args.profile)
+    try:
+        for name in args.scenarios:
+            summary = scenarios.run(name, args.requests, args.concurrency)
+            result['scenarios'][name] = summary
+            print(f"  {name:<20} p50 {summary['p50_ms']} мс, p95 {summary['p95_ms']} мс, "
+                  f"p99 {summary['p99_ms']} мс, {summary['rps']} rps, "
+                  f"ошибок {summary['errors']}, соединений/запрос {summary['connections_per_request']}")
+    finally:
+        scenarios.close()
+        server.stop()
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 Результат: {output}")
+
+    if previous is not None:
+        compare(result, previous)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Сценарии бенчмарков: генерация, рендер и публикация на заглушках
+"""
+import base64
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from .stats import LatencyRecorder
+
+GROUP_ID = '@benchmark_group'
+
+
+def run_load(operation: Callable[[int], Any], requests: int, concurrency: int) -> LatencyRecorder:
+    """
+    Выполнение operation(i) requests раз с concurrency потоками
+
+    Ошибкой считается исключение или результат с 'success': False.
+    """
+    recorder = LatencyRecorder()
+
+    def _one(index):
+        start = time.perf_counter()
+        try:
+            result = operation(index)
+            error = None
+            if isinstance(result, dict) and result.get('success') is False:
+                error = str(result.get('error'))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        recorder.record(time.perf_counter() - start, error)
+
+    recorder.start()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_one, range(requests)))
+    recorder.stop()
+    return recorder
+
+
+class BackendCounters:
+    """Счетчики запросов и соединений HTTP-заглушек"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def reset(self):
+        request = urllib.request.Request(f"{self.base_url}/_fake/reset", method='POST')
+        urllib.request.urlopen(request).read()
+
+    def read(self) -> Dict[str, Any]:
+        with urllib.request.urlopen(f"{self.base_url}/_fake/stats") as response:
+            return json.load(response)
+
+
+class Scenarios:
+    """
+    Набор сценариев
+
+    Модули приложения импортируются при создании, то есть после того,
+    как переменные окружения направили их на заглушки.
+    """
+
+    def __init__(self, base_url: str, profile: str):
+        import app as app_module
+        from telegram_manager import TelegramManager
+        from utils.ai_generator import AIGenerator
+        from utils.image_processor import ImageProcessor
+
+        self.base_url = base_url
+        self.profile = profile
+        self.counters = BackendCounters(base_url)
+        self.app_module = app_module
+        self.client = app_module.app.test_client()
+        app_module.init_telegram_manager()
+        # Без кэшей: каждый запрос идет в заглушки
+        self.generator = AIGenerator('bench-openai-key', 'bench-stability-key')
+        self.image_processor = ImageProcessor()
+        self.manager = TelegramManager(api_id=1, api_hash='bench', phone='bench')
+        self.image = self.generator.generate_image('benchmark warm-up image')
+
+    def generator_content(self, index: int):
+        return self.generator.generate_content(f"Тема бенчмарка {index}", self.image_processor)
+
+    def image_render(self, index: int):
+        return self.image_processor.process_image(self.image, f"Заголовок {index}")
+
+    def telegram_fanout(self, index: int):
+        result = self.manager.publish_fanout(
+            GROUP_ID, f"Пост бенчмарка {index}", self.image, story_caption='Бенчмарк'
+        )
+        return {'success': result['success'], 'error': json.dumps(result['targets'], ensure_ascii=False)}
+
+    def http_generate_post(self, index: int):
+        response = self.client.post('/api/generate_post', json={
+            'topic': f"HTTP тема {index}",
+            'use_cache': False
+        })
+        return response.get_json()
+
+    def http_publish_post(self, index: int):
+        """Постановка в очередь и ожидание завершения фоновой задачи"""
+        response = self.client.post('/api/publish_post', json={
+            'content': f"HTTP пост {index}",
+            'title': 'Бенчмарк',
+            'image': 'data:image/png;base64,' + base64.b64encode(self.image).decode()
+        })
+        data = response.get_json()
+        if response.status_code != 202:
+            return data
+
+        deadline = time.monotonic() + 120
+        while time.monotonic() < deadline:
+            job = self.client.get(f"/api/jobs/{data['job_id']}").get_json()['job']
+            if job['status'] in ('done', 'failed'):
+                return {'success': job['status'] == 'done', 'error': job.get('error')}
+            time.sleep(0.01)
+        return {'success': False, 'error': 'timeout'}
+
+    NAMES = ('generator_content', 'image_render', 'telegram_fanout', 'http_generate_post', 'http_publish_post')
+
+    def run(self, name: str, requests: int, concurrency: int) -> Dict[str, Any]:
+        """
+        Запуск сценария
+
+        Returns:
+            Сводка LatencyRecorder с числом запросов и соединений к заглушкам
+        """
+        operation = getattr(self, name)
+        self.counters.reset()
+        telegram_calls_before = self._telegram_calls()
+
+        recorder = run_load(operation, requests, concurrency)
+
+        backend = self.counters.read()
+        backend_requests = sum(backend['requests'].values())
+        telegram_calls = {
+            method: count - telegram_calls_before.get(method, 0)
+            for method, count in self._telegram_calls().items()
+            if count - telegram_calls_before.get(method, 0)
+        }
+        return recorder.summary(
+            concurrency=concurrency,
+            backend_requests=backend['requests'],
+            backend_errors=backend['errors'],
+            backend_connections=backend['connections'],
+            connections_per_request=round(backend['connections'] / requests, 3) if backend_requests else 0.0,
+            telegram_calls=telegram_calls,
+            telegram_connects_per_request=round(telegram_calls.get('connect', 0) / requests, 3)
+        )
+
+    def _telegram_calls(self) -> Dict[str, int]:
+        """Вызовы заглушки Telegram у менеджера сценариев и менеджера приложения"""
+        calls: Dict[str, int] = {}
+        for manager in (self.manager, self.app_module.telegram_manager):
+            client = getattr(manager, '_client', None)
+            for method, count in (getattr(client, 'calls', None) or {}).items():
+                calls[method] = calls.get(method, 0) + count
+        return calls
+
+    def close(self):
+        self.manager.close()
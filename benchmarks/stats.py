@@ -0,0 +1,88 @@
+"""
+Сбор метрик бенчмарков
+"""
+import math
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(len(ordered) * p / 100))
+    return ordered[rank - 1]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS процесса в МБ (None, если недоступен)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - в КБ, macOS - в байтах
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+class LatencyRecorder:
+    """Задержки и ошибки операций одного сценария"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.error_samples: List[str] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+
+    def stop(self):
+        self.finished_at = time.perf_counter()
+
+    def record(self, latency: float, error: Optional[str] = None):
+        """Учет одной операции"""
+        with self._lock:
+            if error is None:
+                self.latencies.append(latency)
+            else:
+                self.errors += 1
+                if len(self.error_samples) < 5:
+                    self.error_samples.append(error)
+
+    def summary(self, **extra: Any) -> Dict[str, Any]:
+        """
+        Итог сценария
+
+        Returns:
+            {requests, errors, duration, rps, p50, p95, p99, mean, max, peak_rss_mb, ...extra}
+        """
+        duration = (self.finished_at or time.perf_counter()) - (self.started_at or time.perf_counter())
+        total = len(self.latencies) + self.errors
+
+        def ms(value):
+            return round(value * 1000, 2) if value is not None else None
+
+        return {
+            'requests': total,
+            'errors': self.errors,
+            'error_samples': self.error_samples,
+            'duration_s': round(duration, 3),
+            'rps': round(len(self.latencies) / duration, 2) if duration > 0 else None,
+            'p50_ms': ms(percentile(self.latencies, 50)),
+            'p95_ms': ms(percentile(self.latencies, 95)),
+            'p99_ms': ms(percentile(self.latencies, 99)),
+            'mean_ms': ms(sum(self.latencies) / len(self.latencies)) if self.latencies else None,
+            'max_ms': ms(max(self.latencies)) if self.latencies else None,
+            'peak_rss_mb': peak_rss_mb(),
+            **extra
+        }
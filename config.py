@@ -13,6 +13,8 @@ class Config:
     # --- Пути и файлы ---
     CONFIG_FILE = 'config.json'
     TEMP_IMAGE_PATH = 'temp_images'
+    DATA_DIR = 'data'
+    JOBS_DB_PATH = os.path.join(DATA_DIR, 'jobs.db')
 
     # --- Flask конфигурация ---
     # Загружаем из .env файла или используем значение по умолчанию
@@ -43,9 +45,93 @@ class Config:
     MAX_POST_LENGTH = 1500
     MAX_HEADLINE_LENGTH = 50  # Используется для генерации, а не валидации
 
+    # --- Бэкенд Telegram: 'telethon' или 'fake' (заглушка из пакета fakes) ---
+    TELEGRAM_BACKEND = os.environ.get('TELEGRAM_BACKEND', 'telethon')
+    FAKE_PROFILE = os.environ.get('FAKE_PROFILE', 'fast')
+
     # --- Таймауты (в секундах) ---
     AI_TIMEOUT = 60
     TELEGRAM_TIMEOUT = 30
+    TELEGRAM_PUBLISH_TIMEOUT = 120  # Загрузка изображений бывает долгой
+
+    # --- Параллелизм ---
+    TELEGRAM_PUBLISH_CONCURRENCY = 5  # Одновременных отправок при рассылке в несколько чатов
+
+    # --- Фоновые задачи ---
+    JOB_WORKERS = 2
+    JOB_MAX_ATTEMPTS = 3  # Попыток, если обработчик задачи упал с исключением
+    JOB_RETRY_DELAY = 5.0  # Пауза (сек) перед первым повтором упавшей задачи, дальше - вдвое больше
+    JOB_MAX_DEFERRALS = 5  # Сколько раз задачу можно отложить (например, из-за FloodWait)
+
+    # --- Лимиты запросов к Telegram: метод -> (запросов в секунду, всплеск) ---
+    TELEGRAM_RATE_LIMITS = {
+        'default': (5.0, 10),
+        'send_message': (1.0, 3),
+        'send_file': (1.0, 3),
+        'SendStoryRequest': (0.2, 1),
+        'get_entity': (2.0, 5),
+    }
+    # Более долгое ожидание очереди или FloodWait возвращается вызывающему;
+    # должно быть меньше TELEGRAM_PUBLISH_TIMEOUT, иначе ожидание обрывается таймаутом
+    TELEGRAM_FLOOD_MAX_WAIT = 60
+
+    # --- Кэширование (в секундах) ---
+    TELEGRAM_AUTH_CACHE_TTL = 300
+    TELEGRAM_UPLOAD_TTL = 1800  # Сколько переиспользуем загруженные в Telegram файлы
+
+    # --- Пакетная генерация ---
+    BATCH_MAX_TOPICS = 100
+    BATCH_PARALLEL_TOPICS = 8  # Тем в работе одновременно
+    BATCH_OPENAI_CONCURRENCY = 6  # Одновременных запросов к OpenAI
+    BATCH_STABILITY_CONCURRENCY = 3  # Одновременных генераций изображений
+
+    # --- Кэш ответов ChatGPT ---
+    LLM_CACHE_PATH = os.path.join(DATA_DIR, 'llm_cache.db')
+    LLM_CACHE_TTL = 24 * 3600
+    LLM_CACHE_MAX_BYTES = 50 * 1024 * 1024
+    LLM_CACHE_MEMORY_ITEMS = 256
+
+    # --- OpenAI ---
+    OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL')  # None - официальный API
+    OPENAI_CONNECT_TIMEOUT = 10
+    OPENAI_READ_TIMEOUT = 120  # Длинные ответы без потока приходят целиком
+    OPENAI_POOL_SIZE = 20  # Одновременных keep-alive соединений на ключ
+    OPENAI_KEEPALIVE_TIMEOUT = 30
+
+    # --- Повторы запросов к OpenAI и Stability AI ---
+    RETRY_MAX_ATTEMPTS = 4  # Всего попыток, включая первую
+    RETRY_BASE_DELAY = 1.0  # Пауза перед первым повтором, далее x2 с джиттером
+    RETRY_MAX_DELAY = 30
+    RETRY_MAX_WAIT = 60  # Retry-After длиннее - ошибка сразу
+    # Одновременных запросов к провайдеру на весь процесс; остальные ждут в очереди
+    PROVIDER_CONCURRENCY = {
+        'openai': 16,
+        'stability': 6
+    }
+
+    # --- Stability AI ---
+    STABILITY_API_HOST = os.environ.get('STABILITY_API_HOST', 'https://api.stability.ai')
+    STABILITY_CONNECT_TIMEOUT = 10
+    STABILITY_READ_TIMEOUT = 60  # Ожидание очередной порции ответа
+    STABILITY_POOL_SIZE = 10  # Одновременных keep-alive соединений
+    STABILITY_KEEPALIVE_TIMEOUT = 30
+    # Резервная модель SDXL: 'off' - только после ошибки SD3,
+    # 'hedge' - если SD3 дольше перцентиля своих задержек, 'race' - сразу обе
+    STABILITY_HEDGE_MODE = os.environ.get('STABILITY_HEDGE_MODE', 'hedge')
+    STABILITY_HEDGE_PERCENTILE = float(os.environ.get('STABILITY_HEDGE_PERCENTILE', 95))
+    STABILITY_HEDGE_DEFAULT_DELAY = 20  # Пока статистики задержек SD3 мало
+    STABILITY_HEDGE_MIN_SAMPLES = 10
+    # Circuit breaker моделей: окно (сек), доля ошибок, минимум вызовов,
+    # ошибок подряд и сколько модель исключена до пробного вызова (сек)
+    STABILITY_BREAKER_WINDOW = 60
+    STABILITY_BREAKER_ERROR_RATE = 0.5
+    STABILITY_BREAKER_MIN_REQUESTS = 5
+    STABILITY_BREAKER_CONSECUTIVE_FAILURES = 3
+    STABILITY_BREAKER_OPEN_SECONDS = 30
+
+    # --- Хранилище сгенерированных изображений ---
+    IMAGE_STORE_DIR = os.path.join(DATA_DIR, 'images')
+    IMAGE_STORE_MAX_BYTES = 500 * 1024 * 1024
 
     @classmethod
     def load_from_file(cls):
@@ -0,0 +1,23 @@
+"""
+Локальные детерминированные заглушки OpenAI, Stability AI и Telegram
+
+Нужны для нагрузочных прогонов и бенчмарков без сети и API ключей.
+Включаются через конфигурацию:
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+    STABILITY_API_HOST=http://127.0.0.1:8900
+    TELEGRAM_BACKEND=fake
+HTTP-заглушки запускаются командой: python -m fakes --port 8900 --profile fast
+"""
+
+from .profiles import PROFILES, LatencyProfile, get_profile
+from .servers import FakeBackends, FakeServerThread
+from .telegram import FakeTelegramClient
+
+__all__ = [
+    'PROFILES',
+    'LatencyProfile',
+    'get_profile',
+    'FakeBackends',
+    'FakeServerThread',
+    'FakeTelegramClient'
+]
@@ -0,0 +1,29 @@
+"""
+Запуск HTTP-заглушек OpenAI и Stability AI
+
+    python -m fakes --port 8900 --profile realistic
+"""
+import argparse
+
+from aiohttp import web
+
+from .profiles import PROFILES
+from .servers import FakeBackends
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальные заглушки OpenAI и Stability AI')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--profile', default='fast', choices=sorted(PROFILES), help='Профиль задержек и ошибок')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное значение генераторов профиля')
+    args = parser.parse_args()
+
+    print(f"🧪 Заглушки ({args.profile}) на http://{args.host}:{args.port}")
+    print(f"   OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    print(f"   STABILITY_API_HOST=http://{args.host}:{args.port}")
+    web.run_app(FakeBackends(args.profile, args.seed).app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Профили задержек и ошибок локальных заглушек
+"""
+import random
+import threading
+from typing import Any, Dict, Optional
+
+
+class LatencyProfile:
+    """
+    Задержка и вероятность ошибки одного сервиса
+
+    Случайные величины берутся из собственного генератора с seed,
+    поэтому один и тот же прогон воспроизводит одну и ту же
+    последовательность задержек и ошибок.
+    """
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            jitter: float = 0.0,
+            error_rate: float = 0.0,
+            error_status: int = 500,
+            retry_after: Optional[float] = None,
+            token_interval: float = 0.0,
+            seed: int = 0
+    ):
+        """
+        Args:
+            latency: Средняя задержка ответа (сек)
+            jitter: Разброс задержки (сек, равномерно +-jitter)
+            error_rate: Доля запросов, завершающихся ошибкой
+            error_status: HTTP статус ошибки (429 - ограничение частоты)
+            retry_after: Значение Retry-After для ошибок (сек)
+            token_interval: Пауза между фрагментами потокового ответа (сек)
+            seed: Начальное значение генератора случайных чисел
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.token_interval = token_interval
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Задержка очередного ответа"""
+        with self._lock:
+            value = self.latency + self._random.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+        return max(value, 0.0)
+
+    def should_fail(self) -> bool:
+        """Завершить ли очередной запрос ошибкой"""
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+# Параметры профилей по сервисам: openai, sd3, sdxl, telegram
+PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    # Без задержек: проверка накладных расходов самого приложения
+    'instant': {
+        'openai': {},
+        'sd3': {},
+        'sdxl': {},
+        'telegram': {},
+    },
+    # Короткие задержки для быстрых прогонов
+    'fast': {
+        'openai': {'latency': 0.05, 'jitter': 0.02, 'token_interval': 0.002},
+        'sd3': {'latency': 0.2, 'jitter': 0.05},
+        'sdxl': {'latency': 0.3, 'jitter': 0.05},
+        'telegram': {'latency': 0.02, 'jitter': 0.01},
+    },
+    # Порядок задержек реальных сервисов
+    'realistic': {
+        'openai': {'latency': 2.0, 'jitter': 1.0, 'error_rate': 0.01, 'token_interval': 0.02},
+        'sd3': {'latency': 6.0, 'jitter': 3.0, 'error_rate': 0.02},
+        'sdxl': {'latency': 8.0, 'jitter': 2.0, 'error_rate': 0.01},
+        'telegram': {'latency': 0.3, 'jitter': 0.1, 'error_rate': 0.005},
+    },
+    # Частые ошибки и ограничения частоты: проверка повторов и circuit breaker
+    'flaky': {
+        'openai': {'latency': 0.5, 'jitter': 0.3, 'error_rate': 0.2, 'error_status': 429,
+                   'retry_after': 1, 'token_interval': 0.005},
+        'sd3': {'latency': 1.0, 'jitter': 2.0, 'error_rate': 0.3, 'error_status': 503},
+        'sdxl': {'latency': 1.5, 'jitter': 0.5, 'error_rate': 0.05},
+        'telegram': {'latency': 0.1, 'jitter': 0.05, 'error_rate': 0.1},
+    },
+    # SD3 недоступен
+    'sd3_down': {
+        'openai': {'latency': 0.05},
+        'sd3': {'latency': 0.05, 'error_rate': 1.0, 'error_status': 503},
+        'sdxl': {'latency': 0.3},
+        'telegram': {'latency': 0.02},
+    },
+}
+
+
+def get_profile(name: str, service: str, seed: int = 0) -> LatencyProfile:
+    """
+    Профиль сервиса по имени набора
+
+    Args:
+        name: Имя набора из PROFILES
+        service: openai, sd3, sdxl или telegram
+        seed: Начальное значение генератора
+    """
+    if name not in PROFILES:
+        raise ValueError(f"Неизвестный профиль заглушек: {name} (доступны: {', '.join(PROFILES)})")
+    return LatencyProfile(seed=seed, **PROFILES[name].get(service, {}))
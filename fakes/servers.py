@@ -0,0 +1,262 @@
+"""
+Локальные HTTP-заглушки OpenAI и Stability AI
+"""
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from PIL import Image
+
+from .profiles import get_profile
+
+_HEADLINES = ['Главное за минуту', 'Новый взгляд', 'Простые шаги', 'Стоит попробовать', 'Коротко о важном']
+
+
+def _digest(text: str) -> int:
+    """Детерминированное число из текста"""
+    return int(hashlib.sha256(text.encode('utf-8')).hexdigest()[:8], 16)
+
+
+class FakeBackends:
+    """
+    Заглушки API OpenAI (chat completions) и Stability AI (v2beta SD3, v1 SDXL)
+
+    Ответы детерминированы: зависят только от промпта. Задержки и ошибки
+    задаются профилем (см. fakes.profiles). Счетчики запросов и
+    TCP-соединений доступны по GET /_fake/stats.
+    """
+
+    def __init__(self, profile: str = 'fast', seed: int = 0, image_size=(288, 512)):
+        """
+        Args:
+            profile: Имя профиля задержек и ошибок
+            seed: Начальное значение генераторов профилей
+            image_size: Размер генерируемых PNG
+        """
+        self.profile = profile
+        self.profiles = {service: get_profile(profile, service, seed) for service in ('openai', 'sd3', 'sdxl')}
+        self.image_size = image_size
+        self._images: Dict[int, bytes] = {}
+        self._stats = {'requests': {}, 'errors': {}, 'connections': 0}
+        self._transports = set()
+
+    def app(self) -> web.Application:
+        """aiohttp-приложение с маршрутами заглушек"""
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post('/v1/chat/completions', self.chat_completions)
+        app.router.add_post('/v2beta/stable-image/generate/sd3', self.sd3)
+        app.router.add_post('/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image', self.sdxl)
+        app.router.add_get('/_fake/stats', self.stats)
+        app.router.add_post('/_fake/reset', self.reset)
+        return app
+
+    def _count(self, request: web.Request, service: str):
+        """Учет запроса и нового TCP-соединения"""
+        self._stats['requests'][service] = self._stats['requests'].get(service, 0) + 1
+        transport = request.transport
+        if transport is not None and id(transport) not in self._transports:
+            self._transports.add(id(transport))
+            self._stats['connections'] += 1
+
+    async def _simulate(self, service: str) -> Optional[web.Response]:
+        """Задержка по профилю; ответ с ошибкой, если она выпала"""
+        profile = self.profiles[service]
+        await asyncio.sleep(profile.delay())
+        if not profile.should_fail():
+            return None
+
+        self._stats['errors'][service] = self._stats['errors'].get(service, 0) + 1
+        headers = {}
+        if profile.retry_after is not None:
+            headers['Retry-After'] = str(profile.retry_after)
+        return web.json_response(
+            {'error': {'message': f'fake {service} error', 'type': 'server_error'}},
+            status=profile.error_status,
+            headers=headers
+        )
+
+    # --- OpenAI ---
+
+    @staticmethod
+    def _chat_content(payload: Dict[str, Any]) -> str:
+        """Детерминированный ответ по сообщениям запроса"""
+        messages = payload.get('messages') or []
+        system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+        prompt = messages[-1].get('content', '') if messages else ''
+        seed = _digest(prompt)
+        headline = _HEADLINES[seed % len(_HEADLINES)]
+        text = (f"✨ {headline}\n\nТестовый пост №{seed % 10000}. Здесь коротко о главном "
+                f"и призыв поделиться мнением в комментариях 👇\n\n#тест #контент")
+        image_prompt = (f"A bright minimalist illustration, scene {seed % 1000}, "
+                        f"soft light, modern style, vertical 9:16, no text")
+
+        if (payload.get('response_format') or {}).get('type') == 'json_object':
+            return json.dumps({'text': text, 'headline': headline, 'image_prompt': image_prompt}, ensure_ascii=False)
+        if 'image generation prompts' in system:
+            return image_prompt
+        if 'заголовк' in system:
+            return headline
+        return text
+
+    async def chat_completions(self, request: web.Request) -> web.StreamResponse:
+        self._count(request, 'openai')
+        payload = await request.json()
+        error = await self._simulate('openai')
+        if error is not None:
+            return error
+
+        content = self._chat_content(payload)
+        completion_id = f"chatcmpl-fake{_digest(content) % 10 ** 8}"
+        created = int(time.time())
+        model = payload.get('model', 'gpt-4o')
+
+        if not payload.get('stream'):
+            return web.json_response({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': created,
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': content},
+                    'finish_reason': 'stop'
+                }],
+                'usage': {'prompt_tokens': 100, 'completion_tokens': len(content) // 4, 'total_tokens': 100 + len(content) // 4}
+            })
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        interval = self.profiles['openai'].token_interval
+        words = content.split(' ')
+        for index, word in enumerate(words):
+            delta = word if index == 0 else ' ' + word
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': delta}, 'finish_reason': None}]
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            if interval:
+                await asyncio.sleep(interval)
+        final = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': created,
+            'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+        }
+        await response.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        await response.write_eof()
+        return response
+
+    # --- Stability AI ---
+
+    def _image(self, prompt: str) -> bytes:
+        """PNG, цвет которого зависит от промпта"""
+        seed = _digest(prompt)
+        image = self._images.get(seed)
+        if image is None:
+            color = ((seed >> 16) & 0xFF, (seed >> 8) & 0xFF, seed & 0xFF)
+            buffer = io.BytesIO()
+            Image.new('RGB', self.image_size, color).save(buffer, format='PNG')
+            image = self._images[seed] = buffer.getvalue()
+        return image
+
+    async def sd3(self, request: web.Request) -> web.Response:
+        self._count(request, 'sd3')
+        form = await request.post()
+        error = await self._simulate('sd3')
+        if error is not None:
+            return error
+        return web.Response(body=self._image(str(form.get('prompt', ''))), content_type='image/png')
+
+    async def sdxl(self, request: web.Request) -> web.Response:
+        self._count(request, 'sdxl')
+        payload = await request.json()
+        error = await self._simulate('sdxl')
+        if error is not None:
+            return error
+        prompt = (payload.get('text_prompts') or [{}])[0].get('text', '')
+        return web.json_response({
+            'artifacts': [{
+                'base64': base64.b64encode(self._image(prompt)).decode(),
+                'seed': _digest(prompt),
+                'finishReason': 'SUCCESS'
+            }]
+        })
+
+    # --- Служебные ---
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({'profile': self.profile, **self._stats})
+
+    async def reset(self, request: web.Request) -> web.Response:
+        self._stats = {'requests': {}, 'errors': {}, 'connections': 0}
+        self._transports.clear()
+        return web.json_response({'success': True})
+
+
+class FakeServerThread:
+    """Заглушки в фоновом потоке (для бенчмарков и скриптов)"""
+
+    def __init__(self, profile: str = 'fast', host: str = '127.0.0.1', port: int = 0, seed: int = 0):
+        """
+        Args:
+            profile: Имя профиля задержек и ошибок
+            host: Адрес
+            port: Порт (0 - любой свободный)
+            seed: Начальное значение генераторов профилей
+        """
+        self.backends = FakeBackends(profile, seed)
+        self.host = host
+        self.port = port
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        """Адрес заглушек (STABILITY_API_HOST; для OPENAI_BASE_URL - с /v1)"""
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> 'FakeServerThread':
+        """Запуск сервера; возвращается после того, как порт открыт"""
+        self._thread = threading.Thread(target=self._run, name='fake-backends', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(self.backends.app(), access_log=None)
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    def stop(self):
+        """Остановка сервера"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
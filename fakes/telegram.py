@@ -0,0 +1,194 @@
+"""
+Локальная заглушка клиента Telethon
+"""
+import asyncio
+import hashlib
+import itertools
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Union
+
+from telethon import utils as tg_utils
+from telethon.errors import FloodWaitError, RPCError
+from telethon.sessions import StringSession
+from telethon.tl import types
+from telethon.tl.functions.messages import (
+    DeleteScheduledMessagesRequest,
+    EditMessageRequest,
+    GetScheduledHistoryRequest
+)
+from telethon.tl.functions.stories import SendStoryRequest
+
+from .profiles import LatencyProfile, get_profile
+
+
+class FakeTelegramClient:
+    """
+    Заглушка TelegramClient для публикации без сети
+
+    Реализует вызовы, которые использует TelegramManager: подключение,
+    проверку авторизации, get_entity, upload_file, send_message,
+    send_file, SendStoryRequest и запросы отложенных сообщений.
+    Возвращает настоящие типы Telethon, поэтому кэши пиров и медиа
+    работают как с реальным клиентом. Задержки и ошибки (в том числе
+    FloodWait) задаются профилем; пользователь всегда авторизован.
+    """
+
+    def __init__(
+            self,
+            session: Optional[StringSession] = None,
+            profile: Union[str, LatencyProfile] = 'fast',
+            seed: int = 0,
+            upload_bandwidth: float = 5 * 1024 * 1024
+    ):
+        """
+        Args:
+            session: Сессия (сохраняется только для совместимости)
+            profile: Имя профиля или LatencyProfile
+            seed: Начальное значение генератора профиля
+            upload_bandwidth: Скорость загрузки файлов (байт/сек)
+        """
+        self.session = session or StringSession()
+        self.profile = get_profile(profile, 'telegram', seed) if isinstance(profile, str) else profile
+        self.upload_bandwidth = upload_bandwidth
+        self._connected = False
+        self._ids = itertools.count(1)
+        self._scheduled: Dict[int, Dict[int, types.Message]] = {}
+        self.calls: Dict[str, int] = {}
+
+    async def _simulate(self, method: str, extra_delay: float = 0.0):
+        """Задержка и, если выпала, ошибка по профилю"""
+        self.calls[method] = self.calls.get(method, 0) + 1
+        await asyncio.sleep(self.profile.delay() + extra_delay)
+        if self.profile.should_fail():
+            if self.profile.error_status == 429:
+                raise FloodWaitError(request=None, capture=int(self.profile.retry_after or 1))
+            raise RPCError(request=None, message=f'FAKE_{method.upper()}_ERROR', code=500)
+
+    # --- Соединение и авторизация ---
+
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def connect(self):
+        await self._simulate('connect')
+        self._connected = True
+
+    async def disconnect(self):
+        self._connected = False
+
+    async def is_user_authorized(self) -> bool:
+        return True
+
+    async def get_me(self):
+        await self._simulate('get_me')
+        return types.User(
+            id=1000000,
+            is_self=True,
+            access_hash=1,
+            first_name='Fake',
+            last_name='User',
+            username='fake_user',
+            phone='0000000000',
+            premium=True
+        )
+
+    async def log_out(self) -> bool:
+        self._connected = False
+        return True
+
+    async def qr_login(self):
+        raise RuntimeError('Заглушка Telegram не поддерживает QR-авторизацию: пользователь уже авторизован')
+
+    # --- Сущности и файлы ---
+
+    @staticmethod
+    def _chat_id(target: Any) -> int:
+        """Стабильный ID чата по username или ID"""
+        if isinstance(target, int):
+            return abs(target) % 10 ** 9 or 1
+        return int(hashlib.sha256(str(target).encode('utf-8')).hexdigest()[:7], 16) + 1
+
+    async def get_entity(self, target: Any):
+        await self._simulate('get_entity')
+        return types.Chat(
+            id=self._chat_id(target),
+            title=f"Fake {target}",
+            photo=types.ChatPhotoEmpty(),
+            participants_count=1,
+            date=None,
+            version=1
+        )
+
+    async def get_input_entity(self, target: Any):
+        return tg_utils.get_input_peer(await self.get_entity(target))
+
+    async def upload_file(self, file, **kwargs):
+        data = file.getvalue() if hasattr(file, 'getvalue') else bytes(file)
+        await self._simulate('upload_file', len(data) / self.upload_bandwidth)
+        return types.InputFile(
+            id=next(self._ids),
+            parts=max(1, len(data) // (512 * 1024) + 1),
+            name=getattr(file, 'name', 'image.jpg'),
+            md5_checksum=''
+        )
+
+    # --- Сообщения ---
+
+    @staticmethod
+    def _peer(peer) -> types.PeerChat:
+        """Peer сообщения по InputPeer"""
+        return types.PeerChat(chat_id=getattr(peer, 'chat_id', None) or getattr(peer, 'channel_id', 1))
+
+    def _message(self, peer, text: str, media=None, schedule: Optional[datetime] = None) -> types.Message:
+        """Сообщение; отложенное сохраняется для GetScheduledHistoryRequest"""
+        message = types.Message(
+            id=next(self._ids),
+            peer_id=self._peer(peer),
+            date=schedule or datetime.now(timezone.utc),
+            message=text,
+            media=media,
+            out=True,
+            from_scheduled=True if schedule else None
+        )
+        if schedule is not None:
+            self._scheduled.setdefault(message.peer_id.chat_id, {})[message.id] = message
+        return message
+
+    async def send_message(self, peer, text: str, schedule: Optional[datetime] = None, **kwargs):
+        await self._simulate('send_message')
+        return self._message(peer, text, schedule=schedule)
+
+    async def send_file(self, peer, file, caption: str = '', schedule: Optional[datetime] = None, **kwargs):
+        await self._simulate('send_file')
+        photo_id = file.id.id if isinstance(file, types.InputMediaPhoto) else next(self._ids)
+        photo = types.Photo(id=photo_id, access_hash=photo_id, file_reference=b'', date=None, sizes=[], dc_id=2)
+        return self._message(peer, caption, media=types.MessageMediaPhoto(photo=photo), schedule=schedule)
+
+    # --- Прямые запросы TL ---
+
+    async def __call__(self, request, *args, **kwargs):
+        method = type(request).__name__
+        await self._simulate(method)
+
+        if isinstance(request, SendStoryRequest):
+            return types.Updates(updates=[], users=[], chats=[], date=datetime.now(timezone.utc), seq=0)
+
+        if isinstance(request, GetScheduledHistoryRequest):
+            messages: List[types.Message] = list(self._scheduled.get(self._peer(request.peer).chat_id, {}).values())
+            return types.messages.Messages(messages=messages, chats=[], users=[])
+
+        if isinstance(request, EditMessageRequest):
+            message = self._scheduled.get(self._peer(request.peer).chat_id, {}).get(request.id)
+            if message is None:
+                raise RPCError(request=request, message='MESSAGE_ID_INVALID', code=400)
+            if request.schedule_date is not None:
+                message.date = request.schedule_date
+            return types.Updates(updates=[], users=[], chats=[], date=datetime.now(timezone.utc), seq=0)
+
+        if isinstance(request, DeleteScheduledMessagesRequest):
+            scheduled = self._scheduled.get(self._peer(request.peer).chat_id, {})
+            for message_id in request.id:
+                scheduled.pop(message_id, None)
+            return types.Updates(updates=[], users=[], chats=[], date=datetime.now(timezone.utc), seq=0)
+
+        raise NotImplementedError(f"Заглушка Telegram не поддерживает {method}")
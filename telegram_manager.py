@@ -4,21 +4,26 @@
 """
 
 import asyncio
-import io
+import concurrent.futures
 import json
 import os
 import sys
+import threading
 import time
-from typing import Optional, Dict, Any, Tuple
-from datetime import datetime
+from typing import Optional, Dict, Any, Tuple, Iterator, List
+from datetime import datetime, timezone
 from pathlib import Path
 
 # Импорты Telethon
 from telethon import TelegramClient
 from telethon.sessions import StringSession
+from telethon.tl.functions.messages import (
+    DeleteScheduledMessagesRequest,
+    EditMessageRequest,
+    GetScheduledHistoryRequest
+)
 from telethon.tl.functions.stories import SendStoryRequest
 from telethon.tl.types import (
-    InputMediaUploadedPhoto,
     InputPrivacyValueAllowAll,
     InputPrivacyValueAllowContacts
 )
@@ -26,9 +31,16 @@ from telethon.errors import (
     SessionPasswordNeededError,
     PhoneCodeExpiredError,
     PhoneCodeInvalidError,
-    FloodWaitError
+    FloodWaitError,
+    UnauthorizedError
 )
 
+from config import Config
+from utils.async_loop import AsyncLoopThread
+from utils.media_cache import MediaCache, STALE_MEDIA_ERRORS
+from utils.peer_cache import PeerCache, STALE_PEER_ERRORS
+from utils.rate_scheduler import RateScheduler, RateLimitedClient, deadline_scope
+
 # Для QR-кода
 try:
     import qrcode
@@ -66,9 +78,31 @@ class TelegramManager:
         # Загружаем сессию если есть
         self.session_string = self._load_session()
 
-        # Клиент будет создаваться при необходимости
-        self._client = None
-        self._loop = None
+        # Постоянный кэш InputPeer групп/каналов этого аккаунта
+        peers_file = f"{phone}.fake.peers.json" if Config.TELEGRAM_BACKEND == 'fake' else f"{phone}.peers.json"
+        self.peer_cache = PeerCache(self.session_dir / peers_file)
+
+        # Загруженные изображения: одни и те же байты передаются один раз
+        self.media_cache = MediaCache(upload_ttl=Config.TELEGRAM_UPLOAD_TTL)
+
+        # Планировщик запросов аккаунта: FloodWait откладывает запросы, а не отклоняет
+        self.rate_scheduler = RateScheduler(
+            limits=Config.TELEGRAM_RATE_LIMITS,
+            max_flood_wait=Config.TELEGRAM_FLOOD_MAX_WAIT
+        )
+
+        # Постоянный клиент: подключается лениво и живет весь процесс.
+        # Подключение и сброс - под блокировкой, чтобы одновременные
+        # вызовы не подключали один клиент параллельно
+        self._client: Optional[TelegramClient] = None
+        self._client_lock = asyncio.Lock()
+
+        # Собственный event loop в отдельном потоке, общий для всех запросов
+        self._runner = AsyncLoopThread(name=f"telegram-{phone}")
+
+        # Кэш состояния авторизации и данных пользователя
+        self._auth_lock = threading.Lock()
+        self._auth_state: Optional[Dict[str, Any]] = None
 
     def _load_session(self) -> Optional[str]:
         """Загрузка сессии из файла"""
@@ -91,57 +125,164 @@ class TelegramManager:
         with open(self.session_file, 'w') as f:
             json.dump(data, f, indent=2)
 
-    def _get_loop(self):
-        """Получение или создание event loop"""
-        try:
-            loop = asyncio.get_running_loop()
-            return loop
-        except RuntimeError:
-            # Нет активного loop, создаем новый
-            if self._loop is None:
-                self._loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(self._loop)
-            return self._loop
-
-    def _run_async(self, coro):
-        """Запуск асинхронной функции синхронно"""
-        loop = self._get_loop()
-
-        # Если loop уже запущен (из Flask), используем run_coroutine_threadsafe
-        if loop.is_running():
-            import concurrent.futures
-            future = asyncio.run_coroutine_threadsafe(coro, loop)
-            return future.result(timeout=30)
-        else:
-            # Обычный запуск
-            return loop.run_until_complete(coro)
-
-    async def _create_client(self) -> TelegramClient:
-        """Создание клиента Telegram"""
+    def submit_async(self, coro) -> concurrent.futures.Future:
+        """
+        Отправка корутины в event loop менеджера без ожидания
+
+        Args:
+            coro: Корутина
+
+        Returns:
+            Future с результатом (поддерживает cancel())
+        """
+        return self._runner.submit(coro)
+
+    def _run_async(self, coro, timeout: Optional[float] = None):
+        """
+        Запуск асинхронной функции синхронно
+
+        Args:
+            coro: Корутина
+            timeout: Таймаут в секундах (по умолчанию Config.TELEGRAM_TIMEOUT)
+        """
+        if timeout is None:
+            timeout = Config.TELEGRAM_TIMEOUT
+        return self._runner.run(coro, timeout=timeout)
+
+    def _create_client(self) -> TelegramClient:
+        """Создание клиента Telegram (без подключения)"""
         session = StringSession(self.session_string) if self.session_string else StringSession()
 
-        client = TelegramClient(
+        if Config.TELEGRAM_BACKEND == 'fake':
+            from fakes import FakeTelegramClient
+            return FakeTelegramClient(session, profile=Config.FAKE_PROFILE)
+
+        return TelegramClient(
             session,
             self.api_id,
             self.api_hash,
             connection_retries=5,
             retry_delay=1,
-            auto_reconnect=True
+            auto_reconnect=True,
+            # FloodWait обрабатывает RateScheduler, а не встроенный sleep Telethon
+            flood_sleep_threshold=0
         )
 
-        await client.connect()
-        return client
+    async def _get_client(self) -> TelegramClient:
+        """
+        Получение постоянного клиента
+
+        Клиент создается при первом обращении и переиспользуется между
+        вызовами, поэтому MTProto-рукопожатие выполняется один раз на процесс.
+        Если соединение потеряно, клиент переподключается; одновременные
+        вызовы ждут одного подключения.
+        Сетевые вызовы возвращенного клиента идут через rate_scheduler.
+        """
+        client = self._client
+        if client is None or not client.is_connected():
+            async with self._client_lock:
+                # Пока ждали блокировку, клиент мог подключить другой вызов
+                if self._client is None:
+                    self._client = self._create_client()
+                client = self._client
+
+                if not client.is_connected():
+                    try:
+                        await client.connect()
+                    except Exception:
+                        # Не оставляем полуживой клиент: следующий вызов создаст новый
+                        self._client = None
+                        await self._disconnect(client)
+                        raise
+
+        return RateLimitedClient(client, self.rate_scheduler)
+
+    async def _drop_client(self):
+        """Отключение и сброс постоянного клиента"""
+        async with self._client_lock:
+            client, self._client = self._client, None
+            await self._disconnect(client)
+
+    @staticmethod
+    async def _disconnect(client: Optional[TelegramClient]):
+        """Отключение клиента без ошибок"""
+        if client is not None:
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+
+    def close(self):
+        """Корректное завершение работы: отключение клиента и остановка loop"""
+        if self._client is not None:
+            try:
+                self._run_async(self._drop_client())
+            except Exception:
+                self._client = None
+        self._runner.stop()
+
+    def _cached_auth(self) -> Optional[Dict[str, Any]]:
+        """Актуальное закэшированное состояние авторизации или None"""
+        with self._auth_lock:
+            state = self._auth_state
+            if state and time.monotonic() - state['checked_at'] < Config.TELEGRAM_AUTH_CACHE_TTL:
+                return state
+            return None
+
+    def _remember_auth(self, authorized: bool, user: Optional[Dict[str, Any]] = None):
+        """Сохранение состояния авторизации в кэш"""
+        with self._auth_lock:
+            self._auth_state = {
+                'authorized': authorized,
+                'user': user if authorized else None,
+                'checked_at': time.monotonic()
+            }
+
+    def get_rate_status(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Состояние планировщика запросов
+
+        Returns:
+            По методам API: текущая скорость, очередь, оценка ожидания, число FloodWait
+        """
+        return self.rate_scheduler.snapshot()
+
+    def invalidate_auth_cache(self):
+        """Сброс кэша авторизации (следующая проверка пойдет в сеть)"""
+        with self._auth_lock:
+            self._auth_state = None
+
+    @staticmethod
+    def _user_to_dict(me) -> Dict[str, Any]:
+        """Преобразование пользователя Telethon в словарь"""
+        return {
+            'id': me.id,
+            'first_name': me.first_name,
+            'last_name': me.last_name,
+            'phone': me.phone,
+            'username': me.username,
+            'premium': getattr(me, 'premium', False)
+        }
+
+    async def _check_authorized(self, client: TelegramClient) -> bool:
+        """Проверка авторизации с использованием кэша"""
+        state = self._cached_auth()
+        if state is not None:
+            return state['authorized']
+
+        authorized = await client.is_user_authorized()
+        self._remember_auth(authorized)
+        return authorized
 
     def is_authorized(self) -> bool:
-        """Проверка авторизации"""
+        """Проверка авторизации (ответ кэшируется на Config.TELEGRAM_AUTH_CACHE_TTL)"""
+        state = self._cached_auth()
+        if state is not None:
+            return state['authorized']
 
         async def _check():
-            client = await self._create_client()
-            try:
-                authorized = await client.is_user_authorized()
-                return authorized
-            finally:
-                await client.disconnect()
+            client = await self._get_client()
+            return await self._check_authorized(client)
 
         try:
             return self._run_async(_check())
@@ -157,21 +298,17 @@ class TelegramManager:
         """
 
         async def _qr_auth():
-            client = await self._create_client()
+            client = await self._get_client()
             try:
                 # Проверяем, уже авторизованы?
                 if await client.is_user_authorized():
                     me = await client.get_me()
+                    user = self._user_to_dict(me)
+                    self._remember_auth(True, user)
                     return {
                         'success': True,
                         'message': 'Уже авторизован',
-                        'user': {
-                            'id': me.id,
-                            'first_name': me.first_name,
-                            'last_name': me.last_name,
-                            'phone': me.phone,
-                            'username': me.username
-                        }
+                        'user': user
                     }
 
                 # Генерируем QR-код
@@ -214,16 +351,13 @@ class TelegramManager:
                         self.session_string = client.session.save()
                         self._save_session(self.session_string)
 
+                        user = self._user_to_dict(me)
+                        self._remember_auth(True, user)
+
                         return {
                             'success': True,
                             'message': 'Успешная авторизация через QR-код',
-                            'user': {
-                                'id': me.id,
-                                'first_name': me.first_name,
-                                'last_name': me.last_name,
-                                'phone': me.phone,
-                                'username': me.username
-                            }
+                            'user': user
                         }
                     except asyncio.TimeoutError:
                         # Продолжаем ожидание
@@ -246,10 +380,9 @@ class TelegramManager:
                     'success': False,
                     'error': str(e)
                 }
-            finally:
-                await client.disconnect()
 
-        return self._run_async(_qr_auth())
+        # Ожидание сканирования длится до 2 минут
+        return self._run_async(_qr_auth(), timeout=150)
 
     def get_qr_code(self) -> Tuple[bool, str]:
         """
@@ -260,7 +393,7 @@ class TelegramManager:
         """
 
         async def _get_qr():
-            client = await self._create_client()
+            client = await self._get_client()
             try:
                 if await client.is_user_authorized():
                     return True, "Уже авторизован"
@@ -274,9 +407,6 @@ class TelegramManager:
 
             except Exception as e:
                 return False, str(e)
-            finally:
-                # Не отключаемся, чтобы можно было проверить авторизацию
-                pass
 
         return self._run_async(_get_qr())
 
@@ -299,26 +429,22 @@ class TelegramManager:
                 # Проверяем с небольшим таймаутом
                 await self._qr_login.wait(timeout=1)
 
-                # Если успешно, получаем данные пользователя
-                client = await self._create_client()
+                # Если успешно, получаем данные пользователя тем же клиентом,
+                # на котором был запрошен QR-код
+                client = await self._get_client()
                 me = await client.get_me()
 
                 # Сохраняем сессию
                 self.session_string = client.session.save()
                 self._save_session(self.session_string)
 
-                await client.disconnect()
+                user = self._user_to_dict(me)
+                self._remember_auth(True, user)
 
                 return {
                     'success': True,
                     'authorized': True,
-                    'user': {
-                        'id': me.id,
-                        'first_name': me.first_name,
-                        'last_name': me.last_name,
-                        'phone': me.phone,
-                        'username': me.username
-                    }
+                    'user': user
                 }
             except asyncio.TimeoutError:
                 return {
@@ -334,145 +460,569 @@ class TelegramManager:
 
         return self._run_async(_check())
 
-    def publish_personal_story(self, image_bytes: bytes, caption: str = "") -> Dict[str, Any]:
+    async def _publish_personal_story_async(self, client: TelegramClient, image_bytes: bytes,
+                                            caption: str = "") -> Dict[str, Any]:
         """
-        Публикация личной истории (Story)
+        Публикация личной истории на уже подключенном клиенте
 
         Args:
+            client: Подключенный клиент
             image_bytes: Изображение в байтах
             caption: Подпись к истории
 
         Returns:
             Результат публикации
         """
+        try:
+            # Проверяем авторизацию
+            if not await self._check_authorized(client):
+                return {
+                    'success': False,
+                    'error': 'Не авторизован. Выполните авторизацию через QR-код'
+                }
 
-        async def _publish():
-            client = await self._create_client()
-            try:
-                # Проверяем авторизацию
-                if not await client.is_user_authorized():
-                    return {
-                        'success': False,
-                        'error': 'Не авторизован. Выполните авторизацию через QR-код'
-                    }
-
-                # Подготавливаем изображение
-                image_file = io.BytesIO(image_bytes)
-                image_file.name = 'story.jpg'
-                image_file.seek(0)
-
-                # Загружаем файл
-                uploaded_file = await client.upload_file(image_file)
-                media = InputMediaUploadedPhoto(file=uploaded_file)
+            # Настройки приватности (для всех)
+            privacy_rules = [InputPrivacyValueAllowAll()]
 
-                # Настройки приватности (для всех)
-                privacy_rules = [InputPrivacyValueAllowAll()]
+            # Ограничение на длину подписи
+            story_caption = caption if len(caption) <= 200 else caption[:197] + "..."
 
-                # Ограничение на длину подписи
-                if len(caption) > 200:
-                    caption = caption[:197] + "..."
+            async def _send(refresh: bool = False):
+                # Загружаем файл (или берем уже загруженный)
+                _, media = await self.media_cache.story_media(client, image_bytes, refresh=refresh)
 
                 # Публикуем историю
-                result = await client(SendStoryRequest(
+                return await client(SendStoryRequest(
                     peer='me',  # Личная история
                     media=media,
-                    caption=caption,
+                    caption=story_caption,
                     privacy_rules=privacy_rules,
                     pinned=False,  # Не закрепляем
                     noforwards=False,  # Разрешаем пересылку
                     period=86400  # 24 часа
                 ))
 
+            try:
+                result = await _send()
+            except STALE_MEDIA_ERRORS:
+                # Загруженные части истекли на сервере: загружаем заново
+                result = await _send(refresh=True)
+
+            return {
+                'success': True,
+                'message': 'История успешно опубликована',
+                'story_id': result.updates[0].id if result.updates else None
+            }
+
+        except UnauthorizedError:
+            # Сессия отозвана на стороне Telegram
+            self._remember_auth(False)
+            return {
+                'success': False,
+                'error': 'Не авторизован. Выполните авторизацию через QR-код'
+            }
+        except FloodWaitError as e:
+            return {
+                'success': False,
+                'error': f'Слишком много запросов. Подождите {e.seconds} секунд',
+                'retry_after': e.seconds
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Ошибка публикации: {str(e)}'
+            }
+
+    async def _publish_to_group_async(self, client: TelegramClient, group_id: str, text: str,
+                                      image_bytes: Optional[bytes] = None,
+                                      schedule_date: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Публикация поста в группу на уже подключенном клиенте
+
+        Args:
+            client: Подключенный клиент
+            group_id: ID или username группы
+            text: Текст поста
+            image_bytes: Изображение (опционально)
+            schedule_date: Время отложенной отправки на стороне Telegram (опционально)
+
+        Returns:
+            Результат публикации
+        """
+        try:
+            # Проверяем авторизацию
+            if not await self._check_authorized(client):
                 return {
-                    'success': True,
-                    'message': 'История успешно опубликована',
-                    'story_id': result.updates[0].id if result.updates else None
+                    'success': False,
+                    'error': 'Не авторизован. Выполните авторизацию через QR-код'
                 }
 
-            except FloodWaitError as e:
+            # Получаем сущность группы (из постоянного кэша, если есть)
+            try:
+                entity = await self.peer_cache.resolve(client, group_id)
+            except:
                 return {
                     'success': False,
-                    'error': f'Слишком много запросов. Подождите {e.seconds} секунд'
+                    'error': f'Группа {group_id} не найдена'
                 }
-            except Exception as e:
+
+            async def _send(peer):
+                if not image_bytes:
+                    # Только текст
+                    return await client.send_message(peer, text, schedule=schedule_date)
+
+                # С изображением: уже отправленное фото или загруженный один раз файл
+                key, media = await self.media_cache.message_media(client, image_bytes)
+                try:
+                    sent = await client.send_file(peer, media, caption=text, schedule=schedule_date)
+                except STALE_MEDIA_ERRORS:
+                    key, media = await self.media_cache.message_media(client, image_bytes, refresh=True)
+                    sent = await client.send_file(peer, media, caption=text, schedule=schedule_date)
+                self.media_cache.remember_photo(key, sent)
+                return sent
+
+            # Отправляем сообщение
+            try:
+                message = await _send(entity)
+            except STALE_PEER_ERRORS:
+                # access_hash устарел: разрешаем группу заново и повторяем
+                self.peer_cache.invalidate(group_id)
+                entity = await self.peer_cache.resolve(client, group_id, refresh=True)
+                message = await _send(entity)
+
+            if schedule_date is not None:
                 return {
-                    'success': False,
-                    'error': f'Ошибка публикации: {str(e)}'
+                    'success': True,
+                    'message': 'Пост запланирован в Telegram',
+                    'message_id': message.id,
+                    'chat_id': message.chat_id,
+                    'schedule_date': schedule_date.isoformat()
                 }
-            finally:
-                await client.disconnect()
 
-        return self._run_async(_publish())
+            return {
+                'success': True,
+                'message': 'Пост успешно опубликован',
+                'message_id': message.id,
+                'chat_id': message.chat_id
+            }
+
+        except UnauthorizedError:
+            # Сессия отозвана на стороне Telegram
+            self._remember_auth(False)
+            return {
+                'success': False,
+                'error': 'Не авторизован. Выполните авторизацию через QR-код'
+            }
+        except FloodWaitError as e:
+            return {
+                'success': False,
+                'error': f'Слишком много запросов. Подождите {e.seconds} секунд',
+                'retry_after': e.seconds
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': f'Ошибка публикации: {str(e)}'
+            }
+
+    @staticmethod
+    async def _run_target(coro, timeout: Optional[float]) -> Dict[str, Any]:
+        """
+        Выполнение одной цели публикации с собственным таймаутом
+
+        Args:
+            coro: Корутина публикации
+            timeout: Таймаут в секундах (None - без ограничения)
 
-    def publish_to_group(self, group_id: str, text: str, image_bytes: Optional[bytes] = None) -> Dict[str, Any]:
+        Returns:
+            Результат публикации или ошибка таймаута
+        """
+        try:
+            # Планировщик запросов не ждет дольше таймаута цели: длинная
+            # очередь или FloodWait сразу возвращаются с retry_after
+            with deadline_scope(timeout):
+                return await asyncio.wait_for(coro, timeout=timeout)
+        except asyncio.TimeoutError:
+            return {
+                'success': False,
+                'error': f'Превышено время ожидания ({timeout} сек)'
+            }
+
+    def publish_personal_story(
+            self,
+            image_bytes: bytes,
+            caption: str = "",
+            timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Публикация личной истории (Story)
+
+        Очередь планировщика и FloodWait ограничены таймаутом: если ждать
+        дольше, сразу возвращается ошибка с retry_after.
+
+        Args:
+            image_bytes: Изображение в байтах
+            caption: Подпись к истории
+            timeout: Таймаут в секундах (по умолчанию Config.TELEGRAM_PUBLISH_TIMEOUT)
+
+        Returns:
+            Результат публикации
+        """
+
+        async def _publish():
+            client = await self._get_client()
+            return await self._publish_personal_story_async(client, image_bytes, caption)
+
+        timeout = timeout or Config.TELEGRAM_PUBLISH_TIMEOUT
+        return self._run_async(self._run_target(_publish(), timeout), timeout=timeout + Config.TELEGRAM_TIMEOUT)
+
+    def publish_to_group(
+            self,
+            group_id: str,
+            text: str,
+            image_bytes: Optional[bytes] = None,
+            timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Публикация поста в группу
 
+        Очередь планировщика и FloodWait ограничены таймаутом: если ждать
+        дольше, сразу возвращается ошибка с retry_after.
+
         Args:
             group_id: ID или username группы
             text: Текст поста
             image_bytes: Изображение (опционально)
+            timeout: Таймаут в секундах (по умолчанию Config.TELEGRAM_PUBLISH_TIMEOUT)
 
         Returns:
             Результат публикации
         """
 
         async def _publish():
-            client = await self._create_client()
-            try:
-                # Проверяем авторизацию
-                if not await client.is_user_authorized():
-                    return {
-                        'success': False,
-                        'error': 'Не авторизован. Выполните авторизацию через QR-код'
-                    }
+            client = await self._get_client()
+            return await self._publish_to_group_async(client, group_id, text, image_bytes)
+
+        timeout = timeout or Config.TELEGRAM_PUBLISH_TIMEOUT
+        return self._run_async(self._run_target(_publish(), timeout), timeout=timeout + Config.TELEGRAM_TIMEOUT)
+
+    def publish_fanout(
+            self,
+            group_id: str,
+            text: str,
+            image_bytes: Optional[bytes] = None,
+            story_caption: str = "",
+            publish_story: bool = True,
+            timeouts: Optional[Dict[str, float]] = None,
+            publish_group: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Одновременная публикация поста в группу и личной Story
+
+        Цели выполняются параллельно на одном соединении, изображение
+        загружается один раз, поэтому общее время равно времени самой
+        медленной цели, а не их сумме.
+
+        Args:
+            group_id: ID или username группы
+            text: Текст поста
+            image_bytes: Изображение (опционально; без него Story не публикуется)
+            story_caption: Подпись к Story
+            publish_story: Публиковать ли личную Story
+            timeouts: Таймауты по целям {'group': сек, 'story': сек}
+                      (по умолчанию Config.TELEGRAM_PUBLISH_TIMEOUT)
+            publish_group: Публиковать ли в группу (False - например, при
+                           повторе, когда в группу пост уже отправлен)
+
+        Returns:
+            {'success': все цели успешны, 'targets': {цель: результат}}
+        """
+        timeouts = timeouts or {}
+
+        async def _fanout():
+            client = await self._get_client()
+
+            targets = {}
+            if publish_group:
+                targets['group'] = self._publish_to_group_async(client, group_id, text, image_bytes)
+            if image_bytes and publish_story:
+                targets['story'] = self._publish_personal_story_async(client, image_bytes, story_caption)
+
+            results = await asyncio.gather(*(
+                self._run_target(coro, timeouts.get(name, Config.TELEGRAM_PUBLISH_TIMEOUT))
+                for name, coro in targets.items()
+            ))
+            by_target = dict(zip(targets, results))
+
+            return {
+                'success': all(result['success'] for result in by_target.values()),
+                'targets': by_target
+            }
+
+        # Каждая цель ограничена своим таймаутом, общий - самым долгим из них
+        overall = max([Config.TELEGRAM_PUBLISH_TIMEOUT, *timeouts.values()]) + Config.TELEGRAM_TIMEOUT
+        return self._run_async(_fanout(), timeout=overall)
+
+    def iter_publish_to_groups(
+            self,
+            group_ids: List[str],
+            text: str,
+            image_bytes: Optional[bytes] = None,
+            concurrency: Optional[int] = None,
+            timeout: Optional[float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Публикация одного поста в несколько групп/каналов
+
+        Изображение загружается один раз, отправка идет параллельно
+        (не больше concurrency одновременно). Результаты отдаются
+        по мере готовности, а не в порядке group_ids.
+
+        Args:
+            group_ids: Список ID или username групп
+            text: Текст поста
+            image_bytes: Изображение (опционально)
+            concurrency: Лимит параллельных отправок
+                         (по умолчанию Config.TELEGRAM_PUBLISH_CONCURRENCY)
+            timeout: Таймаут одной цели (по умолчанию Config.TELEGRAM_PUBLISH_TIMEOUT)
+
+        Yields:
+            Результат публикации с ключом 'group_id'
+        """
+        concurrency = concurrency or Config.TELEGRAM_PUBLISH_CONCURRENCY
+        timeout = timeout or Config.TELEGRAM_PUBLISH_TIMEOUT
+        # Семафор привязывается к loop менеджера при первом использовании
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _publish_one(group_id):
+            async with semaphore:
+                client = await self._get_client()
+                result = await self._run_target(
+                    self._publish_to_group_async(client, group_id, text, image_bytes),
+                    timeout
+                )
+            result['group_id'] = group_id
+            return result
+
+        # Повторяющиеся цели публикуем один раз
+        unique_ids = list(dict.fromkeys(str(group_id) for group_id in group_ids))
+        futures = {self.submit_async(_publish_one(group_id)): group_id for group_id in unique_ids}
 
-                # Получаем сущность группы
+        try:
+            for future in concurrent.futures.as_completed(futures):
                 try:
-                    entity = await client.get_entity(group_id)
-                except:
-                    return {
+                    yield future.result()
+                except Exception as e:
+                    yield {
                         'success': False,
-                        'error': f'Группа {group_id} не найдена'
+                        'group_id': futures[future],
+                        'error': f'Ошибка публикации: {str(e)}'
                     }
+        finally:
+            # Если получатель результатов ушел, не публикуем оставшееся
+            for future in futures:
+                future.cancel()
+
+    def publish_to_groups(
+            self,
+            group_ids: List[str],
+            text: str,
+            image_bytes: Optional[bytes] = None,
+            concurrency: Optional[int] = None,
+            timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """
+        Публикация одного поста в несколько групп/каналов с ожиданием всех результатов
+
+        Args:
+            group_ids: Список ID или username групп
+            text: Текст поста
+            image_bytes: Изображение (опционально)
+            concurrency: Лимит параллельных отправок
+            timeout: Таймаут одной цели
+
+        Returns:
+            {'success': все цели успешны, 'targets': {group_id: результат}}
+        """
+        targets = {
+            result['group_id']: result
+            for result in self.iter_publish_to_groups(group_ids, text, image_bytes, concurrency, timeout)
+        }
+        return {
+            'success': all(result['success'] for result in targets.values()),
+            'targets': targets
+        }
+
+    @staticmethod
+    def _to_datetime(value) -> datetime:
+        """Unix timestamp или datetime -> datetime с часовым поясом"""
+        if isinstance(value, datetime):
+            return value if value.tzinfo else value.astimezone()
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+
+    async def _with_peer(self, client: TelegramClient, group_id: str, action):
+        """
+        Выполнение действия над группой с повтором после устаревшего access_hash
+
+        Args:
+            client: Подключенный клиент
+            group_id: ID или username группы
+            action: Корутинная функция action(peer)
+        """
+        peer = await self.peer_cache.resolve(client, group_id)
+        try:
+            return await action(peer)
+        except STALE_PEER_ERRORS:
+            self.peer_cache.invalidate(group_id)
+            peer = await self.peer_cache.resolve(client, group_id, refresh=True)
+            return await action(peer)
+
+    def schedule_posts(
+            self,
+            group_id: str,
+            posts: List[Dict[str, Any]],
+            concurrency: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Массовая отправка отложенных сообщений (schedule_date Telegram)
+
+        Весь календарь отправляется за одну сессию соединения, а публикует
+        сообщения уже сам Telegram - процессу не нужно работать в момент
+        публикации. Telegram хранит до 100 отложенных сообщений на чат.
+
+        Args:
+            group_id: ID или username группы
+            posts: Список {'text', 'image_bytes' (опционально), 'publish_at'
+                   (Unix timestamp или datetime)}
+            concurrency: Лимит параллельных отправок
+                         (по умолчанию Config.TELEGRAM_PUBLISH_CONCURRENCY)
 
-                # Отправляем сообщение
-                if image_bytes:
-                    # С изображением
-                    image_file = io.BytesIO(image_bytes)
-                    image_file.name = 'post.jpg'
-                    image_file.seek(0)
-
-                    message = await client.send_file(
-                        entity,
-                        image_file,
-                        caption=text
+        Returns:
+            {'success': все успешны, 'results': результаты в порядке posts}
+        """
+        concurrency = concurrency or Config.TELEGRAM_PUBLISH_CONCURRENCY
+
+        async def _schedule_all():
+            client = await self._get_client()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def _schedule_one(post):
+                async with semaphore:
+                    return await self._run_target(
+                        self._publish_to_group_async(
+                            client,
+                            group_id,
+                            post['text'],
+                            post.get('image_bytes'),
+                            schedule_date=self._to_datetime(post['publish_at'])
+                        ),
+                        Config.TELEGRAM_PUBLISH_TIMEOUT
                     )
-                else:
-                    # Только текст
-                    message = await client.send_message(entity, text)
 
+            results = await asyncio.gather(*(_schedule_one(post) for post in posts))
+            return {
+                'success': all(result['success'] for result in results),
+                'results': list(results)
+            }
+
+        batches = len(posts) // concurrency + 1
+        return self._run_async(
+            _schedule_all(),
+            timeout=Config.TELEGRAM_PUBLISH_TIMEOUT * batches + Config.TELEGRAM_TIMEOUT
+        )
+
+    def list_scheduled_messages(self, group_id: str) -> Dict[str, Any]:
+        """
+        Отложенные сообщения группы на стороне Telegram
+
+        Args:
+            group_id: ID или username группы
+
+        Returns:
+            {'success', 'messages': [{'id', 'date', 'text', 'has_media'}]}
+        """
+
+        async def _list():
+            client = await self._get_client()
+            try:
+                history = await self._with_peer(
+                    client, group_id,
+                    lambda peer: client(GetScheduledHistoryRequest(peer=peer, hash=0))
+                )
+                messages = [
+                    {
+                        'id': message.id,
+                        'date': message.date.isoformat() if message.date else None,
+                        'text': getattr(message, 'message', ''),
+                        'has_media': getattr(message, 'media', None) is not None
+                    }
+                    for message in getattr(history, 'messages', [])
+                ]
+                messages.sort(key=lambda message: message['date'] or '')
+                return {'success': True, 'messages': messages}
+            except UnauthorizedError:
+                self._remember_auth(False)
+                return {'success': False, 'error': 'Не авторизован. Выполните авторизацию через QR-код'}
+            except Exception as e:
+                return {'success': False, 'error': f'Ошибка получения отложенных сообщений: {str(e)}'}
+
+        return self._run_async(_list())
+
+    def reschedule_message(self, group_id: str, message_id: int, publish_at) -> Dict[str, Any]:
+        """
+        Перенос отложенного сообщения на другое время
+
+        Args:
+            group_id: ID или username группы
+            message_id: ID отложенного сообщения
+            publish_at: Новое время (Unix timestamp или datetime)
+        """
+        schedule_date = self._to_datetime(publish_at)
+
+        async def _reschedule():
+            client = await self._get_client()
+            try:
+                await self._with_peer(
+                    client, group_id,
+                    lambda peer: client(EditMessageRequest(peer=peer, id=message_id, schedule_date=schedule_date))
+                )
                 return {
                     'success': True,
-                    'message': 'Пост успешно опубликован',
-                    'message_id': message.id,
-                    'chat_id': message.chat_id
+                    'message_id': message_id,
+                    'schedule_date': schedule_date.isoformat()
                 }
+            except UnauthorizedError:
+                self._remember_auth(False)
+                return {'success': False, 'error': 'Не авторизован. Выполните авторизацию через QR-код'}
+            except Exception as e:
+                return {'success': False, 'error': f'Ошибка переноса сообщения: {str(e)}'}
 
-            except FloodWaitError as e:
-                return {
-                    'success': False,
-                    'error': f'Слишком много запросов. Подождите {e.seconds} секунд'
-                }
+        return self._run_async(_reschedule())
+
+    def cancel_scheduled_messages(self, group_id: str, message_ids: List[int]) -> Dict[str, Any]:
+        """
+        Отмена отложенных сообщений
+
+        Args:
+            group_id: ID или username группы
+            message_ids: ID отложенных сообщений
+        """
+
+        async def _cancel():
+            client = await self._get_client()
+            try:
+                await self._with_peer(
+                    client, group_id,
+                    lambda peer: client(DeleteScheduledMessagesRequest(peer=peer, id=list(message_ids)))
+                )
+                return {'success': True, 'message_ids': list(message_ids)}
+            except UnauthorizedError:
+                self._remember_auth(False)
+                return {'success': False, 'error': 'Не авторизован. Выполните авторизацию через QR-код'}
             except Exception as e:
-                return {
-                    'success': False,
-                    'error': f'Ошибка публикации: {str(e)}'
-                }
-            finally:
-                await client.disconnect()
+                return {'success': False, 'error': f'Ошибка отмены сообщений: {str(e)}'}
 
-        return self._run_async(_publish())
+        return self._run_async(_cancel())
 
     def get_user_info(self) -> Optional[Dict[str, Any]]:
         """
@@ -481,26 +1031,25 @@ class TelegramManager:
         Returns:
             Информация о пользователе или None
         """
+        state = self._cached_auth()
+        if state is not None and (not state['authorized'] or state['user']):
+            return state['user']
 
         async def _get_info():
-            client = await self._create_client()
+            client = await self._get_client()
             try:
-                if not await client.is_user_authorized():
+                if not await self._check_authorized(client):
                     return None
 
                 me = await client.get_me()
-                return {
-                    'id': me.id,
-                    'first_name': me.first_name,
-                    'last_name': me.last_name,
-                    'phone': me.phone,
-                    'username': me.username,
-                    'premium': getattr(me, 'premium', False)
-                }
+                user = self._user_to_dict(me)
+                self._remember_auth(True, user)
+                return user
+            except UnauthorizedError:
+                self._remember_auth(False)
+                return None
             except:
                 return None
-            finally:
-                await client.disconnect()
 
         return self._run_async(_get_info())
 
@@ -513,7 +1062,7 @@ class TelegramManager:
         """
 
         async def _logout():
-            client = await self._create_client()
+            client = await self._get_client()
             try:
                 await client.log_out()
 
@@ -522,10 +1071,13 @@ class TelegramManager:
                     self.session_file.unlink()
 
                 self.session_string = None
+                self._remember_auth(False)
                 return True
             except:
+                self.invalidate_auth_cache()
                 return False
             finally:
-                await client.disconnect()
+                # Сессия больше недействительна: следующий вызов создаст новый клиент
+                await self._drop_client()
 
         return self._run_async(_logout())
\ No newline at end of file
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Тесты пакетного запуска: соответствие результатов строкам файла и продолжение по checkpoint
+"""
+
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch_runner
+from utils.ai_generator import AIGenerator
+
+
+def fake_generate_content(self, topic, **kwargs):
+    """Заглушка генерации: темы завершаются в случайном порядке, 't5' - с ошибкой"""
+    time.sleep(random.uniform(0, 0.02))
+    if topic == 't5':
+        raise Exception('сбой генерации')
+    return {
+        'text': f"текст {topic}",
+        'headline': f"заголовок {topic}",
+        'image_prompt': f"prompt {topic}",
+        'image': b'png',
+        'timings': {},
+        'total': 0.0
+    }
+
+
+def read_checkpoint(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_out_of_order_results_match_file_lines(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(batch_runner, 'load_api_keys', lambda: ('openai-key', 'stability-key'))
+    monkeypatch.setattr(AIGenerator, 'generate_content', fake_generate_content)
+
+    topics = [f"t{i}" for i in range(40)]
+    (tmp_path / 'topics.csv').write_text('topic\n' + '\n'.join(topics) + '\n', encoding='utf-8')
+    args = batch_runner.parse_args(['topics.csv', '-o', 'out', '--parallel', '4', '--no-overlay'])
+
+    assert batch_runner.run(args) == 2
+
+    entries = read_checkpoint(tmp_path / 'out' / batch_runner.CHECKPOINT_FILE)
+    assert sorted(entry['topic'] for entry in entries) == sorted(topics)
+    for entry in entries:
+        # Тема tN записана в строке N + 2 (после заголовка)
+        number = int(entry['topic'][1:]) + 2
+        assert entry['line'] == number
+        assert entry['key'] == batch_runner.topic_key(number, entry['topic'])
+        if entry['topic'] == 't5':
+            assert not entry['success']
+        else:
+            assert entry['success']
+            assert os.path.basename(entry['dir']) == f"{number:05d}-{entry['topic']}"
+            with open(os.path.join(entry['dir'], 'post.json'), encoding='utf-8') as f:
+                assert json.load(f)['text'] == f"текст {entry['topic']}"
+
+    # Повторный запуск обрабатывает только тему с ошибкой
+    assert batch_runner.run(args) == 2
+    entries = read_checkpoint(tmp_path / 'out' / batch_runner.CHECKPOINT_FILE)
+    assert len(entries) == 41
+    assert entries[-1]['topic'] == 't5'
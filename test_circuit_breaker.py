@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Тесты circuit breaker: переходы closed -> open -> half_open -> closed
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class FakeClock:
+    """Управляемое время вместо time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', fake)
+    return fake
+
+
+def make_breaker():
+    return CircuitBreaker('sd3', window=60, error_rate=0.5, min_requests=4,
+                          consecutive_failures=3, open_seconds=30)
+
+
+def test_consecutive_failures_open_then_probe_closes(clock):
+    breaker = make_breaker()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    for _ in range(2):
+        breaker.acquire()
+        breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.acquire()
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available()
+
+    # Пока breaker открыт, вызовы отклоняются со временем до пробного
+    clock.now += 10
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.acquire()
+    assert error.value.retry_in == pytest.approx(20)
+
+    # Через open_seconds пропускается ровно один пробный вызов
+    clock.now += 20
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    probe = breaker.acquire()
+    assert probe is not None
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+    breaker.record_success(0.2, probe)
+    assert breaker.state == CircuitBreaker.CLOSED
+    snapshot = breaker.snapshot()
+    assert snapshot['times_opened'] == 1
+    assert snapshot['rejected'] == 2
+    assert snapshot['error_rate'] == 0.0
+
+
+def test_failed_probe_reopens(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 30
+    probe = breaker.acquire()
+    breaker.record_failure(0.1, probe)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()['times_opened'] == 2
+
+    clock.now += 29
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_error_rate_opens_only_with_enough_requests(clock):
+    breaker = make_breaker()
+    # Ошибки чередуются с успехами: подряд их меньше consecutive_failures
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    breaker.record_success(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_outcomes_leave_window(clock):
+    breaker = make_breaker()
+    breaker.record_failure(0.1)
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+
+    # Старые ошибки выходят из окна и не учитываются в доле ошибок
+    clock.now += 61
+    breaker.record_success(0.1)
+    breaker.record_failure(0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()['requests'] == 2
+
+
+def test_release_frees_probe(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    clock.now += 30
+
+    probe = breaker.acquire()
+    breaker.release(probe)
+    assert breaker.available()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_stale_call_does_not_free_or_decide_probe(clock):
+    breaker = make_breaker()
+    # Вызов начат, пока breaker закрыт
+    stale = breaker.acquire()
+    assert stale is None
+
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    clock.now += 30
+    probe = breaker.acquire()
+
+    # Завершение старого вызова не освобождает пробу и не меняет состояние
+    breaker.release(stale)
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+    breaker.record_success(0.1, stale)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.record_failure(0.1, stale)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.record_success(0.1, probe)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_probe_from_previous_half_open_is_ignored(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        breaker.record_failure(0.1)
+    clock.now += 30
+    first = breaker.acquire()
+    breaker.record_failure(0.1, first)
+
+    clock.now += 30
+    second = breaker.acquire()
+    assert second != first
+    breaker.release(first)
+    assert not breaker.available()
+    breaker.release(second)
+    assert breaker.available()
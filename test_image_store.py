@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Тесты хранилища изображений: адресация по содержимому и вытеснение сверх бюджета
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import image_store
+from utils.image_store import ImageStore
+
+
+class FakeClock:
+    """Управляемое время вместо time.time"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(image_store.time, 'time', fake)
+    return fake
+
+
+def image(n, size=100):
+    return bytes([n]) * size
+
+
+def test_same_bytes_stored_once(tmp_path, clock):
+    store = ImageStore(str(tmp_path / 'images'))
+    first = store.put(image(1), key='prompt-a')
+    second = store.put(image(1), key='prompt-b')
+
+    assert first == second
+    assert store.get(first) == image(1)
+    assert store.lookup('prompt-b') == image(1)
+    stats = store.stats()
+    assert (stats['images'], stats['bytes'], stats['stored']) == (1, 100, 1)
+    assert store._bytes == 100
+
+
+def test_evicts_least_recently_used_over_budget(tmp_path, clock):
+    store = ImageStore(str(tmp_path / 'images'), max_bytes=300)
+    ids = [store.put(image(n), key=f"k{n}") for n in range(3)]
+
+    # Первое изображение использовано недавно, поэтому вытесняется второе
+    store.get(ids[0])
+    newest = store.put(image(3), key='k3')
+
+    assert store.get(ids[1]) is None
+    assert not os.path.exists(store.path(ids[1]))
+    assert store.lookup('k1') is None
+    for image_id in (ids[0], ids[2], newest):
+        assert store.get(image_id) is not None
+    stats = store.stats()
+    assert stats['evicted'] == 1
+    assert stats['bytes'] == 300
+    assert store._bytes == 300
+
+
+def test_new_image_larger_than_budget_is_kept(tmp_path, clock):
+    store = ImageStore(str(tmp_path / 'images'), max_bytes=150)
+    old = store.put(image(1))
+    big = store.put(image(2, size=200))
+
+    assert store.get(old) is None
+    assert store.get(big) == image(2, size=200)
+    assert store._bytes == 200
+
+
+def test_running_total_restored_and_resynced(tmp_path, clock):
+    root = str(tmp_path / 'images')
+    store = ImageStore(root, max_bytes=250)
+    store.put(image(1))
+    store.put(image(2))
+
+    # Другой процесс добавил изображение: счетчик пересчитывается при превышении
+    other = ImageStore(root, max_bytes=250)
+    assert other._bytes == 200
+    other.put(image(3))
+
+    store.put(image(4))
+    assert store._bytes == store.stats()['bytes'] <= 250
+
+
+def test_missing_file_forgotten(tmp_path, clock):
+    store = ImageStore(str(tmp_path / 'images'))
+    image_id = store.put(image(1), key='k')
+    os.remove(store.path(image_id))
+
+    assert store.lookup('k') is None
+    assert store.stats()['images'] == 0
+    assert store._bytes == 0
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Тесты durable-очереди задач: захват, восстановление, повторы и RetryLater
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.job_queue import JobQueue, RetryLater
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs' / 'jobs.db')
+
+
+def make_queue(db_path, handler, **kwargs):
+    queue = JobQueue(db_path, workers=1, **kwargs)
+    queue.register('publish', handler)
+    return queue
+
+
+def run_next(queue):
+    """Захват и выполнение одной задачи без рабочих потоков"""
+    row = queue._claim()
+    assert row is not None
+    queue._run(row)
+
+
+def test_claim_takes_oldest_ready_job(db_path):
+    queue = make_queue(db_path, lambda payload, data: {'success': True})
+    first = queue.submit('publish', {'n': 1})
+    second = queue.submit('publish', {'n': 2})
+
+    row = queue._claim()
+    assert row['id'] == first
+    assert queue.get(first)['status'] == JobQueue.RUNNING
+    assert queue.get(first)['attempts'] == 1
+    assert queue._claim()['id'] == second
+    assert queue._claim() is None
+
+
+def test_unknown_kind_rejected(db_path):
+    queue = make_queue(db_path, lambda payload, data: {})
+    with pytest.raises(ValueError):
+        queue.submit('missing', {})
+
+
+def test_workers_run_jobs(db_path):
+    seen = []
+
+    def handler(payload, data):
+        seen.append((payload['n'], data))
+        return {'success': True, 'n': payload['n']}
+
+    queue = make_queue(db_path, handler)
+    job_id = queue.submit('publish', {'n': 7}, b'png')
+    queue.start()
+    try:
+        deadline = time.monotonic() + 5
+        while queue.get(job_id)['status'] != JobQueue.DONE and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        queue.stop()
+
+    job = queue.get(job_id)
+    assert job['status'] == JobQueue.DONE
+    assert job['result'] == {'success': True, 'n': 7}
+    assert seen == [(7, b'png')]
+
+
+def test_recover_is_explicit(db_path):
+    queue = make_queue(db_path, lambda payload, data: {})
+    job_id = queue.submit('publish', {})
+    queue._claim()
+
+    # Другой процесс, создавший очередь на той же базе, не трогает чужие задачи
+    other = make_queue(db_path, lambda payload, data: {})
+    assert other.get(job_id)['status'] == JobQueue.RUNNING
+
+    other.recover()
+    assert other.get(job_id)['status'] == JobQueue.QUEUED
+    assert other._claim()['id'] == job_id
+
+
+def test_failed_job_retried_after_backoff(db_path):
+    def handler(payload, data):
+        raise RuntimeError('database is locked')
+
+    queue = make_queue(db_path, handler, max_attempts=3, retry_delay=10)
+    job_id = queue.submit('publish', {})
+
+    started = time.time()
+    run_next(queue)
+    job = queue.get(job_id)
+    assert job['status'] == JobQueue.QUEUED
+    assert job['error'] == 'database is locked'
+    assert job['run_after'] - started == pytest.approx(10, abs=1)
+    # До конца паузы задача не захватывается
+    assert queue._claim() is None
+
+    queue._connect().execute('UPDATE jobs SET run_after = 0 WHERE id = ?', (job_id,))
+    run_next(queue)
+    assert queue.get(job_id)['run_after'] - started == pytest.approx(20, abs=1)
+
+    queue._connect().execute('UPDATE jobs SET run_after = 0 WHERE id = ?', (job_id,))
+    run_next(queue)
+    job = queue.get(job_id)
+    assert job['status'] == JobQueue.FAILED
+    assert job['attempts'] == 3
+
+
+def test_backoff_is_capped(db_path):
+    queue = make_queue(db_path, lambda payload, data: {}, retry_delay=5)
+    assert [queue.backoff(n) for n in (1, 2, 3)] == [5, 10, 20]
+    assert queue.backoff(20) == JobQueue.MAX_RETRY_DELAY
+
+
+def test_retry_later_defers_without_spending_attempts(db_path):
+    calls = []
+
+    def handler(payload, data):
+        calls.append(payload)
+        raise RetryLater(60, reason='FloodWait', payload={'published': ['group']})
+
+    queue = make_queue(db_path, handler, max_deferrals=1)
+    job_id = queue.submit('publish', {'published': []})
+
+    started = time.time()
+    run_next(queue)
+    job = queue.get(job_id)
+    assert job['status'] == JobQueue.QUEUED
+    assert job['deferrals'] == 1
+    assert job['attempts'] == 0
+    assert job['error'] == 'FloodWait'
+    assert job['run_after'] - started == pytest.approx(60, abs=1)
+    assert queue._claim() is None
+
+    # Повтор получает обновленные параметры; лимит отсрочек исчерпан
+    queue._connect().execute('UPDATE jobs SET run_after = 0 WHERE id = ?', (job_id,))
+    run_next(queue)
+    assert calls == [{'published': []}, {'published': ['group']}]
+    job = queue.get(job_id)
+    assert job['status'] == JobQueue.FAILED
+    assert job['error'] == 'FloodWait'
+
+
+def test_unsuccessful_result_fails_without_retry(db_path):
+    queue = make_queue(db_path, lambda payload, data: {'success': False, 'error': 'нет доступа'})
+    job_id = queue.submit('publish', {})
+    run_next(queue)
+
+    job = queue.get(job_id)
+    assert job['status'] == JobQueue.FAILED
+    assert job['error'] == 'нет доступа'
+    assert queue.stats() == {JobQueue.FAILED: 1}
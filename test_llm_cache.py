@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Тесты кэша ответов LLM: TTL, вытеснение по размеру и кэширование только проверенных ответов
+"""
+
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils import llm_cache
+from utils.ai_generator import AIGenerator
+from utils.llm_cache import LLMCache
+
+
+class FakeClock:
+    """Управляемое время вместо time.time"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_cache.time, 'time', fake)
+    return fake
+
+
+def disk_bytes(cache):
+    return cache._connect().execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache').fetchone()[0]
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = LLMCache(str(tmp_path / 'cache.db'), ttl=60)
+    cache.put('a', 'ответ')
+    assert cache.get('a') == 'ответ'
+
+    clock.now += 59
+    assert cache.get('a') == 'ответ'
+
+    clock.now += 1
+    assert cache.get('a') is None
+    assert cache.stats()['disk_items'] == 0
+    assert cache._disk_bytes == 0
+
+
+def test_disk_entries_survive_restart_until_ttl(tmp_path, clock):
+    path = str(tmp_path / 'cache.db')
+    LLMCache(path, ttl=60).put('a', 'ответ')
+
+    clock.now += 30
+    reopened = LLMCache(path, ttl=60)
+    assert reopened._disk_bytes == disk_bytes(reopened)
+    assert reopened.get('a') == 'ответ'
+    assert reopened.stats()['disk_hits'] == 1
+
+    clock.now += 30
+    assert LLMCache(path, ttl=60).get('a') is None
+
+
+def test_evicts_least_recently_used_over_budget(tmp_path, clock):
+    cache = LLMCache(str(tmp_path / 'cache.db'), max_disk_bytes=30, max_memory_items=1)
+    for key in 'abc':
+        cache.put(key, 'x' * 10)
+        clock.now += 1
+
+    # 'a' использован недавно, поэтому вытесняется 'b'
+    cache._memory.clear()
+    assert cache.get('a') == 'x' * 10
+    clock.now += 1
+    cache.put('d', 'x' * 10)
+
+    cache._memory.clear()
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.get('d') is not None
+    stats = cache.stats()
+    assert stats['evicted'] == 1
+    assert stats['disk_bytes'] == 30
+    assert cache._disk_bytes == disk_bytes(cache) == 30
+
+
+def test_running_total_follows_overwrites_and_clear(tmp_path, clock):
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    cache.put('a', 'x' * 10)
+    cache.put('a', 'x' * 4)
+    cache.put('b', 'ё')
+    assert cache._disk_bytes == disk_bytes(cache) == 6
+
+    cache.clear()
+    assert cache._disk_bytes == 0
+    assert cache.get('a') is None
+
+
+def test_expired_entries_swept_on_put(tmp_path, clock):
+    cache = LLMCache(str(tmp_path / 'cache.db'), ttl=60)
+    cache.put('old', 'x' * 10)
+    clock.now += 61
+    cache.put('new', 'x' * 5)
+
+    assert cache.stats()['disk_items'] == 1
+    assert cache._disk_bytes == disk_bytes(cache) == 5
+
+
+class StubCompletions:
+    """chat.completions.create, отдающий ответы по очереди"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        content = self.replies.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def make_generator(cache, replies):
+    generator = AIGenerator('test-openai-key', 'test-stability-key', llm_cache=cache)
+    completions = StubCompletions(replies)
+    generator.openai_client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return generator, completions
+
+
+def test_invalid_bundle_is_not_cached(tmp_path):
+    cache = LLMCache(str(tmp_path / 'cache.db'))
+    broken = json.dumps({'text': 'пост', 'headline': 'Заголовок', 'image_prompt': 'кот на крыше'})
+    valid = json.dumps({'text': 'пост', 'headline': 'Заголовок', 'image_prompt': 'a cat on a roof'})
+    generator, completions = make_generator(cache, [broken, 'a cat on a roof', valid])
+
+    # Промпт на русском не прошел проверку и догенерирован отдельно
+    first = generator.generate_post_bundle('кошки')
+    assert first['image_prompt'] == 'a cat on a roof'
+    assert completions.calls == 2
+
+    # Негодный ответ не попал в кэш: повтор идет в API и кэширует годный
+    second = generator.generate_post_bundle('кошки')
+    assert second == {'text': 'пост', 'headline': 'Заголовок', 'image_prompt': 'a cat on a roof'}
+    assert completions.calls == 3
+
+    assert generator.generate_post_bundle('кошки') == second
+    assert completions.calls == 3
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Тесты планировщика публикаций: запуск в срок, перенос, отмена и повтор после сбоя
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.job_queue import JobQueue
+from utils.post_scheduler import PostScheduler
+
+
+class Recorder:
+    """fire, запоминающий вызовы; первые failures вызовов падают"""
+
+    def __init__(self, failures=0):
+        self.calls = []
+        self.failures = failures
+        self.fired = threading.Event()
+
+    def __call__(self, kind, payload, data, job_id):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('database is locked')
+        self.calls.append((kind, payload, data, job_id))
+        self.fired.set()
+        return job_id
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.db')
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_fires_when_due(db_path):
+    fire = Recorder()
+    scheduler = PostScheduler(db_path, fire)
+    scheduler.start()
+    try:
+        item_id = scheduler.schedule('publish_post', {'content': 'пост'}, time.time() + 0.2, b'png')
+        assert scheduler.get(item_id)['status'] == PostScheduler.PENDING
+        assert fire.fired.wait(2)
+    finally:
+        scheduler.stop()
+
+    [(kind, payload, data, job_id)] = fire.calls
+    assert (kind, payload, data) == ('publish_post', {'content': 'пост'}, b'png')
+    item = scheduler.get(item_id)
+    assert item['status'] == PostScheduler.FIRED
+    assert item['job_id'] == job_id
+    assert scheduler.pending_count() == 0
+
+
+def test_reschedule_and_cancel(db_path):
+    fire = Recorder()
+    scheduler = PostScheduler(db_path, fire)
+    scheduler.start()
+    try:
+        later = scheduler.schedule('publish_post', {'n': 1}, time.time() + 60)
+        cancelled = scheduler.schedule('publish_post', {'n': 2}, time.time() + 0.2)
+        assert scheduler.pending_count() == 2
+
+        assert scheduler.cancel(cancelled)
+        assert not scheduler.cancel(cancelled)
+        assert scheduler.reschedule(later, time.time() + 0.2)
+        assert fire.fired.wait(2)
+        time.sleep(0.3)
+    finally:
+        scheduler.stop()
+
+    assert [call[1] for call in fire.calls] == [{'n': 1}]
+    assert scheduler.get(cancelled)['status'] == PostScheduler.CANCELLED
+    assert scheduler.get(later)['status'] == PostScheduler.FIRED
+    assert not scheduler.reschedule(later, time.time() + 60)
+    assert {item['id'] for item in scheduler.list(status=None)} == {cancelled, later}
+    assert scheduler.list() == []
+
+
+def test_failed_fire_is_retried_with_same_job_id(db_path, monkeypatch):
+    monkeypatch.setattr(PostScheduler, 'FIRE_RETRY_DELAY', 0.1)
+    fire = Recorder(failures=2)
+    scheduler = PostScheduler(db_path, fire)
+    item_id = scheduler.schedule('publish_post', {}, time.time())
+    scheduler.start()
+    try:
+        assert fire.fired.wait(2)
+    finally:
+        scheduler.stop()
+
+    assert len(fire.calls) == 1
+    item = scheduler.get(item_id)
+    assert item['status'] == PostScheduler.FIRED
+    assert item['job_id'] == fire.calls[0][3]
+
+
+def test_restart_after_crash_does_not_duplicate_job(db_path):
+    queue = JobQueue(db_path)
+    queue.register('publish_post', lambda payload, data: {'success': True})
+
+    # Процесс упал после создания задачи, но до отметки fired
+    def crash_after_submit(kind, payload, data, job_id):
+        queue.submit(kind, payload, data, job_id)
+        raise SystemExit
+
+    scheduler = PostScheduler(db_path, crash_after_submit)
+    item_id = scheduler.schedule('publish_post', {'content': 'пост'}, time.time())
+    with pytest.raises(SystemExit):
+        with scheduler._cond:
+            scheduler._fire(item_id)
+    item = scheduler.get(item_id)
+    assert item['status'] == PostScheduler.FIRING
+    assert queue.stats() == {JobQueue.QUEUED: 1}
+
+    restarted = PostScheduler(db_path, queue.submit)
+    restarted.start()
+    try:
+        assert wait_for(lambda: restarted.get(item_id)['status'] == PostScheduler.FIRED)
+    finally:
+        restarted.stop()
+
+    assert restarted.get(item_id)['job_id'] == item['job_id']
+    assert queue.stats() == {JobQueue.QUEUED: 1}
+    assert queue.get(item['job_id']) is not None
+
+
+def test_pending_items_reload_on_start(db_path):
+    first = PostScheduler(db_path, Recorder())
+    item_id = first.schedule('publish_story', {'caption': 'c'}, time.time() - 10)
+
+    fire = Recorder()
+    second = PostScheduler(db_path, fire)
+    second.start()
+    try:
+        assert fire.fired.wait(2)
+    finally:
+        second.stop()
+    assert second.get(item_id)['status'] == PostScheduler.FIRED
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Тесты планировщика запросов к Telegram: интервалы между запросами и FloodWait
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from telethon.errors import FloodWaitError
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.rate_scheduler import RateScheduler, deadline_scope
+
+
+def test_requests_spaced_by_rate():
+    scheduler = RateScheduler({'send_message': (20.0, 1)})
+    started = []
+
+    async def request():
+        started.append(time.monotonic())
+        return 'ok'
+
+    async def burst():
+        return await asyncio.gather(*(scheduler.call('send_message', request) for _ in range(5)))
+
+    assert asyncio.run(burst()) == ['ok'] * 5
+
+    # Первый запрос проходит сразу, остальные - с интервалом 1 / rate
+    gaps = [later - earlier for earlier, later in zip(started, started[1:])]
+    assert all(gap >= 0.04 for gap in gaps), gaps
+    assert started[-1] - started[0] == pytest.approx(0.2, abs=0.05)
+    assert scheduler.snapshot()['send_message']['deferred'] == 4
+
+
+def test_methods_have_separate_buckets():
+    scheduler = RateScheduler({'send_message': (1.0, 1), 'default': (1.0, 1)})
+
+    async def both():
+        await scheduler.acquire('send_message')
+        started = time.monotonic()
+        await scheduler.acquire('send_file')
+        return time.monotonic() - started
+
+    assert asyncio.run(both()) < 0.05
+
+
+def test_flood_wait_penalizes_and_retries():
+    scheduler = RateScheduler({'send_file': (10.0, 5)}, max_flood_wait=5)
+    attempts = []
+
+    async def request():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FloodWaitError(request=None, capture=1)
+        return 'sent'
+
+    assert asyncio.run(scheduler.call('send_file', request)) == 'sent'
+
+    # Повтор - не раньше, чем через время из FloodWait
+    assert attempts[1] - attempts[0] >= 0.95
+    snapshot = scheduler.snapshot()['send_file']
+    assert snapshot['flood_waits'] == 1
+    # Скорость снижена вдвое и после успеха начинает восстанавливаться
+    assert snapshot['rate'] == pytest.approx(5.0 + 1.0)
+
+
+def test_flood_wait_longer_than_budget_is_raised():
+    scheduler = RateScheduler(max_flood_wait=5)
+    attempts = []
+
+    async def request():
+        attempts.append(time.monotonic())
+        raise FloodWaitError(request=None, capture=30)
+
+    with pytest.raises(FloodWaitError) as error:
+        asyncio.run(scheduler.call('send_message', request))
+    assert error.value.seconds == 30
+    assert len(attempts) == 1
+    assert scheduler.snapshot()['send_message']['blocked_for'] > 25
+
+
+def test_queue_longer_than_deadline_is_rejected():
+    scheduler = RateScheduler({'send_story': (0.1, 1)}, max_flood_wait=60)
+
+    async def request():
+        return 'ok'
+
+    async def publish():
+        with deadline_scope(8):
+            assert await scheduler.call('send_story', request) == 'ok'
+            # Следующий токен - через 10 сек, а до срока меньше 8 - запас
+            await scheduler.call('send_story', request)
+
+    started = time.monotonic()
+    with pytest.raises(FloodWaitError) as error:
+        asyncio.run(publish())
+    assert time.monotonic() - started < 1
+    assert error.value.seconds == 10
+    snapshot = scheduler.snapshot()['send_story']
+    assert snapshot['rejected'] == 1
+    assert snapshot['backlog'] == 0
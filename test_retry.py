@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Тесты разбора Retry-After и x-ratelimit-reset
+"""
+
+import email.utils
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from utils.retry import parse_duration, parse_retry_after
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('2', 2.0),
+    ('2.5', 2.5),
+    ('20ms', 0.02),
+    ('1s', 1.0),
+    ('6m0s', 360.0),
+    ('1m30s', 90.0),
+    ('1h2m3s', 3723.0),
+    ('1.5s', 1.5),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize('value', ['', 'soon', '6m0', '5x', '1s later'])
+def test_parse_duration_rejects_garbage(value):
+    assert parse_duration(value) is None
+
+
+def test_retry_after_seconds():
+    assert parse_retry_after({'Retry-After': '7'}) == 7.0
+    assert parse_retry_after({'retry-after': '0'}) == 0.0
+
+
+def test_retry_after_ms_takes_precedence():
+    assert parse_retry_after({'retry-after-ms': '1500', 'Retry-After': '7'}) == 1.5
+
+
+def test_retry_after_http_date():
+    moment = email.utils.formatdate(time.time() + 120, usegmt=True)
+    assert parse_retry_after({'Retry-After': moment}) == pytest.approx(120, abs=2)
+
+    past = email.utils.formatdate(time.time() - 120, usegmt=True)
+    assert parse_retry_after({'Retry-After': past}) == 0.0
+
+
+def test_ratelimit_reset_only_when_exhausted():
+    headers = {
+        'x-ratelimit-remaining-requests': '0',
+        'x-ratelimit-reset-requests': '6m0s',
+        'x-ratelimit-remaining-tokens': '1200',
+        'x-ratelimit-reset-tokens': '20ms',
+    }
+    assert parse_retry_after(headers) == 360.0
+
+    headers['x-ratelimit-remaining-requests'] = '3'
+    assert parse_retry_after(headers) is None
+
+
+def test_ratelimit_reset_takes_longest_exhausted_limit():
+    headers = {
+        'X-RateLimit-Remaining-Requests': '0',
+        'X-RateLimit-Reset-Requests': '1s',
+        'X-RateLimit-Remaining-Tokens': '0',
+        'X-RateLimit-Reset-Tokens': '1m30s',
+    }
+    assert parse_retry_after(headers) == 90.0
+
+
+def test_retry_after_missing_or_unparseable():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({'Retry-After': 'whenever'}) is None
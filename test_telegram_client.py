@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Тесты постоянного клиента TelegramManager: одно подключение на одновременные вызовы и переподключение
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram_manager import TelegramManager
+
+
+class StubClient:
+    """Клиент с медленным подключением; первые failures подключений падают"""
+
+    def __init__(self, registry, failures=0):
+        self.registry = registry
+        self.failures = failures
+        self.connected = False
+        self.connects = 0
+        self.disconnects = 0
+
+    def is_connected(self):
+        return self.connected
+
+    async def connect(self):
+        self.connects += 1
+        await asyncio.sleep(0.05)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('сеть недоступна')
+        self.connected = True
+
+    async def disconnect(self):
+        self.disconnects += 1
+        self.connected = False
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = TelegramManager(api_id=1, api_hash='test', phone='test', session_dir=str(tmp_path))
+    yield manager
+    manager.close()
+
+
+def use_stub_clients(manager, failures=0):
+    created = []
+
+    def create():
+        client = StubClient(created, failures if not created else 0)
+        created.append(client)
+        return client
+
+    manager._create_client = create
+    return created
+
+
+def get_clients(manager, count):
+    async def _many():
+        return await asyncio.gather(*(manager._get_client() for _ in range(count)), return_exceptions=True)
+
+    return manager._run_async(_many())
+
+
+def test_concurrent_callers_share_one_connect(manager):
+    created = use_stub_clients(manager)
+
+    results = get_clients(manager, 10)
+
+    assert len(created) == 1
+    assert created[0].connects == 1
+    assert all(result.raw is created[0] for result in results)
+
+
+def test_lost_connection_reconnects_same_client(manager):
+    created = use_stub_clients(manager)
+    get_clients(manager, 1)
+    created[0].connected = False
+
+    results = get_clients(manager, 5)
+
+    assert len(created) == 1
+    assert created[0].connects == 2
+    assert all(result.raw is created[0] for result in results)
+
+
+def test_failed_connect_does_not_break_waiting_callers(manager):
+    created = use_stub_clients(manager, failures=1)
+
+    results = get_clients(manager, 5)
+
+    # Первый вызов получил ошибку, остальные - новый подключенный клиент
+    errors = [result for result in results if isinstance(result, Exception)]
+    assert len(errors) == 1 and isinstance(errors[0], ConnectionError)
+    assert len(created) == 2
+    assert created[0].disconnects == 1
+    assert created[1].connects == 1 and created[1].disconnects == 0
+    assert all(result.raw is created[1] for result in results if not isinstance(result, Exception))
+    assert manager._client is created[1]
+
+
+def test_drop_client_disconnects(manager):
+    created = use_stub_clients(manager)
+    get_clients(manager, 1)
+
+    manager._run_async(manager._drop_client())
+
+    assert manager._client is None
+    assert created[0].disconnects == 1
+    get_clients(manager, 1)
+    assert len(created) == 2
@@ -3,11 +3,13 @@
 """
 
 from .ai_generator import AIGenerator
+from .async_loop import AsyncLoopThread
 from .image_processor import ImageProcessor
 from .telegram_publisher import TelegramPublisher
 
 __all__ = [
     'AIGenerator',
+    'AsyncLoopThread',
     'ImageProcessor',
     'TelegramPublisher'
 ]
@@ -2,14 +2,21 @@
 Модуль для работы с ChatGPT и Stability AI
 """
 import openai
-from openai import OpenAI
-import requests
 import json
-import base64
 import os
+import re
 import logging
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import nullcontext
+from typing import Optional, Dict, Any, Callable, Iterable, Iterator, List
 from config import Config
+from .image_store import ImageStore
+from .llm_cache import LLMCache
+from .pipeline import StagePipeline
+from .providers import get_openai_client
+from .retry import get_retry_policy
+from .stability_client import get_configured_client
 
 # Настраиваем базовую конфигурацию логирования
 logging.basicConfig(
@@ -23,9 +30,28 @@ logging.info("--- LOADING CORRECTED ai_generator.py VERSION (with logging) ---")
 class AIGenerator:
     """Класс для генерации контента через AI"""
 
-    def __init__(self, openai_key: str, stability_key: str):
+    # Поля ответа комбинированной генерации
+    BUNDLE_FIELDS = ('text', 'headline', 'image_prompt')
+
+    def __init__(
+            self,
+            openai_key: str,
+            stability_key: str,
+            llm_cache: Optional[LLMCache] = None,
+            image_store: Optional[ImageStore] = None,
+            openai_concurrency: Optional[int] = None,
+            stability_concurrency: Optional[int] = None
+    ):
         """
         Инициализация генератора
+
+        Args:
+            openai_key: API ключ OpenAI
+            stability_key: API ключ Stability AI
+            llm_cache: Кэш ответов ChatGPT (None - без кэша)
+            image_store: Хранилище изображений (None - без кэша изображений)
+            openai_concurrency: Максимум одновременных запросов к OpenAI (None - без ограничения)
+            stability_concurrency: Максимум одновременных генераций изображений (None - без ограничения)
         """
         logging.info("Initializing AIGenerator...")
 
@@ -36,22 +62,390 @@ class AIGenerator:
             raise ValueError("Stability AI API ключ не предоставлен")
 
         try:
-            self.openai_client = OpenAI(api_key=openai_key)
+            # Общий на процесс клиент: пул соединений переживает генератор
+            self.openai_client = get_openai_client(openai_key)
             logging.info("OpenAI client initialized successfully.")
         except Exception as e:
             logging.error(f"FATAL: Error during OpenAI client initialization: {e}")
             raise Exception(f"Ошибка инициализации OpenAI клиента: {str(e)}")
 
+        self.openai_key = openai_key
+        self.llm_cache = llm_cache
+        self.image_store = image_store
         self.stability_key = stability_key
-        self.stability_api_host = "https://api.stability.ai"
+        # Общий на процесс клиент с пулом соединений
+        self.stability_client = get_configured_client(stability_key)
+        # Повторы и общий на процесс лимит запросов по провайдерам
+        self.openai_retry = get_retry_policy('openai')
+        self.stability_retry = get_retry_policy('stability')
 
-        # Убираем прокси если они не нужны
-        self.requests_proxies = None
+        # Ограничения параллельности по сервисам: ответы из кэшей их не занимают
+        self._openai_slots = threading.BoundedSemaphore(openai_concurrency) if openai_concurrency else nullcontext()
+        self._stability_slots = threading.BoundedSemaphore(stability_concurrency) \
+            if stability_concurrency else nullcontext()
         logging.info("AIGenerator initialized.")
 
-    def generate_post_text(self, topic: str) -> str:
+    def _chat(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: float,
+            max_tokens: int,
+            model: str = "gpt-4o",
+            use_cache: bool = True,
+            on_token: Optional[Callable[[str], None]] = None,
+            stage: str = 'chat',
+            validate: Optional[Callable[[str], bool]] = None,
+            **extra: Any
+    ) -> str:
+        """
+        Запрос chat completions через кэш ответов
+
+        Args:
+            messages: Сообщения диалога
+            temperature: Температура
+            max_tokens: Максимум токенов ответа
+            model: Модель
+            use_cache: False - запрос мимо кэша (ответ все равно сохраняется)
+            on_token: Если задан, ответ запрашивается потоком, и фрагменты
+                      передаются в on_token; ответ из кэша передается целиком
+            stage: Этап генерации (для отчета о повторах)
+            validate: Проверка ответа; не прошедший ее ответ возвращается,
+                      но не кэшируется, чтобы повторный запрос не получил
+                      тот же негодный ответ из кэша
+            extra: Прочие параметры запроса (например, response_format)
+
+        Returns:
+            Текст ответа
+        """
+        key = None
+        if self.llm_cache is not None:
+            key = LLMCache.make_key(
+                model=model, messages=messages, temperature=temperature, max_tokens=max_tokens, **extra
+            )
+            if use_cache:
+                cached = self.llm_cache.get(key)
+                if cached is not None:
+                    logging.info("LLM response served from cache.")
+                    if on_token is not None:
+                        on_token(cached)
+                    return cached
+            else:
+                self.llm_cache.record_bypass()
+
+        parts = []
+
+        def _request():
+            if on_token is not None:
+                stream = self.openai_client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    **extra
+                )
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        on_token(delta)
+                return ''.join(parts)
+
+            response = self.openai_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                **extra
+            )
+            return response.choices[0].message.content
+
+        # Поток, который уже начал отдавать текст, не повторяется;
+        # ограничение генератора берется раньше общего слота провайдера
+        content = self.openai_retry.call(
+            _request, stage=stage, can_retry=lambda: not parts, limit=self._openai_slots
+        )
+
+        if key is not None and content and (validate is None or validate(content)):
+            self.llm_cache.put(key, content)
+        return content
+
+    def generate_content(
+            self,
+            topic: str,
+            image_processor=None,
+            combined: bool = True,
+            on_token: Optional[Callable[[str], None]] = None,
+            on_stage: Optional[Callable[[str, Any], None]] = None,
+            use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Полная генерация поста через граф этапов
+
+        combined=True:  bundle -> image -> story_image
+        combined=False: text -> {headline, image_prompt}; image_prompt -> image;
+                        {image, headline} -> story_image
+        Независимые этапы выполняются параллельно.
+
+        Args:
+            topic: Тема поста
+            image_processor: ImageProcessor для наложения заголовка (None - без наложения)
+            combined: Текст, заголовок и промпт одним запросом
+            on_token: Получатель фрагментов текста по мере генерации
+                      (только при combined=False)
+            on_stage: Вызывается с (этап, результат) после каждого этапа; к этому
+                      моменту изображения этапа уже в хранилище под
+                      ImageStore.content_id(результат)
+            use_cache: False - запросы к ChatGPT и Stability AI мимо кэшей
+
+        Returns:
+            {'text', 'headline', 'image_prompt', 'image', 'story_image', 'timings', 'total'};
+            с хранилищем изображений также 'image_id' и 'story_image_id'
+        """
+        pipeline = StagePipeline()
+
+        if combined:
+            pipeline.add('bundle', lambda topic: self.generate_post_bundle(topic, use_cache=use_cache), ['topic'])
+            pipeline.add(
+                'image',
+                lambda bundle: self.generate_image(bundle['image_prompt'], use_cache=use_cache),
+                ['bundle']
+            )
+            headline_stage = 'bundle'
+        else:
+            pipeline.add(
+                'text',
+                lambda topic: self.generate_post_text(topic, on_token=on_token, use_cache=use_cache),
+                ['topic']
+            )
+            pipeline.add('headline', lambda text: self.generate_headline(text, use_cache=use_cache), ['text'])
+            pipeline.add(
+                'image_prompt',
+                lambda text: self.generate_image_prompt(text, use_cache=use_cache),
+                ['text']
+            )
+            pipeline.add(
+                'image',
+                lambda image_prompt: self.generate_image(image_prompt, use_cache=use_cache),
+                ['image_prompt']
+            )
+            headline_stage = 'headline'
+
+        if image_processor is not None:
+            def _story_image(image, **deps):
+                headline = deps[headline_stage]
+                if isinstance(headline, dict):
+                    headline = headline['headline']
+                return image_processor.process_image(image, headline)
+
+            pipeline.add('story_image', _story_image, ['image', headline_stage])
+
+        # Хэши для ссылок на изображения вместо передачи байтов
+        image_ids: Dict[str, str] = {}
+
+        def _on_result(name, value):
+            if self.image_store is not None and name in ('image', 'story_image') and value:
+                # Исходное изображение уже сохранил generate_image
+                image_ids[f'{name}_id'] = ImageStore.content_id(value) if name == 'image' \
+                    else self.image_store.put(value)
+            if on_stage is not None:
+                on_stage(name, value)
+
+        run = pipeline.run({'topic': topic}, on_result=_on_result)
+        results = run['results']
+        content = results.pop('bundle', {})
+        content.update(results)
+        content.update(image_ids)
+        content['timings'] = run['timings']
+        content['total'] = run['total']
+
+        logging.info(f"Content pipeline finished in {run['total']}s: {run['timings']}")
+        return content
+
+    def iter_generate_batch(
+            self,
+            topics: Iterable[str],
+            image_processor=None,
+            max_parallel: int = 4,
+            combined: bool = True,
+            use_cache: bool = True
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Генерация постов для многих тем с выдачей результатов по готовности
+
+        Одновременно обрабатывается не больше max_parallel тем, а темы
+        берутся из topics по мере освобождения мест, поэтому topics может
+        быть потоком (например, строками большого файла). Запросы к OpenAI
+        и Stability AI дополнительно ограничены openai_concurrency и
+        stability_concurrency генератора.
+
+        Args:
+            topics: Темы постов
+            image_processor: ImageProcessor для наложения заголовка
+            max_parallel: Максимум тем в работе одновременно
+            combined: Текст, заголовок и промпт одним запросом
+            use_cache: False - мимо кэшей ответов и изображений
+
+        Yields:
+            {'index', 'topic', 'success', 'content'} или {'index', 'topic', 'success', 'error'}
+        """
+        topics = iter(enumerate(topics))
+        executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix='batch-topic')
+        running = {}
+
+        def _submit_next() -> bool:
+            item = next(topics, None)
+            if item is None:
+                return False
+            index, topic = item
+            future = executor.submit(
+                self.generate_content, topic,
+                image_processor=image_processor, combined=combined, use_cache=use_cache
+            )
+            running[future] = (index, topic)
+            return True
+
+        try:
+            while len(running) < max_parallel and _submit_next():
+                pass
+
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, topic = running.pop(future)
+                    try:
+                        result = {'index': index, 'topic': topic, 'success': True, 'content': future.result()}
+                    except Exception as e:
+                        logging.error(f"Batch topic #{index} '{topic}' failed: {e}")
+                        result = {'index': index, 'topic': topic, 'success': False, 'error': str(e)}
+                    _submit_next()
+                    yield result
+        finally:
+            # Потребитель прервал выдачу: новые темы не начинаем
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def generate_post_bundle(self, topic: str, use_cache: bool = True) -> Dict[str, str]:
+        """
+        Генерация текста, заголовка и промпта изображения одним запросом
+
+        Модель возвращает JSON-объект, который проверяется; если ответ не
+        разобрался или поле не прошло проверку, только это поле
+        генерируется отдельным запросом. Заголовок и промпт описывают
+        текст, поэтому при замене текста они генерируются заново.
+        Ошибки API (после повторов) не приводят к отдельным запросам
+        и возвращаются вызывающему.
+
+        Returns:
+            {'text', 'headline', 'image_prompt'}
+        """
+        logging.info(f"Generating post bundle for topic: '{topic}'")
+        try:
+            prompt = f"""
+            Подготовь публикацию для Telegram по теме: "{topic}"
+
+            Верни JSON-объект с тремя полями:
+            - "text": пост на русском языке
+                - Длина: не более 800 символов (ОЧЕНЬ ВАЖНО!)
+                - Стиль: информативно, увлекательно, доступно
+                - Структура: яркий заголовок, основная мысль, призыв к действию
+                - Используй эмодзи для привлечения внимания (2-3 штуки максимум)
+                - Добавь 1-2 хэштега в конце
+            - "headline": очень короткий заголовок на русском (максимум 5 слов),
+              яркий, отражает суть поста, без кавычек
+            - "image_prompt": промпт на английском языке для генерации изображения
+                - Визуальная сцена, отражающая суть поста, с конкретными деталями
+                - Укажи стиль (например: professional, modern, colorful, minimalist)
+                - Вертикальный формат (9:16), без текста на изображении
+
+            Ответ - только JSON, без пояснений.
+            """
+
+            content = self._chat(
+                messages=[
+                    {"role": "system", "content": "Ты - опытный SMM-специалист, который создает вирусные посты для социальных сетей, и эксперт по промптам для генерации изображений. Отвечай строго JSON-объектом."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.8,
+                max_tokens=900,
+                use_cache=use_cache,
+                stage='bundle',
+                validate=lambda content: len(self._parse_bundle(content)) == len(self.BUNDLE_FIELDS),
+                response_format={"type": "json_object"}
+            )
+        except Exception as e:
+            logging.error(f"Failed to generate post bundle: {e}")
+            raise Exception(f"Ошибка генерации поста: {str(e)}")
+
+        bundle = self._parse_bundle(content)
+        missing = set(self.BUNDLE_FIELDS) - set(bundle)
+        if missing:
+            logging.warning(f"Combined generation fields failed validation: {sorted(missing)}")
+
+        # Догенерируем то, что не прошло проверку
+        if 'text' not in bundle:
+            # Заголовок и промпт относились к отброшенному тексту
+            bundle.pop('headline', None)
+            bundle.pop('image_prompt', None)
+            bundle['text'] = self.generate_post_text(topic, use_cache=use_cache)
+        if 'headline' not in bundle:
+            bundle['headline'] = self.generate_headline(bundle['text'], use_cache=use_cache)
+        if 'image_prompt' not in bundle:
+            bundle['image_prompt'] = self.generate_image_prompt(bundle['text'], use_cache=use_cache)
+
+        logging.info("Post bundle generated successfully.")
+        return bundle
+
+    @staticmethod
+    def _parse_bundle(content: str) -> Dict[str, str]:
+        """
+        Разбор и проверка JSON-ответа комбинированной генерации
+
+        Returns:
+            Только прошедшие проверку поля (пустой словарь, если это не JSON-объект)
+        """
+        try:
+            data = json.loads(content)
+        except (TypeError, json.JSONDecodeError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+
+        bundle = {}
+
+        text = data.get('text')
+        if isinstance(text, str) and text.strip() and len(text) <= Config.MAX_POST_LENGTH:
+            bundle['text'] = text.strip()
+
+        headline = data.get('headline')
+        if isinstance(headline, str):
+            headline = headline.strip().strip('"\'')
+            if headline and len(headline) <= Config.MAX_HEADLINE_LENGTH:
+                bundle['headline'] = headline
+
+        # Промпт для Stability должен быть на английском
+        image_prompt = data.get('image_prompt')
+        if isinstance(image_prompt, str) and image_prompt.strip() \
+                and not re.search('[а-яА-ЯёЁ]', image_prompt):
+            bundle['image_prompt'] = image_prompt.strip()
+
+        return bundle
+
+    def generate_post_text(
+            self,
+            topic: str,
+            on_token: Optional[Callable[[str], None]] = None,
+            use_cache: bool = True
+    ) -> str:
         """
         Генерация текста поста через ChatGPT
+
+        Args:
+            topic: Тема поста
+            on_token: Если задан, ответ запрашивается потоком (stream=True),
+                      и каждый полученный фрагмент текста передается в on_token
+            use_cache: False - запрос мимо кэша ответов
         """
         logging.info(f"Generating post text for topic: '{topic}'")
         try:
@@ -70,23 +464,26 @@ class AIGenerator:
             Текст должен быть полезным и интересным для широкой аудитории.
             """
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Ты - опытный SMM-специалист, который создает вирусные посты для социальных сетей. Твои посты всегда получают высокую вовлеченность."},
-                    {"role": "user", "content": prompt}
-                ],
+            messages = [
+                {"role": "system", "content": "Ты - опытный SMM-специалист, который создает вирусные посты для социальных сетей. Твои посты всегда получают высокую вовлеченность."},
+                {"role": "user", "content": prompt}
+            ]
+
+            post_text = self._chat(
+                messages=messages,
                 temperature=0.8,
-                max_tokens=500
-            )
-            post_text = response.choices[0].message.content.strip()
+                max_tokens=500,
+                use_cache=use_cache,
+                stage='text',
+                on_token=on_token
+            ).strip()
             logging.info("Post text generated successfully.")
             return post_text
         except Exception as e:
             logging.error(f"Failed to generate post text: {e}")
             raise Exception(f"Ошибка генерации текста: {str(e)}")
 
-    def generate_image_prompt(self, post_text: str) -> str:
+    def generate_image_prompt(self, post_text: str, use_cache: bool = True) -> str:
         """
         Генерация промпта для создания изображения
         """
@@ -107,98 +504,72 @@ class AIGenerator:
             Ответ должен содержать только промпт для изображения, без дополнительных объяснений.
             """
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
+            image_prompt = self._chat(
                 messages=[
                     {"role": "system", "content": "You are an expert at creating detailed image generation prompts. You understand how to translate ideas into visual descriptions that AI image generators can understand perfectly."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.7,
-                max_tokens=300
-            )
-            image_prompt = response.choices[0].message.content.strip()
+                max_tokens=300,
+                use_cache=use_cache,
+                stage='image_prompt'
+            ).strip()
             logging.info(f"Image prompt generated: '{image_prompt[:50]}...'")
             return image_prompt
         except Exception as e:
             logging.error(f"Failed to generate image prompt: {e}")
             raise Exception(f"Ошибка генерации промпта для изображения: {str(e)}")
 
-    def generate_image(self, prompt: str) -> bytes:
+    def generate_image(self, prompt: str, use_cache: bool = True) -> bytes:
         """
         Генерация изображения через Stability AI
-        """
-        logging.info(f"Generating image with Stability AI for prompt: '{prompt[:50]}...'")
-        try:
-            url = f"{self.stability_api_host}/v2beta/stable-image/generate/sd3"
-
-            logging.info("Attempting to generate with SD3 model.")
-            response = requests.post(
-                url,
-                headers={
-                    "authorization": f"Bearer {self.stability_key}",
-                    "accept": "image/*"
-                },
-                files={"none": ''},
-                data={
-                    "prompt": prompt,
-                    "aspect_ratio": "9:16",
-                    "model": "sd3-large-turbo",
-                    "output_format": "png",
-                    "negative_prompt": "low quality, blurry, distorted, ugly, bad anatomy, watermark, text, letters, words"
-                },
-                timeout=60,
-                proxies=self.requests_proxies
-            )
 
-            if response.status_code != 200:
-                logging.warning(f"SD3 failed with status {response.status_code}. Falling back to SDXL.")
-
-                # Fallback to SDXL
-                url = f"{self.stability_api_host}/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image"
-
-                response = requests.post(
-                    url,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Accept": "application/json",
-                        "Authorization": f"Bearer {self.stability_key}"
-                    },
-                    json={
-                        "text_prompts": [
-                            {
-                                "text": prompt,
-                                "weight": 1
-                            },
-                            {
-                                "text": "low quality, blurry, distorted, ugly, bad anatomy, watermark, text, letters",
-                                "weight": -1
-                            }
-                        ],
-                        "cfg_scale": 7,
-                        "height": 1344,  # Примерно 9:16 для SDXL
-                        "width": 768,
-                        "steps": 20,
-                        "samples": 1
-                    },
-                    timeout=60,
-                    proxies=self.requests_proxies
-                )
+        Если задано хранилище изображений, результат сохраняется под
+        ключом промпта и параметров генерации, и повторный промпт
+        обслуживается без обращения к Stability AI.
 
-                if response.status_code != 200:
-                    response.raise_for_status()
+        Args:
+            prompt: Промпт на английском языке
+            use_cache: False - генерировать заново, даже если есть в хранилище
+        """
+        if self.image_store is None:
+            return self._request_image(prompt)
 
-                # Для SDXL возвращаем декодированное изображение
-                response_json = response.json()
-                return base64.b64decode(response_json["artifacts"][0]["base64"])
+        key = ImageStore.make_key(
+            prompt=prompt,
+            aspect_ratio="9:16",
+            model="sd3-large-turbo",
+            fallback="stable-diffusion-xl-1024-v1-0",
+            output_format="png"
+        )
+        if use_cache:
+            image = self.image_store.lookup(key)
+            if image is not None:
+                logging.info("Image served from image store.")
+                return image
 
-            logging.info("Image generated successfully.")
-            return response.content
+        image = self._request_image(prompt)
+        self.image_store.put(image, key=key)
+        return image
 
+    def _request_image(self, prompt: str) -> bytes:
+        """
+        Запрос изображения у Stability AI (SD3, при ошибке - SDXL)
+        """
+        logging.info(f"Generating image with Stability AI for prompt: '{prompt[:50]}...'")
+        try:
+            image = self.stability_retry.call(
+                lambda: self.stability_client.generate_image(prompt),
+                stage='image',
+                limit=self._stability_slots
+            )
+            logging.info("Image generated successfully.")
+            return image
         except Exception as e:
             logging.error(f"Failed to generate image: {e}")
             raise Exception(f"Ошибка генерации изображения: {str(e)}")
 
-    def generate_headline(self, post_text: str) -> str:
+    def generate_headline(self, post_text: str, use_cache: bool = True) -> str:
         """
         Генерация короткого заголовка
         """
@@ -219,16 +590,16 @@ class AIGenerator:
             Ответ должен содержать только заголовок.
             """
 
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
+            headline = self._chat(
                 messages=[
                     {"role": "system", "content": "Ты - мастер создания кратких и ярких заголовков. Твои заголовки всегда цепляют внимание и точно передают суть контента."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.9,
-                max_tokens=20
-            )
-            headline = response.choices[0].message.content.strip().strip('"\'')
+                max_tokens=20,
+                use_cache=use_cache,
+                stage='headline'
+            ).strip().strip('"\'')
             logging.info(f"Headline generated: '{headline}'")
             return headline
         except Exception as e:
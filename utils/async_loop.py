@@ -0,0 +1,125 @@
+"""
+Модуль с собственным event loop, работающим в отдельном потоке
+"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Optional
+
+
+class AsyncLoopThread:
+    """
+    Event loop в выделенном потоке
+
+    Синхронный код (например, потоки Flask) отправляет корутины в единственный
+    loop через потокобезопасный submit() и получает concurrent.futures.Future.
+    Так все запросы мультиплексируются на одном loop и одном соединении.
+    """
+
+    def __init__(self, name: str = 'async-loop'):
+        """
+        Инициализация
+
+        Args:
+            name: Имя потока (для логов и отладки)
+        """
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop (поток запускается при первом обращении)"""
+        self.start()
+        return self._loop
+
+    def is_running(self) -> bool:
+        """Работает ли поток с loop"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def in_loop_thread(self) -> bool:
+        """Вызван ли код из потока loop"""
+        return threading.current_thread() is self._thread
+
+    def start(self):
+        """Запуск потока с loop (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self.is_running():
+                return
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        """Тело потока: loop работает до вызова stop()"""
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._ready.set()
+
+        try:
+            loop.run_forever()
+        finally:
+            # Отменяем незавершенные задачи и закрываем loop
+            pending = asyncio.all_tasks(loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """
+        Отправка корутины в loop
+
+        Args:
+            coro: Корутина
+
+        Returns:
+            Future с результатом; future.cancel() отменяет задачу в loop
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("Нельзя ожидать результат из потока event loop")
+
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Синхронный запуск корутины с ожиданием результата
+
+        Args:
+            coro: Корутина
+            timeout: Таймаут в секундах (None - без ограничения)
+
+        Returns:
+            Результат корутины
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # Не оставляем зависшую задачу в loop
+            future.cancel()
+            raise TimeoutError(f"Операция не завершилась за {timeout} секунд")
+
+    def stop(self, timeout: float = 5):
+        """
+        Остановка loop и ожидание завершения потока
+
+        Args:
+            timeout: Сколько ждать завершения потока
+        """
+        with self._lock:
+            thread, loop = self._thread, self._loop
+            if thread is None or not thread.is_alive():
+                return
+            loop.call_soon_threadsafe(loop.stop)
+
+        if not self.in_loop_thread():
+            thread.join(timeout)
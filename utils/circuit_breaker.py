@@ -0,0 +1,231 @@
+"""
+Модуль circuit breaker для внешних сервисов
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+
+class CircuitOpenError(Exception):
+    """Сервис временно исключен из маршрутизации"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name}: сервис недоступен, повтор через {retry_in:.0f} сек")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Состояние здоровья одного сервиса
+
+    Ведет скользящее окно исходов и задержек вызовов за window секунд.
+    closed - вызовы идут как обычно; если доля ошибок в окне достигла
+    error_rate (при минимум min_requests вызовах) или подряд случилось
+    consecutive_failures ошибок, breaker переходит в open и вызовы
+    отклоняются без обращения к сервису. Через open_seconds breaker
+    переходит в half_open и пропускает один пробный вызов: успех
+    закрывает его, ошибка снова открывает.
+
+    acquire() возвращает пробному вызову его номер, который передается в
+    release() и record_*(): состояние half_open меняет только исход
+    пробного вызова, а не вызова, начатого еще до открытия breaker.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+            self,
+            name: str,
+            window: float = 60,
+            error_rate: float = 0.5,
+            min_requests: int = 5,
+            consecutive_failures: int = 3,
+            open_seconds: float = 30
+    ):
+        """
+        Инициализация
+
+        Args:
+            name: Имя сервиса (для ошибок и отчета)
+            window: Длина скользящего окна в секундах
+            error_rate: Доля ошибок в окне, при которой breaker открывается
+            min_requests: Минимум вызовов в окне для оценки доли ошибок
+            consecutive_failures: Ошибок подряд, при которых breaker открывается сразу
+            open_seconds: Сколько секунд breaker открыт до пробного вызова
+        """
+        self.name = name
+        self.window = window
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.consecutive_failures = consecutive_failures
+        self.open_seconds = open_seconds
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        # Номер текущего пробного вызова в half_open (None - проба свободна)
+        self._probe: Optional[int] = None
+        self._probes = 0
+        self._failures_in_row = 0
+        # (время, успех, задержка)
+        self._outcomes: Deque[Tuple[float, bool, float]] = deque()
+        self._times_opened = 0
+        self._rejected = 0
+
+    def _trim(self, now: float):
+        """Удаление исходов за пределами окна (вызывается под блокировкой)"""
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _current_state(self, now: float) -> str:
+        """Состояние с учетом истечения open_seconds (вызывается под блокировкой)"""
+        if self._state == self.OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = self.HALF_OPEN
+            self._probe = None
+        return self._state
+
+    def _open(self, now: float):
+        """Перевод в open (вызывается под блокировкой)"""
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probe = None
+        self._times_opened += 1
+
+    @property
+    def state(self) -> str:
+        """Текущее состояние"""
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def available(self) -> bool:
+        """Можно ли сейчас направить вызов в сервис (без резервирования)"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            return state == self.CLOSED or (state == self.HALF_OPEN and self._probe is None)
+
+    def acquire(self) -> Optional[int]:
+        """
+        Разрешение на вызов
+
+        В half_open разрешается только один пробный вызов.
+
+        Returns:
+            Номер пробного вызова (передается в release() и record_*())
+            или None для обычного вызова
+
+        Raises:
+            CircuitOpenError: если вызов сейчас не разрешен
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._current_state(now)
+            if state == self.CLOSED:
+                return None
+            if state == self.HALF_OPEN and self._probe is None:
+                self._probes += 1
+                self._probe = self._probes
+                return self._probe
+            self._rejected += 1
+            retry_in = max(self.open_seconds - (now - self._opened_at), 0.0)
+        raise CircuitOpenError(self.name, retry_in)
+
+    def _is_probe(self, probe: Optional[int]) -> bool:
+        """Текущий ли это пробный вызов (вызывается под блокировкой)"""
+        return probe is not None and probe == self._probe
+
+    def release(self, probe: Optional[int] = None):
+        """
+        Вызов завершился без оценки здоровья (отменен или ошибка клиента)
+
+        Args:
+            probe: Результат acquire() этого вызова
+        """
+        with self._lock:
+            if self._is_probe(probe):
+                self._probe = None
+
+    def record_success(self, latency: float, probe: Optional[int] = None):
+        """
+        Успешный вызов
+
+        Args:
+            latency: Задержка вызова
+            probe: Результат acquire() этого вызова
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._outcomes.append((now, True, latency))
+            self._trim(now)
+            self._failures_in_row = 0
+            if self._current_state(now) == self.HALF_OPEN and self._is_probe(probe):
+                self._state = self.CLOSED
+                self._probe = None
+                # Старые ошибки не должны сразу открыть breaker снова
+                self._outcomes.clear()
+                self._outcomes.append((now, True, latency))
+
+    def record_failure(self, latency: float, probe: Optional[int] = None):
+        """
+        Ошибка вызова
+
+        Args:
+            latency: Задержка вызова
+            probe: Результат acquire() этого вызова
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._outcomes.append((now, False, latency))
+            self._trim(now)
+            self._failures_in_row += 1
+
+            state = self._current_state(now)
+            if state == self.HALF_OPEN:
+                if self._is_probe(probe):
+                    self._open(now)
+                return
+            if state != self.CLOSED:
+                return
+
+            failures = sum(1 for _, ok, _ in self._outcomes if not ok)
+            total = len(self._outcomes)
+            if self._failures_in_row >= self.consecutive_failures \
+                    or (total >= self.min_requests and failures / total >= self.error_rate):
+                self._open(now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Состояние для отчета
+
+        Returns:
+            {state, requests, error_rate, latency_p50, latency_p95,
+             failures_in_row, retry_in, times_opened, rejected}
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            state = self._current_state(now)
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok, _ in self._outcomes if not ok)
+            latencies = sorted(latency for _, ok, latency in self._outcomes if ok)
+
+            def percentile(p):
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))], 3)
+
+            return {
+                'state': state,
+                'requests': total,
+                'error_rate': round(failures / total, 3) if total else 0.0,
+                'latency_p50': percentile(50),
+                'latency_p95': percentile(95),
+                'failures_in_row': self._failures_in_row,
+                'retry_in': round(max(self.open_seconds - (now - self._opened_at), 0.0), 1)
+                if state == self.OPEN else 0.0,
+                'times_opened': self._times_opened,
+                'rejected': self._rejected
+            }
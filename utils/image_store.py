@@ -0,0 +1,240 @@
+"""
+Модуль хранилища изображений с адресацией по содержимому
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .sqlite_store import SQLiteStore
+
+_HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ImageStore(SQLiteStore):
+    """
+    Хранилище сгенерированных изображений на диске
+
+    Файл изображения называется SHA-256 своего содержимого, поэтому
+    одинаковые изображения хранятся один раз, а этапы и запросы могут
+    передавать короткий хэш вместо мегабайтов данных. Отдельный индекс
+    связывает ключ генерации (промпт и параметры) с хэшем, и повторный
+    промпт обслуживается без обращения к Stability AI.
+
+    При превышении max_bytes удаляются давно не использованные файлы
+    вместе с ссылающимися на них записями индекса.
+    """
+
+    def __init__(self, root_dir: str, max_bytes: int = 500 * 1024 * 1024):
+        """
+        Инициализация хранилища
+
+        Args:
+            root_dir: Каталог хранилища
+            max_bytes: Максимальный суммарный размер изображений
+        """
+        super().__init__(os.path.join(root_dir, 'index.db'))
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0}
+        # Суммарный размер изображений: ведется при записи и удалении,
+        # чтобы не считать SUM по всей таблице на каждый put
+        self._bytes = 0
+
+        self._init_db()
+
+    def _init_db(self):
+        """Создание таблиц изображений и индекса ключей генерации"""
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS images (
+                hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS images_accessed ON images (accessed_at)')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS generation_keys (
+                key TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS generation_keys_hash ON generation_keys (hash)')
+        self._bytes = self._total_bytes()
+
+    def _total_bytes(self) -> int:
+        """Точный суммарный размер по индексу (полный проход по таблице)"""
+        return self._connect().execute('SELECT COALESCE(SUM(size), 0) FROM images').fetchone()[0]
+
+    @staticmethod
+    def make_key(**params: Any) -> str:
+        """Ключ генерации по промпту и параметрам"""
+        raw = json.dumps(params, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def content_id(data: bytes) -> str:
+        """ID изображения - SHA-256 содержимого (совпадает с результатом put())"""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def is_valid_hash(image_id: str) -> bool:
+        """Проверка формата хэша (защита от обхода путей)"""
+        return bool(image_id) and bool(_HASH_RE.match(image_id))
+
+    def path(self, image_id: str) -> str:
+        """Путь к файлу изображения"""
+        if not self.is_valid_hash(image_id):
+            raise ValueError(f"Некорректный ID изображения: {image_id}")
+        return os.path.join(self.root_dir, image_id[:2], image_id + '.png')
+
+    def put(self, data: bytes, key: Optional[str] = None) -> str:
+        """
+        Сохранение изображения
+
+        Args:
+            data: Байты изображения
+            key: Ключ генерации, по которому изображение можно найти через lookup()
+
+        Returns:
+            ID изображения (SHA-256 содержимого)
+        """
+        image_id = self.content_id(data)
+        path = self.path(image_id)
+        now = time.time()
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Пишем через временный файл, чтобы читатели не увидели половину
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._stats['stored'] += 1
+
+        conn = self._connect()
+        # Размер учитывается, только если запись действительно добавлена
+        added = conn.execute(
+            'INSERT OR IGNORE INTO images (hash, size, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (image_id, len(data), now, now)
+        ).rowcount
+        if added:
+            with self._lock:
+                self._bytes += len(data)
+        else:
+            conn.execute('UPDATE images SET accessed_at = ? WHERE hash = ?', (now, image_id))
+        if key:
+            conn.execute(
+                'INSERT OR REPLACE INTO generation_keys (key, hash, created_at) VALUES (?, ?, ?)',
+                (key, image_id, now)
+            )
+        self._evict(keep=image_id)
+        return image_id
+
+    def get(self, image_id: str) -> Optional[bytes]:
+        """
+        Изображение по ID
+
+        Returns:
+            Байты изображения или None
+        """
+        if not self.is_valid_hash(image_id):
+            return None
+        try:
+            with open(self.path(image_id), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            self._forget(image_id)
+            return None
+
+        self._connect().execute('UPDATE images SET accessed_at = ? WHERE hash = ?', (time.time(), image_id))
+        return data
+
+    def lookup(self, key: str) -> Optional[bytes]:
+        """
+        Изображение по ключу генерации
+
+        Returns:
+            Байты изображения или None
+        """
+        row = self._connect().execute(
+            'SELECT hash FROM generation_keys WHERE key = ?', (key,)
+        ).fetchone()
+        data = self.get(row['hash']) if row else None
+        with self._lock:
+            self._stats['hits' if data is not None else 'misses'] += 1
+        return data
+
+    def _forget(self, image_id: str):
+        """Удаление записей об изображении"""
+        conn = self._connect()
+        row = conn.execute('SELECT size FROM images WHERE hash = ?', (image_id,)).fetchone()
+        conn.execute('DELETE FROM generation_keys WHERE hash = ?', (image_id,))
+        conn.execute('DELETE FROM images WHERE hash = ?', (image_id,))
+        if row is not None:
+            with self._lock:
+                self._bytes -= row['size']
+
+    def _evict(self, keep: Optional[str] = None):
+        """
+        Удаление давно не использованных изображений сверх бюджета
+
+        Решение принимается по счетчику размера; когда он превысил
+        бюджет, размер пересчитывается по таблице (в нее могли писать
+        другие процессы), и только затем удаляются изображения.
+        """
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+
+        conn = self._connect()
+        total = self._total_bytes()
+        with self._lock:
+            self._bytes = total
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for row in conn.execute('SELECT hash, size FROM images ORDER BY accessed_at').fetchall():
+            if total <= self.max_bytes:
+                break
+            if row['hash'] == keep:
+                continue
+            try:
+                os.remove(self.path(row['hash']))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"ImageStore: не удалось удалить {row['hash']}: {e}")
+                continue
+            self._forget(row['hash'])
+            total -= row['size']
+            evicted += 1
+
+        with self._lock:
+            self._stats['evicted'] += evicted
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Счетчики хранилища
+
+        Returns:
+            {hits, misses, stored, evicted, images, bytes, max_bytes}
+        """
+        row = self._connect().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images').fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+        stats['images'] = row[0]
+        stats['bytes'] = row[1]
+        stats['max_bytes'] = self.max_bytes
+        return stats
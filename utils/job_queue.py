@@ -0,0 +1,316 @@
+"""
+Модуль durable-очереди фоновых задач на SQLite
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from .sqlite_store import SQLiteStore
+
+# Обработчик задачи: (payload, бинарные данные) -> результат
+JobHandler = Callable[[Dict[str, Any], Optional[bytes]], Dict[str, Any]]
+
+
+class RetryLater(Exception):
+    """
+    Задачу нужно повторить позже (например, Telegram вернул FloodWait)
+
+    Отложенная задача возвращается в очередь со временем запуска и не
+    расходует попытки max_attempts.
+    """
+
+    def __init__(self, seconds: float, reason: str = '', payload: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            seconds: Через сколько секунд повторить
+            reason: Причина (сохраняется в error задачи)
+            payload: Новые параметры задачи (например, без уже выполненных целей)
+        """
+        super().__init__(reason or f"Повтор через {seconds:.0f} сек")
+        self.seconds = seconds
+        self.payload = payload
+
+
+class JobQueue(SQLiteStore):
+    """
+    Очередь задач, переживающая перезапуск процесса
+
+    Задачи хранятся в SQLite и выполняются пулом рабочих потоков.
+    Задачи, оставшиеся в статусе 'running' после падения процесса,
+    возвращает в очередь recover() - его вызывает при старте процесс,
+    который владеет очередью.
+
+    Упавшая задача повторяется после паузы backoff(attempts), чтобы
+    постоянная ошибка не израсходовала все попытки за доли секунды.
+
+    Обработчик может отложить задачу, выбросив RetryLater: она вернется
+    в очередь со временем запуска run_after (не больше max_deferrals раз).
+
+    Статусы: queued -> running -> done | failed.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    # Предел паузы перед повтором упавшей задачи
+    MAX_RETRY_DELAY = 300.0
+
+    def __init__(self, db_path: str, workers: int = 2, max_attempts: int = 3, max_deferrals: int = 5,
+                 retry_delay: float = 5.0):
+        """
+        Инициализация очереди
+
+        Args:
+            db_path: Путь к файлу базы SQLite
+            workers: Количество рабочих потоков
+            max_attempts: Сколько раз пробовать задачу, если обработчик упал
+            max_deferrals: Сколько раз задачу можно отложить через RetryLater
+            retry_delay: Пауза перед первым повтором упавшей задачи (дальше - вдвое больше)
+        """
+        super().__init__(db_path)
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.max_deferrals = max_deferrals
+        self.retry_delay = retry_delay
+        self._handlers: Dict[str, JobHandler] = {}
+        self._threads: List[threading.Thread] = []
+        self._start_lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._stopping = False
+
+        self._init_db()
+
+    def _init_db(self):
+        """Создание таблицы задач"""
+        self._connect().execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                data BLOB,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        ''')
+        self._connect().execute(
+            'CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)'
+        )
+
+        # Колонки отложенного запуска (базы, созданные до их появления)
+        columns = {row['name'] for row in self._connect().execute('PRAGMA table_info(jobs)')}
+        if 'run_after' not in columns:
+            self._connect().execute('ALTER TABLE jobs ADD COLUMN run_after REAL')
+        if 'deferrals' not in columns:
+            self._connect().execute('ALTER TABLE jobs ADD COLUMN deferrals INTEGER NOT NULL DEFAULT 0')
+
+    def register(self, kind: str, handler: JobHandler):
+        """
+        Регистрация обработчика задач
+
+        Args:
+            kind: Тип задачи
+            handler: Функция (payload, data) -> результат; результат с
+                     'success': False помечает задачу как failed без повтора
+        """
+        self._handlers[kind] = handler
+
+    def recover(self):
+        """
+        Возврат в очередь задач, прерванных падением процесса
+
+        Вызывается один раз при старте процесса, владеющего очередью, до
+        запуска рабочих потоков. Не вызывается при создании очереди:
+        каждый процесс, импортирующий приложение (второй воркер, shell,
+        скрипт), вернул бы в очередь задачи, которые сейчас выполняют
+        рабочие потоки другого процесса, и посты опубликовались бы дважды.
+        """
+        recovered = self._connect().execute(
+            'UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?',
+            (self.QUEUED, time.time(), self.RUNNING)
+        ).rowcount
+        if recovered:
+            logging.info(f"JobQueue: {recovered} прерванных задач возвращены в очередь")
+
+    def start(self):
+        """Запуск рабочих потоков (повторные и одновременные вызовы ничего не делают)"""
+        with self._start_lock:
+            if self._threads:
+                return
+
+            self._stopping = False
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5):
+        """Остановка рабочих потоков (текущие задачи дорабатывают)"""
+        with self._start_lock:
+            with self._wakeup:
+                self._stopping = True
+                self._wakeup.notify_all()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def submit(self, kind: str, payload: Dict[str, Any], data: Optional[bytes] = None,
+               job_id: Optional[str] = None) -> str:
+        """
+        Постановка задачи в очередь
+
+        Args:
+            kind: Тип задачи (должен быть зарегистрирован)
+            payload: Параметры задачи (JSON-сериализуемые)
+            data: Бинарные данные (например, изображение)
+            job_id: ID задачи, заданный заранее; если задача с таким ID
+                    уже есть, вторая не создается
+
+        Returns:
+            ID задачи
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Неизвестный тип задачи: {kind}")
+
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            'INSERT OR IGNORE INTO jobs (id, kind, status, payload, data, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, self.QUEUED, json.dumps(payload, ensure_ascii=False), data, now, now)
+        )
+
+        with self._wakeup:
+            self._wakeup.notify()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Состояние задачи
+
+        Returns:
+            Словарь со статусом и результатом или None
+        """
+        row = self._connect().execute(
+            'SELECT id, kind, status, result, error, attempts, deferrals, run_after, created_at, updated_at, '
+            'started_at, finished_at FROM jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """Количество задач по статусам"""
+        rows = self._connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def backoff(self, attempts: int) -> float:
+        """Пауза перед повтором задачи, упавшей attempts раз"""
+        return min(self.retry_delay * 2 ** (attempts - 1), self.MAX_RETRY_DELAY)
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Атомарный захват самой старой задачи из очереди"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE status = ? AND (run_after IS NULL OR run_after <= ?) '
+                'ORDER BY created_at LIMIT 1',
+                (self.QUEUED, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    'UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, updated_at = ? '
+                    'WHERE id = ?',
+                    (self.RUNNING, now, now, row['id'])
+                )
+            conn.execute('COMMIT')
+            return row
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None):
+        """Запись итога задачи; данные больше не нужны и удаляются"""
+        now = time.time()
+        self._connect().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, data = NULL, finished_at = ?, updated_at = ? '
+            'WHERE id = ?',
+            (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+             error, now, now, job_id)
+        )
+
+    def _worker(self):
+        """Цикл рабочего потока"""
+        while not self._stopping:
+            try:
+                row = self._claim()
+            except sqlite3.Error as e:
+                logging.error(f"JobQueue: ошибка чтения очереди: {e}")
+                row = None
+
+            if row is None:
+                with self._wakeup:
+                    if not self._stopping:
+                        self._wakeup.wait(timeout=5)
+                continue
+
+            self._run(row)
+
+    def _run(self, row: sqlite3.Row):
+        """Выполнение одной задачи"""
+        job_id = row['id']
+        handler = self._handlers.get(row['kind'])
+        if handler is None:
+            self._finish(job_id, self.FAILED, error=f"Нет обработчика для {row['kind']}")
+            return
+
+        payload = json.loads(row['payload'])
+        try:
+            result = handler(payload, row['data'])
+        except RetryLater as e:
+            if row['deferrals'] < self.max_deferrals:
+                logging.info(f"JobQueue: задача {job_id} отложена на {e.seconds:.0f} сек: {e}")
+                now = time.time()
+                self._connect().execute(
+                    'UPDATE jobs SET status = ?, payload = ?, error = ?, run_after = ?, '
+                    'deferrals = deferrals + 1, attempts = attempts - 1, updated_at = ? WHERE id = ?',
+                    (self.QUEUED, json.dumps(e.payload if e.payload is not None else payload, ensure_ascii=False),
+                     str(e), now + e.seconds, now, job_id)
+                )
+            else:
+                self._finish(job_id, self.FAILED, error=str(e))
+            return
+        except Exception as e:
+            logging.error(f"JobQueue: задача {job_id} упала: {e}")
+            # Строка прочитана до захвата: с текущей попыткой их на одну больше
+            attempts = row['attempts'] + 1
+            if attempts < self.max_attempts:
+                now = time.time()
+                self._connect().execute(
+                    'UPDATE jobs SET status = ?, error = ?, run_after = ?, updated_at = ? WHERE id = ?',
+                    (self.QUEUED, str(e), now + self.backoff(attempts), now, job_id)
+                )
+            else:
+                self._finish(job_id, self.FAILED, error=str(e))
+            return
+
+        status = self.DONE if result.get('success', True) else self.FAILED
+        self._finish(job_id, status, result=result, error=result.get('error'))
@@ -0,0 +1,235 @@
+"""
+Модуль кэша ответов LLM
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .sqlite_store import SQLiteStore
+
+
+class LLMCache(SQLiteStore):
+    """
+    Двухуровневый кэш ответов chat completions
+
+    Ключ - SHA-256 от модели, сообщений и параметров генерации, поэтому
+    одинаковые запросы (повторная тема, заголовок для того же текста)
+    обслуживаются локально. Верхний уровень - LRU в памяти, нижний -
+    SQLite на диске, переживающий перезапуск. Записи старше ttl
+    считаются отсутствующими; при превышении max_disk_bytes с диска
+    удаляются давно не использованные записи.
+    """
+
+    def __init__(
+            self,
+            db_path: str,
+            ttl: float = 86400,
+            max_disk_bytes: int = 50 * 1024 * 1024,
+            max_memory_items: int = 256
+    ):
+        """
+        Инициализация кэша
+
+        Args:
+            db_path: Путь к файлу базы SQLite
+            ttl: Время жизни записи в секундах
+            max_disk_bytes: Максимальный суммарный размер ответов на диске
+            max_memory_items: Количество записей в памяти
+        """
+        super().__init__(db_path)
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_items = max_memory_items
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'bypassed': 0, 'evicted': 0}
+        # Суммарный размер ответов на диске: ведется при записи и удалении,
+        # чтобы не считать SUM по всей таблице на каждый put
+        self._disk_bytes = 0
+
+        self._init_db()
+
+    def _init_db(self):
+        """Создание таблицы кэша"""
+        self._connect().execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._connect().execute(
+            'CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)'
+        )
+        self._connect().execute(
+            'CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created_at)'
+        )
+        self._disk_bytes = self._total_bytes(self._connect())
+
+    @staticmethod
+    def _total_bytes(conn: sqlite3.Connection) -> int:
+        """Точный суммарный размер по таблице (полный проход)"""
+        return conn.execute('SELECT COALESCE(SUM(size), 0) FROM llm_cache').fetchone()[0]
+
+    def _add_bytes(self, delta: int):
+        with self._lock:
+            self._disk_bytes += delta
+
+    @staticmethod
+    def make_key(**request: Any) -> str:
+        """
+        Ключ кэша по параметрам запроса
+
+        Args:
+            request: model, messages, temperature, max_tokens и прочие
+                     параметры, влияющие на ответ
+        """
+        raw = json.dumps(request, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Ответ из кэша
+
+        Returns:
+            Текст ответа или None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, size, created_at FROM llm_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None and now - row['created_at'] >= self.ttl:
+                conn.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self._add_bytes(-row['size'])
+                row = None
+            if row is not None:
+                conn.execute('UPDATE llm_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            logging.warning(f"LLMCache: ошибка чтения кэша: {e}")
+            row = None
+
+        with self._lock:
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._remember(key, row['value'], row['created_at'])
+        return row['value']
+
+    def put(self, key: str, value: str):
+        """Сохранение ответа в кэш"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+
+        try:
+            conn = self._connect()
+            size = len(value.encode('utf-8'))
+            previous = conn.execute('SELECT size FROM llm_cache WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO llm_cache (key, value, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, value, size, now, now)
+            )
+            self._add_bytes(size - (previous['size'] if previous else 0))
+            self._evict(conn)
+        except sqlite3.Error as e:
+            logging.warning(f"LLMCache: ошибка записи кэша: {e}")
+
+    def record_bypass(self):
+        """Учет запроса, выполненного мимо кэша"""
+        with self._lock:
+            self._stats['bypassed'] += 1
+
+    def _remember(self, key: str, value: str, created_at: float):
+        """Запись в LRU в памяти (вызывается под блокировкой)"""
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self, conn: sqlite3.Connection):
+        """
+        Удаление устаревших и давно не использованных записей сверх лимита
+
+        Устаревшие записи находятся по индексу created_at. Превышение
+        лимита определяется по счетчику размера; когда он превысил лимит,
+        размер пересчитывается по таблице (в нее могли писать другие
+        процессы), и только затем удаляются записи.
+        """
+        expired_before = time.time() - self.ttl
+        expired = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache WHERE created_at < ?', (expired_before,)
+        ).fetchone()
+        if expired[0]:
+            conn.execute('DELETE FROM llm_cache WHERE created_at < ?', (expired_before,))
+            self._add_bytes(-expired[1])
+
+        with self._lock:
+            if self._disk_bytes <= self.max_disk_bytes:
+                return
+
+        total = self._total_bytes(conn)
+        if total <= self.max_disk_bytes:
+            with self._lock:
+                self._disk_bytes = total
+            return
+
+        evicted = 0
+        for row in conn.execute('SELECT key, size FROM llm_cache ORDER BY accessed_at').fetchall():
+            if total <= self.max_disk_bytes:
+                break
+            conn.execute('DELETE FROM llm_cache WHERE key = ?', (row['key'],))
+            total -= row['size']
+            evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self._stats['evicted'] += evicted
+
+    def clear(self):
+        """Очистка кэша"""
+        self._connect().execute('DELETE FROM llm_cache')
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Счетчики кэша
+
+        Returns:
+            {memory_hits, disk_hits, misses, bypassed, evicted, hit_rate,
+             memory_items, disk_items, disk_bytes}
+        """
+        row = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache'
+        ).fetchone()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_items'] = len(self._memory)
+        hits = stats['memory_hits'] + stats['disk_hits']
+        lookups = hits + stats['misses']
+        stats['hit_rate'] = round(hits / lookups, 3) if lookups else 0.0
+        stats['disk_items'] = row[0]
+        stats['disk_bytes'] = row[1]
+        return stats
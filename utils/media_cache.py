@@ -0,0 +1,184 @@
+"""
+Модуль кэша загруженных в Telegram медиафайлов
+"""
+import asyncio
+import hashlib
+import io
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Tuple
+
+from telethon import utils as tg_utils
+from telethon.errors import (
+    FilePart0MissingError,
+    FilePartMissingError,
+    FilePartsInvalidError,
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    MediaEmptyError
+)
+from telethon.tl.types import InputMediaPhoto, InputMediaUploadedPhoto
+
+# Ошибки, означающие что закэшированный handle больше не действителен
+STALE_MEDIA_ERRORS = (
+    FilePart0MissingError,
+    FilePartMissingError,
+    FilePartsInvalidError,
+    FileReferenceExpiredError,
+    FileReferenceInvalidError,
+    MediaEmptyError
+)
+
+
+class MediaCache:
+    """
+    Кэш загруженных изображений по хэшу содержимого
+
+    Хранит два вида handle:
+    - InputFile после upload_file() - загруженные части живут на сервере
+      ограниченное время, поэтому запись действует upload_ttl секунд;
+    - InputPhoto из отправленного сообщения - повторная отправка того же фото
+      в другие чаты обходится без передачи байтов.
+
+    Так один пост с рассылкой в группу, личную Story и Story канала
+    передает изображение один раз.
+    """
+
+    def __init__(self, upload_ttl: float = 1800, max_items: int = 256):
+        """
+        Инициализация кэша
+
+        Args:
+            upload_ttl: Время жизни handle в секундах
+            max_items: Максимальное число изображений в кэше
+        """
+        self.upload_ttl = upload_ttl
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._upload_locks: Dict[str, asyncio.Lock] = {}
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        """Ключ кэша: SHA-256 содержимого"""
+        return hashlib.sha256(data).hexdigest()
+
+    def _get(self, key: str, field: str):
+        """Значение поля записи, если запись не устарела"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or field not in entry:
+                return None
+            value, stored_at = entry[field]
+            if time.monotonic() - stored_at >= self.upload_ttl:
+                del entry[field]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _put(self, key: str, field: str, value):
+        """Сохранение поля записи с вытеснением самых старых записей"""
+        with self._lock:
+            entry = self._entries.setdefault(key, {})
+            entry[field] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_items:
+                old_key, _ = self._entries.popitem(last=False)
+                self._upload_locks.pop(old_key, None)
+
+    def get_file(self, key: str):
+        """Закэшированный InputFile или None"""
+        return self._get(key, 'file')
+
+    def get_photo(self, key: str):
+        """Закэшированный InputPhoto или None"""
+        return self._get(key, 'photo')
+
+    def remember_photo(self, key: str, message):
+        """
+        Сохранение InputPhoto из отправленного сообщения
+
+        Args:
+            key: Хэш содержимого
+            message: Отправленное сообщение с фото
+        """
+        photo = getattr(message, 'photo', None)
+        if photo is not None:
+            self._put(key, 'photo', tg_utils.get_input_photo(photo))
+
+    def invalidate(self, key: str):
+        """Удаление всех handle изображения"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    async def upload(self, client, data: bytes, file_name: str = 'image.jpg') -> Tuple[str, Any]:
+        """
+        Загрузка изображения не более одного раза за upload_ttl
+
+        Одновременные вызовы с одинаковым содержимым ждут одну загрузку.
+
+        Args:
+            client: Подключенный TelegramClient
+            data: Байты изображения
+            file_name: Имя файла (по расширению Telegram определяет тип)
+
+        Returns:
+            (ключ, InputFile)
+        """
+        key = self.content_hash(data)
+        cached = self.get_file(key)
+        if cached is not None:
+            return key, cached
+
+        lock = self._upload_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            cached = self.get_file(key)
+            if cached is not None:
+                return key, cached
+
+            image_file = io.BytesIO(data)
+            image_file.name = file_name
+            uploaded = await client.upload_file(image_file)
+            self._put(key, 'file', uploaded)
+            return key, uploaded
+
+    async def story_media(self, client, data: bytes, refresh: bool = False) -> Tuple[str, Any]:
+        """
+        Медиа для SendStoryRequest на основе загруженного файла
+
+        Args:
+            client: Подключенный TelegramClient
+            data: Байты изображения
+            refresh: Загрузить заново (после STALE_MEDIA_ERRORS)
+
+        Returns:
+            (ключ, InputMediaUploadedPhoto)
+        """
+        if refresh:
+            self.invalidate(self.content_hash(data))
+        key, uploaded = await self.upload(client, data, 'story.jpg')
+        return key, InputMediaUploadedPhoto(file=uploaded)
+
+    async def message_media(self, client, data: bytes, refresh: bool = False) -> Tuple[str, Any]:
+        """
+        Медиа для send_file(): уже отправленное фото или загруженный файл
+
+        Args:
+            client: Подключенный TelegramClient
+            data: Байты изображения
+            refresh: Загрузить заново (после STALE_MEDIA_ERRORS)
+
+        Returns:
+            (ключ, InputMediaPhoto или InputFile)
+        """
+        key = self.content_hash(data)
+        if refresh:
+            self.invalidate(key)
+        else:
+            photo = self.get_photo(key)
+            if photo is not None:
+                return key, InputMediaPhoto(id=photo)
+
+        key, uploaded = await self.upload(client, data, 'post.jpg')
+        return key, uploaded
@@ -0,0 +1,184 @@
+"""
+Модуль постоянного кэша сущностей Telegram (InputPeer + access_hash)
+"""
+import json
+import os
+import threading
+from typing import Optional, Dict, Any, Union
+
+from telethon import utils as tg_utils
+from telethon.errors import (
+    ChannelInvalidError,
+    ChannelPrivateError,
+    ChatIdInvalidError,
+    PeerIdInvalidError
+)
+from telethon.tl.types import (
+    InputPeerChannel,
+    InputPeerChat,
+    InputPeerUser
+)
+
+# Ошибки, после которых закэшированный peer нужно разрешить заново
+STALE_PEER_ERRORS = (
+    ChannelInvalidError,
+    ChannelPrivateError,
+    ChatIdInvalidError,
+    PeerIdInvalidError
+)
+
+
+class PeerCache:
+    """
+    Постоянный кэш разрешенных групп и каналов
+
+    StringSession не сохраняет entity-кэш Telethon между перезапусками,
+    поэтому каждый get_entity() шел в сеть. Здесь по username или ID
+    хранится готовый InputPeer (вместе с access_hash) в JSON-файле,
+    и в установившемся режиме публикация вообще не разрешает сущности.
+
+    access_hash привязан к аккаунту, поэтому кэш ведется отдельно на аккаунт.
+    """
+
+    def __init__(self, cache_file: Union[str, os.PathLike]):
+        """
+        Инициализация кэша
+
+        Args:
+            cache_file: Путь к JSON-файлу кэша
+        """
+        self.cache_file = str(cache_file)
+        self._lock = threading.Lock()
+        self._peers: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Загрузка кэша из файла"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, IOError):
+                pass
+        return {}
+
+    def _save(self):
+        """Сохранение кэша в файл (вызывается под блокировкой)"""
+        tmp_file = self.cache_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self._peers, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_file, self.cache_file)
+
+    @staticmethod
+    def normalize_key(target: Union[str, int]) -> str:
+        """
+        Нормализация ключа: '@Name', 'name' и 'NAME' дают один ключ
+
+        Args:
+            target: Username или ID группы/канала
+        """
+        key = str(target).strip()
+        if key.startswith('@'):
+            key = key[1:]
+        return key.lower()
+
+    @staticmethod
+    def _lookup_value(target: Union[str, int]) -> Union[str, int]:
+        """Значение для get_entity(): числовые ID передаются как int"""
+        key = PeerCache.normalize_key(target)
+        if key.lstrip('-').isdigit():
+            return int(key)
+        return key
+
+    @staticmethod
+    def _serialize(peer) -> Optional[Dict[str, Any]]:
+        """InputPeer -> словарь для JSON"""
+        if isinstance(peer, InputPeerChannel):
+            return {'type': 'channel', 'id': peer.channel_id, 'access_hash': peer.access_hash}
+        if isinstance(peer, InputPeerChat):
+            return {'type': 'chat', 'id': peer.chat_id}
+        if isinstance(peer, InputPeerUser):
+            return {'type': 'user', 'id': peer.user_id, 'access_hash': peer.access_hash}
+        return None
+
+    @staticmethod
+    def _deserialize(data: Dict[str, Any]):
+        """Словарь из JSON -> InputPeer"""
+        if data['type'] == 'channel':
+            return InputPeerChannel(channel_id=data['id'], access_hash=data['access_hash'])
+        if data['type'] == 'chat':
+            return InputPeerChat(chat_id=data['id'])
+        if data['type'] == 'user':
+            return InputPeerUser(user_id=data['id'], access_hash=data['access_hash'])
+        return None
+
+    def get(self, target: Union[str, int]):
+        """
+        Получение InputPeer из кэша
+
+        Returns:
+            InputPeer или None, если сущность еще не разрешалась
+        """
+        with self._lock:
+            data = self._peers.get(self.normalize_key(target))
+        return self._deserialize(data) if data else None
+
+    def get_title(self, target: Union[str, int]) -> Optional[str]:
+        """Название группы/канала из кэша"""
+        with self._lock:
+            data = self._peers.get(self.normalize_key(target))
+        return data.get('title') if data else None
+
+    def put(self, target: Union[str, int], entity):
+        """
+        Сохранение разрешенной сущности
+
+        Args:
+            target: Username или ID, по которому искали
+            entity: Сущность Telethon (Channel, Chat, User)
+
+        Returns:
+            InputPeer сущности
+        """
+        peer = tg_utils.get_input_peer(entity)
+        data = self._serialize(peer)
+        if data is None:
+            return peer
+
+        data['title'] = getattr(entity, 'title', None) or getattr(entity, 'username', None)
+        with self._lock:
+            self._peers[self.normalize_key(target)] = data
+            try:
+                self._save()
+            except IOError:
+                # Кэш в памяти продолжит работать и без файла
+                pass
+        return peer
+
+    def invalidate(self, target: Union[str, int]):
+        """Удаление сущности из кэша (например, после ChannelInvalidError)"""
+        with self._lock:
+            if self._peers.pop(self.normalize_key(target), None) is not None:
+                try:
+                    self._save()
+                except IOError:
+                    pass
+
+    async def resolve(self, client, target: Union[str, int], refresh: bool = False):
+        """
+        Получение InputPeer: из кэша или через сеть
+
+        Args:
+            client: Подключенный TelegramClient
+            target: Username или ID группы/канала
+            refresh: Игнорировать кэш и разрешить заново
+
+        Returns:
+            InputPeer
+        """
+        if not refresh:
+            peer = self.get(target)
+            if peer is not None:
+                return peer
+
+        entity = await client.get_entity(self._lookup_value(target))
+        return self.put(target, entity)
@@ -0,0 +1,132 @@
+"""
+Модуль выполнения этапов генерации по графу зависимостей
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+class PipelineError(Exception):
+    """Ошибка этапа конвейера"""
+
+    def __init__(self, stage: str, error: Exception, timings: Dict[str, Dict[str, float]]):
+        super().__init__(f"Этап '{stage}': {error}")
+        self.stage = stage
+        self.error = error
+        self.timings = timings
+
+
+class StagePipeline:
+    """
+    Граф этапов с параллельным выполнением независимых веток
+
+    Этап - функция, получающая результаты своих зависимостей как
+    именованные аргументы. Этап запускается, как только готовы все его
+    зависимости, поэтому, например, заголовок и промпт изображения
+    генерируются одновременно, а изображение начинает генерироваться
+    сразу после промпта, не дожидаясь заголовка.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        """
+        Args:
+            max_workers: Максимум одновременно выполняемых этапов
+        """
+        self.max_workers = max_workers
+        self._stages: Dict[str, Tuple[Callable[..., Any], Tuple[str, ...]]] = {}
+
+    def add(self, name: str, func: Callable[..., Any], deps: Iterable[str] = ()) -> 'StagePipeline':
+        """
+        Добавление этапа
+
+        Args:
+            name: Имя этапа (под ним результат передается зависимым этапам)
+            func: Функция этапа
+            deps: Имена этапов или входных данных, от которых зависит этап
+
+        Returns:
+            self (для цепочки вызовов)
+        """
+        if name in self._stages:
+            raise ValueError(f"Этап '{name}' уже добавлен")
+        self._stages[name] = (func, tuple(deps))
+        return self
+
+    def _validate(self, inputs: Dict[str, Any]):
+        """Проверка, что все зависимости известны и граф без циклов"""
+        known = set(self._stages) | set(inputs)
+        for name, (_, deps) in self._stages.items():
+            unknown = set(deps) - known
+            if unknown:
+                raise ValueError(f"Этап '{name}' зависит от неизвестных: {sorted(unknown)}")
+
+        resolved = set(inputs)
+        remaining = dict(self._stages)
+        while remaining:
+            ready = [name for name, (_, deps) in remaining.items() if set(deps) <= resolved]
+            if not ready:
+                raise ValueError(f"Цикл в графе этапов: {sorted(remaining)}")
+            for name in ready:
+                resolved.add(name)
+                del remaining[name]
+
+    def run(
+            self,
+            inputs: Optional[Dict[str, Any]] = None,
+            on_result: Optional[Callable[[str, Any], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Выполнение графа
+
+        Args:
+            inputs: Входные данные, доступные этапам как зависимости
+            on_result: Вызывается с (этап, результат) сразу после завершения этапа
+
+        Returns:
+            {'results': {этап: результат}, 'timings': {этап: {'start', 'duration'}}, 'total': сек}
+        """
+        inputs = dict(inputs or {})
+        self._validate(inputs)
+
+        results: Dict[str, Any] = dict(inputs)
+        timings: Dict[str, Dict[str, float]] = {}
+        pending = dict(self._stages)
+        started_at = time.perf_counter()
+
+        def _timed(name, func, kwargs):
+            start = time.perf_counter()
+            try:
+                return func(**kwargs)
+            finally:
+                timings[name] = {
+                    'start': round(start - started_at, 3),
+                    'duration': round(time.perf_counter() - start, 3)
+                }
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+            while pending or running:
+                # Запускаем все этапы, у которых готовы зависимости
+                for name in [n for n, (_, deps) in pending.items() if all(d in results for d in deps)]:
+                    func, deps = pending.pop(name)
+                    kwargs = {dep: results[dep] for dep in deps}
+                    running[executor.submit(_timed, name, func, kwargs)] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                        if on_result is not None:
+                            on_result(name, results[name])
+                    except Exception as e:
+                        # Не запускаем оставшиеся этапы; уже идущие дорабатывают
+                        for other in running:
+                            other.cancel()
+                        raise PipelineError(name, e, timings) from e
+
+        return {
+            'results': {name: value for name, value in results.items() if name not in inputs},
+            'timings': timings,
+            'total': round(time.perf_counter() - started_at, 3)
+        }
@@ -0,0 +1,278 @@
+"""
+Модуль отложенной публикации постов
+"""
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .sqlite_store import SQLiteStore
+
+# Запуск публикации: (kind, payload, data, job_id) -> ID фоновой задачи;
+# повторный вызов с тем же job_id не должен создавать вторую задачу
+FireCallback = Callable[[str, Dict[str, Any], Optional[bytes], str], str]
+
+
+class PostScheduler(SQLiteStore):
+    """
+    Планировщик публикаций по времени
+
+    Записи хранятся в SQLite, а в памяти - только min-heap пар
+    (время публикации, ID). Один поток-таймер спит до ближайшего срока
+    и передает запись в fire (обычно JobQueue.submit), поэтому тысячи
+    отложенных постов не требуют ни отдельных потоков, ни опроса базы.
+    После перезапуска ожидающие записи загружаются в heap заново,
+    просроченные публикуются сразу.
+
+    Перед вызовом fire запись получает статус firing и ID будущей
+    задачи, после - fired. Если процесс упал между ними или fire
+    выбросил исключение, запись остается firing и передается снова с
+    тем же job_id (через FIRE_RETRY_DELAY или после перезапуска), а fire
+    не создает задачу повторно - пост не публикуется дважды.
+
+    Статусы: pending -> firing -> fired | cancelled.
+    """
+
+    PENDING = 'pending'
+    FIRING = 'firing'
+    FIRED = 'fired'
+    CANCELLED = 'cancelled'
+
+    # Пауза перед повторной передачей записи, если fire выбросил исключение
+    FIRE_RETRY_DELAY = 5.0
+
+    def __init__(self, db_path: str, fire: FireCallback):
+        """
+        Инициализация планировщика
+
+        Args:
+            db_path: Путь к файлу базы SQLite
+            fire: Функция запуска публикации с заданным ID задачи, возвращает ID задачи
+        """
+        super().__init__(db_path)
+        self.fire = fire
+        self._heap: List[Tuple[float, str]] = []
+        # Актуальное время публикации ожидающих записей; записи heap
+        # с другим временем (перенесенные или отмененные) пропускаются
+        self._due: Dict[str, float] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopping = False
+
+        self._init_db()
+
+    def _init_db(self):
+        """Создание таблицы отложенных публикаций"""
+        self._connect().execute('''
+            CREATE TABLE IF NOT EXISTS scheduled_posts (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                data BLOB,
+                publish_at REAL NOT NULL,
+                job_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._connect().execute(
+            'CREATE INDEX IF NOT EXISTS scheduled_posts_status_at ON scheduled_posts (status, publish_at)'
+        )
+
+    def start(self):
+        """Загрузка ожидающих записей и запуск потока-таймера (повторные и одновременные вызовы ничего не делают)"""
+        with self._start_lock:
+            if self._thread is not None:
+                return
+
+            rows = self._connect().execute(
+                'SELECT id, publish_at FROM scheduled_posts WHERE status IN (?, ?)',
+                (self.PENDING, self.FIRING)
+            ).fetchall()
+
+            with self._cond:
+                for row in rows:
+                    self._push(row['id'], row['publish_at'])
+                self._stopping = False
+
+            if rows:
+                logging.info(f"PostScheduler: загружено {len(rows)} отложенных публикаций")
+
+            self._thread = threading.Thread(target=self._timer, name='post-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Остановка потока-таймера"""
+        with self._start_lock:
+            with self._cond:
+                self._stopping = True
+                self._cond.notify_all()
+            if self._thread is not None:
+                self._thread.join(timeout)
+                self._thread = None
+
+    def _push(self, item_id: str, publish_at: float):
+        """Добавление в heap (вызывается под блокировкой)"""
+        self._due[item_id] = publish_at
+        heapq.heappush(self._heap, (publish_at, item_id))
+        # Будим таймер: новая запись могла оказаться ближайшей
+        self._cond.notify()
+
+    def schedule(self, kind: str, payload: Dict[str, Any], publish_at: float,
+                 data: Optional[bytes] = None) -> str:
+        """
+        Отложенная публикация
+
+        Args:
+            kind: Тип задачи публикации (например, 'publish_post')
+            payload: Параметры публикации
+            publish_at: Время публикации (Unix timestamp)
+            data: Бинарные данные (изображение)
+
+        Returns:
+            ID записи
+        """
+        item_id = uuid.uuid4().hex
+        now = time.time()
+        self._connect().execute(
+            'INSERT INTO scheduled_posts (id, kind, status, payload, data, publish_at, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (item_id, kind, self.PENDING, json.dumps(payload, ensure_ascii=False), data, publish_at, now, now)
+        )
+        with self._cond:
+            self._push(item_id, publish_at)
+        return item_id
+
+    def reschedule(self, item_id: str, publish_at: float) -> bool:
+        """
+        Перенос публикации
+
+        Returns:
+            True если запись ожидала публикации и перенесена
+        """
+        with self._cond:
+            updated = self._connect().execute(
+                'UPDATE scheduled_posts SET publish_at = ?, updated_at = ? WHERE id = ? AND status = ?',
+                (publish_at, time.time(), item_id, self.PENDING)
+            ).rowcount
+            if updated:
+                self._push(item_id, publish_at)
+        return bool(updated)
+
+    def cancel(self, item_id: str) -> bool:
+        """
+        Отмена публикации
+
+        Returns:
+            True если запись ожидала публикации и отменена
+        """
+        with self._cond:
+            updated = self._connect().execute(
+                'UPDATE scheduled_posts SET status = ?, data = NULL, updated_at = ? WHERE id = ? AND status = ?',
+                (self.CANCELLED, time.time(), item_id, self.PENDING)
+            ).rowcount
+            self._due.pop(item_id, None)
+        return bool(updated)
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """Запись по ID (без бинарных данных)"""
+        row = self._connect().execute(
+            'SELECT id, kind, status, payload, publish_at, job_id, created_at, updated_at '
+            'FROM scheduled_posts WHERE id = ?',
+            (item_id,)
+        ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list(self, status: Optional[str] = PENDING, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Список записей по времени публикации
+
+        Args:
+            status: Фильтр по статусу (None - все)
+            limit: Максимум записей
+        """
+        query = ('SELECT id, kind, status, payload, publish_at, job_id, created_at, updated_at '
+                 'FROM scheduled_posts')
+        params: Tuple = ()
+        if status:
+            query += ' WHERE status = ?'
+            params = (status,)
+        query += ' ORDER BY publish_at LIMIT ?'
+        rows = self._connect().execute(query, params + (limit,)).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        """Строка базы -> словарь"""
+        item = dict(row)
+        item['payload'] = json.loads(item['payload'])
+        return item
+
+    def pending_count(self) -> int:
+        """Количество ожидающих публикаций"""
+        with self._cond:
+            return len(self._due)
+
+    def _timer(self):
+        """Цикл потока-таймера: спит до ближайшего срока"""
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    # Убираем из вершины heap устаревшие записи
+                    while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+                        heapq.heappop(self._heap)
+
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+
+                    delay = self._heap[0][0] - time.time()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(timeout=delay)
+
+                if self._stopping:
+                    return
+
+                _, item_id = heapq.heappop(self._heap)
+                self._due.pop(item_id, None)
+
+                try:
+                    self._fire(item_id)
+                except Exception as e:
+                    # Запись осталась в базе pending или firing: повторяем позже
+                    logging.error(f"PostScheduler: не удалось запустить публикацию {item_id}, "
+                                  f"повтор через {self.FIRE_RETRY_DELAY:.0f} сек: {e}")
+                    self._push(item_id, time.time() + self.FIRE_RETRY_DELAY)
+
+    def _fire(self, item_id: str):
+        """Передача записи на публикацию (вызывается под блокировкой)"""
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT kind, status, payload, data, job_id FROM scheduled_posts WHERE id = ? AND status IN (?, ?)',
+            (item_id, self.PENDING, self.FIRING)
+        ).fetchone()
+        if row is None:
+            return
+
+        job_id = row['job_id']
+        if row['status'] == self.PENDING:
+            # ID задачи фиксируется до ее создания: повторная передача
+            # после сбоя попадет в ту же задачу
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                'UPDATE scheduled_posts SET status = ?, job_id = ?, updated_at = ? WHERE id = ?',
+                (self.FIRING, job_id, time.time(), item_id)
+            )
+
+        self.fire(row['kind'], json.loads(row['payload']), row['data'], job_id)
+        conn.execute(
+            'UPDATE scheduled_posts SET status = ?, data = NULL, updated_at = ? WHERE id = ?',
+            (self.FIRED, time.time(), item_id)
+        )
@@ -0,0 +1,119 @@
+"""
+Общие на процесс клиенты OpenAI
+
+Клиент создается один раз на API ключ и адрес, поэтому пул HTTP-соединений
+переживает отдельные запросы и генераторы. При смене ключа в настройках
+новый клиент создается и прогревается, а старый выводится из оборота:
+запросы, уже получившие его, завершаются на нем, новые идут через новый.
+"""
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from openai import OpenAI
+
+from config import Config
+
+_clients: Dict[Tuple[str, Optional[str]], OpenAI] = {}
+_retired: List[OpenAI] = []
+_clients_lock = threading.Lock()
+
+
+def _create_openai_client(api_key: str, base_url: Optional[str]) -> OpenAI:
+    """Клиент с пулом keep-alive соединений и таймаутами из Config"""
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(Config.OPENAI_READ_TIMEOUT, connect=Config.OPENAI_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=Config.OPENAI_POOL_SIZE,
+            max_keepalive_connections=Config.OPENAI_POOL_SIZE,
+            keepalive_expiry=Config.OPENAI_KEEPALIVE_TIMEOUT
+        ),
+        follow_redirects=True
+    )
+    # Повторы выполняет utils.retry с общей паузой и лимитом на провайдер
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+
+def get_openai_client(api_key: str, base_url: Optional[str] = None) -> OpenAI:
+    """
+    Общий клиент для API ключа
+
+    Args:
+        api_key: API ключ OpenAI
+        base_url: Адрес API (None - Config.OPENAI_BASE_URL)
+    """
+    base_url = base_url or Config.OPENAI_BASE_URL
+    with _clients_lock:
+        client = _clients.get((api_key, base_url))
+        if client is None:
+            client = _create_openai_client(api_key, base_url)
+            _clients[(api_key, base_url)] = client
+        return client
+
+
+def warm_up_openai(api_key: str, base_url: Optional[str] = None) -> bool:
+    """
+    Открытие соединения заранее, чтобы первый запрос не ждал TCP и TLS
+
+    Запрашивается список моделей: он не расходует токены. Ошибка ответа
+    (например, неверный ключ) тоже оставляет соединение в пуле.
+
+    Returns:
+        True, если сервер ответил
+    """
+    client = get_openai_client(api_key, base_url)
+    try:
+        client.with_options(timeout=Config.OPENAI_CONNECT_TIMEOUT).models.list()
+        return True
+    except httpx.TransportError as e:
+        logging.warning(f"Прогрев OpenAI не удался: {e}")
+        return False
+    except Exception as e:
+        # Сервер ответил ошибкой - соединение открыто
+        if getattr(e, 'status_code', None) is None:
+            logging.warning(f"Прогрев OpenAI не удался: {e}")
+            return False
+        return True
+
+
+def warm_up_openai_async(api_key: str, base_url: Optional[str] = None) -> threading.Thread:
+    """Прогрев в фоновом потоке (не задерживает запуск и сохранение настроек)"""
+    thread = threading.Thread(target=warm_up_openai, args=(api_key, base_url), name='openai-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def rotate_openai_key(old_key: Optional[str], new_key: str, base_url: Optional[str] = None) -> OpenAI:
+    """
+    Замена ключа: новый клиент создается и прогревается, старый выводится из оборота
+
+    Старый клиент не закрывается сразу - на нем могут идти запросы;
+    его соединения закрываются при завершении процесса.
+
+    Returns:
+        Клиент нового ключа
+    """
+    base_url = base_url or Config.OPENAI_BASE_URL
+    client = get_openai_client(new_key, base_url)
+    if old_key and old_key != new_key:
+        with _clients_lock:
+            retired = _clients.pop((old_key, base_url), None)
+            if retired is not None:
+                _retired.append(retired)
+    warm_up_openai_async(new_key, base_url)
+    return client
+
+
+def close_openai_clients():
+    """Закрытие всех клиентов (при завершении процесса)"""
+    with _clients_lock:
+        clients = list(_clients.values()) + _retired
+        _clients.clear()
+        _retired.clear()
+
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logging.warning(f"Не удалось закрыть клиент OpenAI: {e}")
@@ -0,0 +1,288 @@
+"""
+Модуль планировщика запросов к Telegram с учетом FloodWait
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+from telethon.errors import FloodWaitError
+
+
+# Момент (time.monotonic), к которому должна завершиться текущая публикация
+_deadline: ContextVar[Optional[float]] = ContextVar('telegram_deadline', default=None)
+
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]) -> Iterator[None]:
+    """
+    Срок для вызовов планировщика внутри блока (и созданных в нем задач)
+
+    Планировщик не ставит запрос в очередь и не ждет FloodWait дольше,
+    чем осталось до срока: вызывающий сразу получает FloodWaitError
+    вместо таймаута, после которого работа была бы потеряна.
+    """
+    token = _deadline.set(time.monotonic() + timeout if timeout is not None else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class _Bucket:
+    """Token bucket одного метода API"""
+
+    def __init__(self, rate: float, burst: int):
+        self.nominal_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.backlog = 0
+        self.flood_waits = 0
+        self.deferred = 0
+        self.rejected = 0
+
+    def _refill(self, now: float):
+        """Пополнение токенов за прошедшее время"""
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(float(self.burst), self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """
+        Резервирование токена
+
+        Токены могут уходить в минус: каждый следующий запрос получает
+        свою очередь, и ожидания выстраиваются равномерно по скорости rate.
+
+        Returns:
+            Сколько секунд ждать перед запросом
+        """
+        self._refill(now)
+        self.tokens -= 1
+        delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(delay, self.blocked_until - now)
+
+    def wait_estimate(self, now: float) -> float:
+        """Сколько ждал бы новый запрос, пришедший сейчас"""
+        self._refill(now)
+        delay = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(delay, self.blocked_until - now, 0.0)
+
+
+class RateScheduler:
+    """
+    Планировщик запросов к Telegram на один аккаунт
+
+    Перед каждым вызовом берется токен из bucket соответствующего метода.
+    FloodWaitError не возвращается пользователю сразу: метод блокируется
+    на указанное Telegram время, его скорость снижается вдвое (и плавно
+    восстанавливается после успешных вызовов), а запрос повторяется.
+    Так всплески публикаций сглаживаются, а не отклоняются.
+
+    Ожидание ограничено max_flood_wait и сроком из deadline_scope: если
+    очередь метода или FloodWait длиннее, вызов сразу завершается
+    FloodWaitError с нужным временем ожидания, и его можно отложить.
+    """
+
+    # Время, оставляемое до срока на сам запрос после ожидания
+    REQUEST_MARGIN = 5.0
+
+    def __init__(
+            self,
+            limits: Optional[Dict[str, Tuple[float, int]]] = None,
+            max_flood_wait: float = 300,
+            max_retries: int = 3
+    ):
+        """
+        Инициализация планировщика
+
+        Args:
+            limits: {метод: (запросов в секунду, размер всплеска)};
+                    ключ 'default' задает лимит для остальных методов
+            max_flood_wait: Максимальное ожидание (сек) очереди или FloodWait,
+                            которое ждем сами; более длинное возвращается
+                            вызывающему. Должно быть меньше таймаута публикации
+            max_retries: Сколько раз повторять запрос после FloodWait
+        """
+        self.limits = dict(limits or {})
+        self.limits.setdefault('default', (5.0, 10))
+        self.max_flood_wait = max_flood_wait
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, _Bucket] = {}
+
+    def _bucket(self, method: str) -> _Bucket:
+        """Bucket метода (вызывается под блокировкой)"""
+        bucket = self._buckets.get(method)
+        if bucket is None:
+            rate, burst = self.limits.get(method, self.limits['default'])
+            bucket = self._buckets[method] = _Bucket(rate, burst)
+        return bucket
+
+    def wait_budget(self) -> float:
+        """Сколько вызов может ждать: max_flood_wait, но не дольше срока из deadline_scope"""
+        budget = self.max_flood_wait
+        deadline = _deadline.get()
+        if deadline is not None:
+            budget = min(budget, deadline - time.monotonic() - self.REQUEST_MARGIN)
+        return max(budget, 0.0)
+
+    async def acquire(self, method: str, max_delay: Optional[float] = None):
+        """
+        Ожидание своей очереди на вызов метода
+
+        Args:
+            method: Имя метода API
+            max_delay: Предел ожидания; если очередь длиннее, место не
+                       занимается и выбрасывается FloodWaitError
+
+        Raises:
+            FloodWaitError: ожидание больше max_delay
+        """
+        with self._lock:
+            bucket = self._bucket(method)
+            delay = bucket.reserve(time.monotonic())
+            if max_delay is not None and delay > max_delay:
+                # Возвращаем токен: запрос не встает в очередь
+                bucket.tokens += 1
+                bucket.rejected += 1
+                raise FloodWaitError(request=None, capture=math.ceil(delay))
+            if delay > 0:
+                bucket.backlog += 1
+                bucket.deferred += 1
+
+        if delay <= 0:
+            return
+
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            with self._lock:
+                bucket.backlog -= 1
+
+    def penalize(self, method: str, seconds: float):
+        """
+        Учет FloodWait: блокировка метода и снижение скорости
+
+        Args:
+            method: Имя метода API
+            seconds: Время ожидания из FloodWaitError
+        """
+        with self._lock:
+            bucket = self._bucket(method)
+            bucket.flood_waits += 1
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + seconds)
+            bucket.rate = max(bucket.nominal_rate / 16, bucket.rate / 2)
+
+    def record_success(self, method: str):
+        """Успешный вызов: скорость постепенно возвращается к номинальной"""
+        with self._lock:
+            bucket = self._bucket(method)
+            if bucket.rate < bucket.nominal_rate:
+                bucket.rate = min(bucket.nominal_rate, bucket.rate + bucket.nominal_rate / 10)
+
+    async def call(self, method: str, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Вызов метода API через планировщик
+
+        Args:
+            method: Имя метода API
+            request: Фабрика корутины запроса (вызывается на каждую попытку)
+
+        Returns:
+            Результат запроса
+        """
+        attempt = 0
+        while True:
+            await self.acquire(method, self.wait_budget())
+            try:
+                result = await request()
+            except FloodWaitError as e:
+                self.penalize(method, e.seconds)
+                attempt += 1
+                if e.seconds > self.wait_budget() or attempt > self.max_retries:
+                    raise
+                continue
+
+            self.record_success(method)
+            return result
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Текущее состояние по методам
+
+        Returns:
+            {метод: {rate, nominal_rate, backlog, wait_estimate, blocked_for, flood_waits, deferred, rejected}}
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                method: {
+                    'rate': round(bucket.rate, 3),
+                    'nominal_rate': bucket.nominal_rate,
+                    'backlog': bucket.backlog,
+                    'wait_estimate': round(bucket.wait_estimate(now), 2),
+                    'blocked_for': round(max(bucket.blocked_until - now, 0.0), 2),
+                    'flood_waits': bucket.flood_waits,
+                    'deferred': bucket.deferred,
+                    'rejected': bucket.rejected
+                }
+                for method, bucket in self._buckets.items()
+            }
+
+
+class RateLimitedClient:
+    """
+    Обертка TelegramClient, пропускающая сетевые вызовы через RateScheduler
+
+    Атрибуты и остальные методы проксируются без изменений, поэтому
+    обертку можно передавать везде, где ожидается клиент.
+    """
+
+    # Методы TelegramClient, которые идут через планировщик
+    SCHEDULED_METHODS = frozenset({
+        'send_message',
+        'send_file',
+        'upload_file',
+        'get_entity',
+        'get_input_entity',
+        'get_me',
+        'edit_message',
+        'delete_messages',
+    })
+
+    def __init__(self, client, scheduler: RateScheduler):
+        """
+        Args:
+            client: TelegramClient
+            scheduler: Планировщик аккаунта
+        """
+        self._client = client
+        self._scheduler = scheduler
+
+    @property
+    def raw(self):
+        """Исходный TelegramClient"""
+        return self._client
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if name not in self.SCHEDULED_METHODS:
+            return attr
+
+        async def _scheduled(*args, **kwargs):
+            return await self._scheduler.call(name, lambda: attr(*args, **kwargs))
+
+        return _scheduled
+
+    async def __call__(self, request, *args, **kwargs):
+        """Прямые запросы TL (например, SendStoryRequest) - по имени запроса"""
+        method = type(request).__name__
+        return await self._scheduler.call(method, lambda: self._client(request, *args, **kwargs))
@@ -0,0 +1,328 @@
+"""
+Модуль повторов запросов к OpenAI и Stability AI
+"""
+import asyncio
+import email.utils
+import logging
+import random
+import re
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Mapping, Optional, Tuple
+
+import aiohttp
+import httpx
+import openai
+
+from config import Config
+from .circuit_breaker import CircuitOpenError
+from .stability_client import StabilityError
+
+# Заголовки с моментом сброса лимита OpenAI ('1s', '6m0s', '20ms')
+_RATELIMIT_RESET_HEADERS = ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'h': 3600.0, 'm': 60.0, 's': 1.0, 'ms': 0.001}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Длительность вида '1m30s', '250ms' или '2.5' в секундах"""
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts or ''.join(f"{number}{unit}" for number, unit in parts) != value:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Сколько ждать по заголовкам ответа
+
+    Учитываются retry-after-ms, Retry-After (секунды или HTTP-дата) и,
+    если лимит исчерпан, x-ratelimit-reset-* OpenAI.
+
+    Returns:
+        Секунды или None, если сервер ничего не сообщил
+    """
+    if not headers:
+        return None
+    headers = {str(name).lower(): str(value) for name, value in headers.items()}
+
+    if 'retry-after-ms' in headers:
+        try:
+            return max(float(headers['retry-after-ms']) / 1000, 0.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after:
+        seconds = parse_duration(retry_after)
+        if seconds is not None:
+            return seconds
+        try:
+            moment = email.utils.parsedate_to_datetime(retry_after)
+            return max(moment.timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            pass
+
+    resets = []
+    for name in _RATELIMIT_RESET_HEADERS:
+        remaining = headers.get(name.replace('reset', 'remaining'))
+        if name in headers and remaining is not None and remaining.strip() == '0':
+            seconds = parse_duration(headers[name])
+            if seconds is not None:
+                resets.append(seconds)
+    return max(resets) if resets else None
+
+
+def openai_retry_hint(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """
+    Можно ли повторить запрос OpenAI и через сколько
+
+    Повторяются 408, 409, 429, 5xx, сетевые ошибки и таймауты.
+
+    Returns:
+        (повторять, пауза из заголовков или None)
+    """
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        if status in (408, 409, 429) or status >= 500:
+            return True, parse_retry_after(error.response.headers)
+        return False, None
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError)), None
+
+
+def stability_retry_hint(error: BaseException) -> Tuple[bool, Optional[float]]:
+    """
+    Можно ли повторить генерацию Stability AI и через сколько
+
+    Повторяются 429, 5xx, сетевые ошибки, таймауты и открытые circuit
+    breaker (через время до пробного вызова).
+
+    Returns:
+        (повторять, пауза из заголовков или None)
+    """
+    if isinstance(error, StabilityError):
+        if error.status == 429 or error.status >= 500:
+            return True, parse_retry_after(error.headers)
+        return False, None
+    if isinstance(error, CircuitOpenError):
+        return True, error.retry_in
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, TimeoutError)), None
+
+
+class RetryPolicy:
+    """
+    Повторы и общий лимит одновременных запросов к одному провайдеру
+
+    Запрос выполняется, только когда свободен один из max_concurrency
+    слотов; остальные ждут в очереди. Повторяемая ошибка освобождает
+    слот и повторяется после паузы: из заголовков Retry-After и
+    x-ratelimit-*, если сервер их прислал, иначе по экспоненте с полным
+    джиттером (base_delay * 2^n, не больше max_delay). Пауза из
+    заголовков распространяется на весь провайдер: новые запросы не
+    начинаются до ее окончания, поэтому всплеск превращается в очередь,
+    а не в лавину ошибок 429. Если сервер просит ждать дольше max_wait
+    или попытки исчерпаны, возвращается последняя ошибка.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            retry_hint: Callable[[BaseException], Tuple[bool, Optional[float]]],
+            max_attempts: int = 4,
+            base_delay: float = 1.0,
+            max_delay: float = 30.0,
+            max_wait: float = 60.0,
+            max_concurrency: Optional[int] = None
+    ):
+        """
+        Инициализация
+
+        Args:
+            name: Имя провайдера (для логов и отчета)
+            retry_hint: Функция ошибки -> (повторять, пауза из заголовков)
+            max_attempts: Всего попыток, включая первую
+            base_delay: Пауза перед первым повтором без подсказки сервера
+            max_delay: Предел паузы по экспоненте
+            max_wait: Предел паузы по заголовкам; дольше - ошибка сразу
+            max_concurrency: Одновременных запросов к провайдеру (None - без ограничения)
+        """
+        self.name = name
+        self.retry_hint = retry_hint
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._waiting = 0
+        self._calls = 0
+        self._failed = 0
+        self._waited = 0.0
+        self._retries: Dict[str, int] = {}
+
+    def backoff(self, attempt: int, hint: Optional[float] = None) -> float:
+        """
+        Пауза перед повтором номер attempt (с 1)
+
+        Подсказка сервера соблюдается с небольшим джиттером сверху,
+        чтобы ожидавшие запросы не вернулись одновременно.
+        """
+        if hint is not None:
+            return hint + random.uniform(0, min(hint * 0.1, self.base_delay))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _acquire(self):
+        """Ожидание конца общей паузы и свободного слота"""
+        started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                with self._lock:
+                    pause = self._blocked_until - time.monotonic()
+                if pause > 0:
+                    time.sleep(pause)
+                    continue
+                if self._slots is not None:
+                    self._slots.acquire()
+                break
+        finally:
+            with self._lock:
+                self._waiting -= 1
+                self._in_flight += 1
+                self._waited += time.monotonic() - started
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    def _block(self, seconds: float):
+        """Общая пауза провайдера по подсказке сервера"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def call(
+            self,
+            request: Callable[[], Any],
+            stage: str = 'request',
+            can_retry: Optional[Callable[[], bool]] = None,
+            limit: Optional[ContextManager] = None
+    ) -> Any:
+        """
+        Выполнение запроса с повторами
+
+        Args:
+            request: Запрос (вызывается на каждую попытку)
+            stage: Этап генерации, к которому относятся повторы в отчете
+            can_retry: Дополнительная проверка перед повтором (например,
+                       False, если потоковый ответ уже начал отдаваться)
+            limit: Более узкое ограничение вызывающего (например, семафор
+                   пакетного генератора). Берется на каждую попытку раньше
+                   общего слота провайдера: иначе потоки, ждущие узкое
+                   ограничение, держали бы общие слоты и не пускали
+                   остальных. На время паузы перед повтором освобождается.
+
+        Returns:
+            Результат запроса
+        """
+        with self._lock:
+            self._calls += 1
+
+        attempt = 0
+        while True:
+            attempt += 1
+            with limit or nullcontext():
+                self._acquire()
+                try:
+                    return request()
+                except Exception as e:
+                    retryable, hint = self.retry_hint(e)
+                    if (not retryable or attempt >= self.max_attempts
+                            or (hint is not None and hint > self.max_wait)
+                            or (can_retry is not None and not can_retry())):
+                        with self._lock:
+                            self._failed += 1
+                        raise
+                    error = e
+                finally:
+                    self._release()
+
+            delay = self.backoff(attempt, hint)
+            if hint is not None:
+                self._block(delay)
+            with self._lock:
+                self._retries[stage] = self._retries.get(stage, 0) + 1
+            logging.warning(
+                f"{self.name} {stage}: attempt {attempt} failed ({error!r}), retrying in {delay:.2f}s"
+            )
+            time.sleep(delay)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Текущее состояние
+
+        Returns:
+            {calls, failed, retries: {этап: повторов}, in_flight, waiting,
+             max_concurrency, blocked_for, waited_s}
+        """
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'failed': self._failed,
+                'retries': dict(self._retries),
+                'in_flight': self._in_flight,
+                'waiting': self._waiting,
+                'max_concurrency': self.max_concurrency,
+                'blocked_for': round(max(self._blocked_until - time.monotonic(), 0.0), 2),
+                'waited_s': round(self._waited, 2)
+            }
+
+
+_policies: Dict[str, RetryPolicy] = {}
+_policies_lock = threading.Lock()
+
+_RETRY_HINTS = {
+    'openai': openai_retry_hint,
+    'stability': stability_retry_hint
+}
+
+
+def get_retry_policy(provider: str) -> RetryPolicy:
+    """
+    Общая на процесс политика провайдера ('openai' или 'stability') с параметрами из Config
+
+    Лимит одновременных запросов действует на все генераторы процесса.
+    """
+    with _policies_lock:
+        policy = _policies.get(provider)
+        if policy is None:
+            policy = RetryPolicy(
+                provider,
+                _RETRY_HINTS[provider],
+                max_attempts=Config.RETRY_MAX_ATTEMPTS,
+                base_delay=Config.RETRY_BASE_DELAY,
+                max_delay=Config.RETRY_MAX_DELAY,
+                max_wait=Config.RETRY_MAX_WAIT,
+                max_concurrency=Config.PROVIDER_CONCURRENCY.get(provider)
+            )
+            _policies[provider] = policy
+        return policy
+
+
+def retry_stats() -> Dict[str, Dict[str, Any]]:
+    """Состояние политик по провайдерам"""
+    with _policies_lock:
+        policies = dict(_policies)
+    return {name: policy.snapshot() for name, policy in policies.items()}
@@ -0,0 +1,38 @@
+"""
+Общая основа хранилищ на SQLite
+"""
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    База для классов, хранящих данные в файле SQLite
+
+    Каждый поток получает свое соединение (sqlite3 не разрешает делить
+    соединение между потоками), журнал - WAL, чтобы читатели не ждали
+    писателей. Каталог базы создается при инициализации.
+    """
+
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path: Путь к файлу базы SQLite
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение с базой (свое для каждого потока)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,463 @@
+"""
+Модуль асинхронного клиента Stability AI
+"""
+import asyncio
+import base64
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Set, Tuple
+
+import aiohttp
+
+from config import Config
+from .async_loop import AsyncLoopThread
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+
+NEGATIVE_PROMPT = "low quality, blurry, distorted, ugly, bad anatomy, watermark, text, letters, words"
+
+# Ответ читается частями такого размера
+_CHUNK_SIZE = 64 * 1024
+
+# Режимы запроса резервной модели SDXL
+HEDGE_OFF = 'off'      # SDXL только после ошибки SD3
+HEDGE_DELAY = 'hedge'  # SDXL, если SD3 дольше перцентиля своих задержек
+HEDGE_RACE = 'race'    # Обе модели сразу, берется первое изображение
+HEDGE_MODES = (HEDGE_OFF, HEDGE_DELAY, HEDGE_RACE)
+
+
+class StabilityError(Exception):
+    """Ошибка ответа Stability AI"""
+
+    def __init__(self, backend: str, status: int, message: str = '', headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"{backend}: HTTP {status} {message}".strip())
+        self.backend = backend
+        self.status = status
+        # Заголовки ответа (Retry-After и т.п.) для политики повторов
+        self.headers = headers or {}
+
+
+# Ошибки запроса, после которых имеет смысл попробовать другую модель
+BACKEND_ERRORS = (StabilityError, CircuitOpenError, aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError)
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """
+    Говорит ли ошибка о нездоровье сервиса
+
+    Сетевые ошибки, таймауты, 429 и 5xx - да; остальные ответы 4xx
+    (например, отклоненный промпт) - нет.
+    """
+    if isinstance(error, StabilityError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError))
+
+
+class StabilityClient:
+    """
+    Клиент Stability AI на aiohttp с пулом соединений
+
+    Одна ClientSession на клиента держит keep-alive соединения, поэтому
+    DNS, TCP и TLS оплачиваются один раз, а не на каждое изображение.
+    Ответ читается потоком по частям. Корутины можно ожидать из
+    асинхронного кода, работающего в loop клиента, а синхронный код
+    вызывает generate_image(), который выполняет запрос в общем
+    AsyncLoopThread и не занимает свой поток сетевым ожиданием.
+    """
+
+    def __init__(
+            self,
+            api_key: str,
+            api_host: str = "https://api.stability.ai",
+            connect_timeout: float = 10,
+            read_timeout: float = 60,
+            pool_size: int = 10,
+            keepalive_timeout: float = 30,
+            hedge_mode: str = HEDGE_OFF,
+            hedge_percentile: float = 95,
+            hedge_default_delay: float = 20,
+            hedge_min_samples: int = 10,
+            breaker_options: Optional[Dict[str, Any]] = None,
+            runner: Optional[AsyncLoopThread] = None
+    ):
+        """
+        Инициализация клиента
+
+        Args:
+            api_key: API ключ Stability AI
+            api_host: Адрес API
+            connect_timeout: Таймаут установки соединения (сек)
+            read_timeout: Таймаут ожидания данных ответа (сек)
+            pool_size: Максимум одновременных соединений
+            keepalive_timeout: Сколько держать простаивающее соединение (сек)
+            hedge_mode: Режим запроса SDXL: 'off', 'hedge' или 'race'
+            hedge_percentile: Перцентиль задержек SD3, после которого
+                              в режиме 'hedge' запускается SDXL
+            hedge_default_delay: Задержка запуска SDXL, пока задержек SD3 мало
+            hedge_min_samples: Сколько задержек SD3 нужно для перцентиля
+            breaker_options: Параметры CircuitBreaker для каждой модели
+            runner: Поток с event loop для синхронного фасада
+        """
+        self.api_key = api_key
+        self.api_host = api_host.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        if hedge_mode not in HEDGE_MODES:
+            raise ValueError(f"Неизвестный режим hedge_mode: {hedge_mode}")
+        self.hedge_mode = hedge_mode
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_samples = hedge_min_samples
+        self._sd3_latencies: deque = deque(maxlen=100)
+        self._hedge_stats = {'requests': 0, 'hedged': 0, 'sd3_wins': 0, 'sdxl_wins': 0}
+        self.breakers = {
+            name: CircuitBreaker(name, **(breaker_options or {}))
+            for name in ('sd3', 'sdxl')
+        }
+        self.runner = runner or AsyncLoopThread(name='stability-client')
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Сессия с пулом соединений (создается в loop при первом запросе)"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_connect=self.connect_timeout,
+                    sock_read=self.read_timeout
+                ),
+                headers={"authorization": f"Bearer {self.api_key}"}
+            )
+        return self._session
+
+    @staticmethod
+    async def _read_body(response: aiohttp.ClientResponse) -> bytes:
+        """Чтение тела ответа по частям"""
+        chunks = []
+        async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+            chunks.append(chunk)
+        return b''.join(chunks)
+
+    async def generate_sd3(self, prompt: str) -> bytes:
+        """
+        Генерация изображения через SD3 (v2beta)
+
+        Returns:
+            PNG
+        """
+        form = aiohttp.FormData()
+        form.add_field('prompt', prompt)
+        form.add_field('aspect_ratio', '9:16')
+        form.add_field('model', 'sd3-large-turbo')
+        form.add_field('output_format', 'png')
+        form.add_field('negative_prompt', NEGATIVE_PROMPT)
+
+        session = await self._get_session()
+        async with session.post(
+                f"{self.api_host}/v2beta/stable-image/generate/sd3",
+                data=form,
+                headers={"accept": "image/*"}
+        ) as response:
+            body = await self._read_body(response)
+            if response.status != 200:
+                raise StabilityError(
+                    'sd3', response.status, body[:200].decode('utf-8', 'replace'), dict(response.headers)
+                )
+            return body
+
+    async def generate_sdxl(self, prompt: str) -> bytes:
+        """
+        Генерация изображения через SDXL (v1)
+
+        Returns:
+            PNG
+        """
+        payload = {
+            "text_prompts": [
+                {"text": prompt, "weight": 1},
+                {"text": NEGATIVE_PROMPT, "weight": -1}
+            ],
+            "cfg_scale": 7,
+            "height": 1344,  # Примерно 9:16 для SDXL
+            "width": 768,
+            "steps": 20,
+            "samples": 1
+        }
+
+        session = await self._get_session()
+        async with session.post(
+                f"{self.api_host}/v1/generation/stable-diffusion-xl-1024-v1-0/text-to-image",
+                json=payload,
+                headers={"accept": "application/json"}
+        ) as response:
+            body = await self._read_body(response)
+            if response.status != 200:
+                raise StabilityError(
+                    'sdxl', response.status, body[:200].decode('utf-8', 'replace'), dict(response.headers)
+                )
+
+        data = json.loads(body)
+        return base64.b64decode(data["artifacts"][0]["base64"])
+
+    def hedge_delay(self) -> float:
+        """
+        Через сколько секунд ожидания SD3 запускать SDXL
+
+        Выборка включает и отмененные запросы SD3 (с задержкой до отмены).
+        """
+        if self.hedge_mode == HEDGE_RACE:
+            return 0.0
+        if len(self._sd3_latencies) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        latencies = sorted(self._sd3_latencies)
+        index = min(len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100))
+        return latencies[index]
+
+    async def _call_backend(self, name: str, prompt: str) -> bytes:
+        """
+        Запрос к модели через ее circuit breaker
+
+        Raises:
+            CircuitOpenError: если модель исключена из маршрутизации
+        """
+        breaker = self.breakers[name]
+        probe = breaker.acquire()
+        request = self.generate_sd3 if name == 'sd3' else self.generate_sdxl
+
+        start = time.monotonic()
+        try:
+            image = await request(prompt)
+        except asyncio.CancelledError:
+            breaker.release(probe)
+            if name == 'sd3':
+                # SD3 проиграл SDXL: сколько он уже шел - нижняя оценка его
+                # задержки. Без нее выборка теряет медленный хвост, и
+                # перцентиль (а с ним hedge_delay) занижается
+                self._sd3_latencies.append(time.monotonic() - start)
+            raise
+        except Exception as e:
+            if is_backend_failure(e):
+                breaker.record_failure(time.monotonic() - start, probe)
+            else:
+                breaker.release(probe)
+            raise
+
+        latency = time.monotonic() - start
+        breaker.record_success(latency, probe)
+        if name == 'sd3':
+            self._sd3_latencies.append(latency)
+        return image
+
+    @staticmethod
+    async def _first_success(tasks: Set[asyncio.Task]) -> asyncio.Task:
+        """
+        Первая успешно завершившаяся задача
+
+        Если все задачи упали, пробрасывается ошибка последней.
+        """
+        error: Optional[BaseException] = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task
+                error = task.exception()
+                logging.warning(f"Stability backend failed: {error!r}")
+        raise error
+
+    async def generate(self, prompt: str) -> bytes:
+        """
+        Генерация изображения: SD3 с резервной SDXL
+
+        В режиме 'off' SDXL запрашивается только после ошибки SD3.
+        В режиме 'hedge' SDXL запускается и тогда, когда SD3 отвечает
+        дольше hedge_percentile своих последних задержек; в режиме
+        'race' обе модели запрашиваются сразу. Берется первое
+        изображение, оставшийся запрос отменяется.
+
+        Модель с открытым circuit breaker пропускается, и запрос сразу
+        идет в здоровую.
+
+        Returns:
+            PNG
+
+        Raises:
+            CircuitOpenError: если обе модели исключены из маршрутизации
+        """
+        self._hedge_stats['requests'] += 1
+
+        sd3_available = self.breakers['sd3'].available()
+        if not sd3_available or not self.breakers['sdxl'].available():
+            # Одна из моделей исключена - без хеджирования идем в другую
+            name = 'sdxl' if not sd3_available else 'sd3'
+            if not sd3_available:
+                logging.info("SD3 circuit is open, routing to SDXL.")
+            image = await self._call_backend(name, prompt)
+            self._hedge_stats[f'{name}_wins'] += 1
+            return image
+
+        if self.hedge_mode == HEDGE_OFF:
+            try:
+                image = await self._call_backend('sd3', prompt)
+                self._hedge_stats['sd3_wins'] += 1
+                return image
+            except BACKEND_ERRORS as e:
+                logging.warning(f"SD3 failed ({e!r}). Falling back to SDXL.")
+            image = await self._call_backend('sdxl', prompt)
+            self._hedge_stats['sdxl_wins'] += 1
+            return image
+
+        sd3 = asyncio.ensure_future(self._call_backend('sd3', prompt))
+        tasks = {sd3}
+        try:
+            delay = self.hedge_delay()
+            if delay > 0:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if sd3 in done:
+                    if sd3.exception() is None:
+                        self._hedge_stats['sd3_wins'] += 1
+                        return sd3.result()
+                    logging.warning(f"SD3 failed ({sd3.exception()!r}). Falling back to SDXL.")
+                    tasks.discard(sd3)
+                else:
+                    logging.info(f"SD3 slower than {delay:.1f}s, hedging with SDXL.")
+                    self._hedge_stats['hedged'] += 1
+            else:
+                self._hedge_stats['hedged'] += 1
+
+            sdxl = asyncio.ensure_future(self._call_backend('sdxl', prompt))
+            tasks.add(sdxl)
+            winner = await self._first_success(tasks)
+            self._hedge_stats['sd3_wins' if winner is sd3 else 'sdxl_wins'] += 1
+            return winner.result()
+        finally:
+            # Отменяем проигравший запрос (соединение закрывается)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Состояние хеджирования
+
+        Returns:
+            {mode, hedge_delay, sd3_samples, requests, hedged, sd3_wins, sdxl_wins}
+        """
+        return {
+            'mode': self.hedge_mode,
+            'hedge_delay': round(self.hedge_delay(), 3),
+            'sd3_samples': len(self._sd3_latencies),
+            **self._hedge_stats
+        }
+
+    def health(self) -> Dict[str, Any]:
+        """
+        Здоровье моделей и состояние хеджирования
+
+        Returns:
+            {'backends': {модель: состояние breaker}, 'hedge': stats()}
+        """
+        return {
+            'backends': {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+            'hedge': self.stats()
+        }
+
+    def generate_image(self, prompt: str, timeout: Optional[float] = None) -> bytes:
+        """
+        Синхронный фасад generate()
+
+        Args:
+            prompt: Промпт на английском языке
+            timeout: Общий таймаут (None - только таймауты соединения и чтения)
+        """
+        return self.runner.run(self.generate(prompt), timeout=timeout)
+
+    async def close(self):
+        """Закрытие сессии и соединений"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def close_sync(self, timeout: float = 5):
+        """Закрытие из синхронного кода"""
+        if self.runner.is_running():
+            self.runner.run(self.close(), timeout=timeout)
+
+
+_clients: Dict[Tuple[str, str], StabilityClient] = {}
+_clients_lock = threading.Lock()
+_runner: Optional[AsyncLoopThread] = None
+
+
+def get_stability_client(api_key: str, api_host: str = "https://api.stability.ai", **options: Any) -> StabilityClient:
+    """
+    Общий клиент для API ключа и адреса
+
+    Все клиенты процесса работают в одном потоке с event loop, поэтому
+    генераторы, создаваемые на каждый запрос, переиспользуют соединения.
+
+    Args:
+        api_key: API ключ Stability AI
+        api_host: Адрес API
+        options: Параметры StabilityClient (учитываются при создании)
+    """
+    global _runner
+    with _clients_lock:
+        client = _clients.get((api_key, api_host))
+        if client is None:
+            if _runner is None:
+                _runner = AsyncLoopThread(name='stability-client')
+            client = StabilityClient(api_key, api_host, runner=_runner, **options)
+            _clients[(api_key, api_host)] = client
+        return client
+
+
+def get_configured_client(api_key: str) -> StabilityClient:
+    """Общий клиент с параметрами из Config"""
+    return get_stability_client(
+        api_key,
+        Config.STABILITY_API_HOST,
+        connect_timeout=Config.STABILITY_CONNECT_TIMEOUT,
+        read_timeout=Config.STABILITY_READ_TIMEOUT,
+        pool_size=Config.STABILITY_POOL_SIZE,
+        keepalive_timeout=Config.STABILITY_KEEPALIVE_TIMEOUT,
+        hedge_mode=Config.STABILITY_HEDGE_MODE,
+        hedge_percentile=Config.STABILITY_HEDGE_PERCENTILE,
+        hedge_default_delay=Config.STABILITY_HEDGE_DEFAULT_DELAY,
+        hedge_min_samples=Config.STABILITY_HEDGE_MIN_SAMPLES,
+        breaker_options={
+            'window': Config.STABILITY_BREAKER_WINDOW,
+            'error_rate': Config.STABILITY_BREAKER_ERROR_RATE,
+            'min_requests': Config.STABILITY_BREAKER_MIN_REQUESTS,
+            'consecutive_failures': Config.STABILITY_BREAKER_CONSECUTIVE_FAILURES,
+            'open_seconds': Config.STABILITY_BREAKER_OPEN_SECONDS
+        }
+    )
+
+
+def close_stability_clients():
+    """Закрытие всех общих клиентов (при завершении процесса)"""
+    global _runner
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        runner, _runner = _runner, None
+
+    for client in clients:
+        try:
+            client.close_sync()
+        except Exception as e:
+            logging.warning(f"Не удалось закрыть клиент Stability AI: {e}")
+    if runner is not None:
+        runner.stop()
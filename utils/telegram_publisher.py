@@ -7,7 +7,6 @@ from telethon import TelegramClient
 from telethon.sessions import StringSession
 from telethon.tl.functions.stories import SendStoryRequest
 from telethon.tl.types import (
-    InputMediaUploadedPhoto,
     InputPrivacyValueAllowAll,
     InputPrivacyValueAllowContacts
 )
@@ -19,11 +18,15 @@ from telethon.errors import (
 )
 from typing import Optional, Dict, Any
 import asyncio
-import io
 import json
 import os
 import time
 
+from config import Config
+from .media_cache import MediaCache, STALE_MEDIA_ERRORS
+from .peer_cache import PeerCache, STALE_PEER_ERRORS
+from .rate_scheduler import RateScheduler, RateLimitedClient
+
 
 class TelegramPublisher:
     """Класс для публикации постов в Telegram"""
@@ -33,7 +36,8 @@ class TelegramPublisher:
         api_id: str,
         api_hash: str,
         phone: str,
-        session_file: str = 'telegram_sessions.json'
+        session_file: str = 'telegram_sessions.json',
+        peer_cache_file: Optional[str] = None
     ):
         """
         Инициализация публикатора
@@ -43,6 +47,7 @@ class TelegramPublisher:
             api_hash: Telegram API Hash
             phone: Номер телефона
             session_file: Файл для хранения сессий
+            peer_cache_file: Файл кэша групп/каналов (по умолчанию рядом с session_file)
         """
         # Преобразуем api_id в int если это строка
         if isinstance(api_id, str):
@@ -60,6 +65,21 @@ class TelegramPublisher:
         self.client = None
         self.session_string = self._load_session()
 
+        # Постоянный кэш InputPeer (access_hash привязан к аккаунту)
+        if peer_cache_file is None:
+            base_name = os.path.splitext(session_file)[0]
+            peer_cache_file = f"{base_name}_{self.phone.lstrip('+')}_peers.json"
+        self.peer_cache = PeerCache(peer_cache_file)
+
+        # Загруженные изображения: пост и Stories передают байты один раз
+        self.media_cache = MediaCache(upload_ttl=Config.TELEGRAM_UPLOAD_TTL)
+
+        # Планировщик запросов: FloodWait откладывает запросы, а не отклоняет
+        self.rate_scheduler = RateScheduler(
+            limits=Config.TELEGRAM_RATE_LIMITS,
+            max_flood_wait=Config.TELEGRAM_FLOOD_MAX_WAIT
+        )
+
         # Для хранения phone_code_hash при обычной авторизации
         self._phone_code_hash = None
 
@@ -110,12 +130,17 @@ class TelegramPublisher:
             # Создаем клиент с сохраненной сессией или пустой
             session = StringSession(self.session_string) if self.session_string else StringSession()
 
-            self.client = TelegramClient(
-                session,
-                self.api_id,
-                self.api_hash,
-                connection_retries=5,
-                retry_delay=1
+            # Сетевые вызовы клиента идут через планировщик запросов
+            self.client = RateLimitedClient(
+                TelegramClient(
+                    session,
+                    self.api_id,
+                    self.api_hash,
+                    connection_retries=5,
+                    retry_delay=1,
+                    flood_sleep_threshold=0
+                ),
+                self.rate_scheduler
             )
 
             await self.client.connect()
@@ -266,7 +291,8 @@ class TelegramPublisher:
         text: str,
         image: Optional[bytes] = None,
         publish_to_story: bool = True,
-        story_type: str = 'channel'
+        story_type: str = 'channel',
+        target_timeout: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Публикация поста в группу/канал и опционально в Stories
@@ -277,6 +303,8 @@ class TelegramPublisher:
             image: Изображение в байтах (опционально)
             publish_to_story: Публиковать ли в Stories
             story_type: Тип Stories ('channel', 'personal', 'both', 'none')
+            target_timeout: Таймаут каждой цели в секундах
+                            (по умолчанию Config.TELEGRAM_PUBLISH_TIMEOUT)
 
         Returns:
             Словарь с результатами публикации
@@ -288,44 +316,38 @@ class TelegramPublisher:
             raise Exception("Не авторизован")
 
         results = {}
+        timeout = target_timeout or Config.TELEGRAM_PUBLISH_TIMEOUT
 
-        try:
-            # Нормализуем username
-            if group_username.startswith('@'):
-                group_username = group_username[1:]
-
-            # Получаем сущность группы/канала
-            try:
-                entity = await self.client.get_entity(group_username)
-            except:
-                # Пробуем как числовой ID
-                entity = await self.client.get_entity(int(group_username))
-
-            # Публикуем основной пост
+        async def _send(peer):
             if image:
                 # С изображением
-                img_io = io.BytesIO(image)
-                img_io.name = 'post.jpg'
-                img_io.seek(0)
+                return await self._send_photo(peer, image, text)
+            # Только текст
+            return await self.client.send_message(peer, text)
 
-                message = await self.client.send_file(
-                    entity,
-                    img_io,
-                    caption=text
-                )
-            else:
-                # Только текст
-                message = await self.client.send_message(entity, text)
+        async def _publish_group_post(entity):
+            # Публикуем основной пост
+            try:
+                message = await _send(entity)
+            except STALE_PEER_ERRORS:
+                # access_hash устарел: разрешаем заново и повторяем
+                self.peer_cache.invalidate(group_username)
+                entity = await self.peer_cache.resolve(self.client, group_username, refresh=True)
+                message = await _send(entity)
 
-            results['group_post'] = {
+            print(f"✅ Пост опубликован (ID: {message.id})")
+
+            return {
                 'status': 'success',
                 'message_id': message.id,
-                'chat_id': entity.id,
-                'chat_title': getattr(entity, 'title', group_username)
+                'chat_id': message.chat_id,
+                'chat_title': self.peer_cache.get_title(group_username) or group_username
             }
 
-            print(f"✅ Пост опубликован (ID: {message.id})")
-
+        # Получаем сущность группы/канала (username или числовой ID, из кэша)
+        entity = None
+        try:
+            entity = await self.peer_cache.resolve(self.client, group_username)
         except Exception as e:
             results['group_post'] = {
                 'status': 'error',
@@ -333,6 +355,11 @@ class TelegramPublisher:
             }
             print(f"❌ Ошибка публикации поста: {e}")
 
+        # Независимые цели публикуются одновременно на одном соединении
+        targets = {}
+        if entity is not None:
+            targets['group_post'] = _publish_group_post(entity)
+
         # Публикация Stories если нужно
         if publish_to_story and image and story_type != 'none':
 
@@ -340,31 +367,87 @@ class TelegramPublisher:
             story_caption = text[:200] if len(text) <= 200 else text[:197] + "..."
 
             # Stories в канал/группу
-            if story_type in ('channel', 'both') and 'entity' in locals():
-                try:
-                    results['channel_story'] = await self._publish_channel_story(
-                        entity, image, story_caption
-                    )
-                except Exception as e:
-                    results['channel_story'] = {
-                        'status': 'error',
-                        'error': str(e)
-                    }
+            if story_type in ('channel', 'both') and entity is not None:
+                targets['channel_story'] = self._publish_channel_story(entity, image, story_caption)
 
             # Личные Stories
             if story_type in ('personal', 'both'):
-                try:
-                    results['personal_story'] = await self._publish_personal_story(
-                        image, story_caption
-                    )
-                except Exception as e:
-                    results['personal_story'] = {
-                        'status': 'error',
-                        'error': str(e)
-                    }
+                targets['personal_story'] = self._publish_personal_story(image, story_caption)
+
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(coro, timeout=timeout) for coro in targets.values()),
+            return_exceptions=True
+        )
+
+        for name, outcome in zip(targets, outcomes):
+            if isinstance(outcome, asyncio.TimeoutError):
+                results[name] = {
+                    'status': 'error',
+                    'error': f'Превышено время ожидания ({timeout} сек)'
+                }
+            elif isinstance(outcome, Exception):
+                results[name] = {
+                    'status': 'error',
+                    'error': str(outcome)
+                }
+                if name == 'group_post':
+                    print(f"❌ Ошибка публикации поста: {outcome}")
+            else:
+                results[name] = outcome
 
         return results
 
+    async def _send_photo(self, peer, image: bytes, caption: str):
+        """
+        Отправка фото с переиспользованием уже загруженного файла
+
+        Args:
+            peer: Получатель
+            image: Изображение в байтах
+            caption: Подпись
+
+        Returns:
+            Отправленное сообщение
+        """
+        key, media = await self.media_cache.message_media(self.client, image)
+        try:
+            message = await self.client.send_file(peer, media, caption=caption)
+        except STALE_MEDIA_ERRORS:
+            # Handle истек на сервере: загружаем заново
+            key, media = await self.media_cache.message_media(self.client, image, refresh=True)
+            message = await self.client.send_file(peer, media, caption=caption)
+        self.media_cache.remember_photo(key, message)
+        return message
+
+    async def _send_story(self, peer, image: bytes, caption: str):
+        """
+        Публикация Story с переиспользованием уже загруженного файла
+
+        Args:
+            peer: Канал/группа или 'me' для личной Story
+            image: Изображение в байтах
+            caption: Подпись
+
+        Returns:
+            Результат SendStoryRequest
+        """
+        async def _send(refresh: bool = False):
+            _, media = await self.media_cache.story_media(self.client, image, refresh=refresh)
+            return await self.client(SendStoryRequest(
+                peer=peer,
+                media=media,
+                caption=caption,
+                privacy_rules=[InputPrivacyValueAllowAll()],
+                pinned=False,
+                noforwards=False,
+                period=86400  # 24 часа
+            ))
+
+        try:
+            return await _send()
+        except STALE_MEDIA_ERRORS:
+            return await _send(refresh=True)
+
     async def _publish_channel_story(
         self,
         entity,
@@ -385,27 +468,8 @@ class TelegramPublisher:
         try:
             print(f"📸 Публикация Story в канал/группу...")
 
-            # Загружаем изображение
-            img_io = io.BytesIO(image)
-            img_io.name = 'story.jpg'
-            img_io.seek(0)
-
-            uploaded = await self.client.upload_file(img_io)
-            media = InputMediaUploadedPhoto(file=uploaded)
-
-            # Настройки приватности
-            privacy = [InputPrivacyValueAllowAll()]
-
-            # Публикуем Story
-            result = await self.client(SendStoryRequest(
-                peer=entity,
-                media=media,
-                caption=caption,
-                privacy_rules=privacy,
-                pinned=False,
-                noforwards=False,
-                period=86400  # 24 часа
-            ))
+            # Публикуем Story (изображение загружается один раз на пост)
+            result = await self._send_story(entity, image, caption)
 
             print("✅ Story в канал опубликована!")
 
@@ -421,14 +485,10 @@ class TelegramPublisher:
             try:
                 print("🔄 Публикуем как альтернативный пост...")
 
-                img_io = io.BytesIO(image)
-                img_io.name = 'story_alt.jpg'
-                img_io.seek(0)
-
-                alt_message = await self.client.send_file(
+                alt_message = await self._send_photo(
                     entity,
-                    img_io,
-                    caption=f"📸 STORY\n\n{caption}"
+                    image,
+                    f"📸 STORY\n\n{caption}"
                 )
 
                 return {
@@ -457,27 +517,8 @@ class TelegramPublisher:
         try:
             print(f"📸 Публикация личной Story...")
 
-            # Загружаем изображение
-            img_io = io.BytesIO(image)
-            img_io.name = 'personal_story.jpg'
-            img_io.seek(0)
-
-            uploaded = await self.client.upload_file(img_io)
-            media = InputMediaUploadedPhoto(file=uploaded)
-
-            # Настройки приватности
-            privacy = [InputPrivacyValueAllowAll()]
-
-            # Публикуем личную Story
-            result = await self.client(SendStoryRequest(
-                peer='me',  # Личная Story
-                media=media,
-                caption=caption,
-                privacy_rules=privacy,
-                pinned=False,
-                noforwards=False,
-                period=86400  # 24 часа
-            ))
+            # Публикуем личную Story (изображение загружается один раз на пост)
+            result = await self._send_story('me', image, caption)
 
             print("✅ Личная Story опубликована!")
 